@@ -0,0 +1,20 @@
+// Board game form: live complexity value and Bootstrap's client-side validation.
+(function () {
+    const complexity = document.getElementById("complexity");
+    const complexityValue = document.getElementById("complexityValue");
+    if (complexity && complexityValue) {
+        complexity.addEventListener("input", function () {
+            complexityValue.textContent = this.value;
+        });
+    }
+
+    document.querySelectorAll(".needs-validation").forEach(function (form) {
+        form.addEventListener("submit", function (event) {
+            if (!form.checkValidity()) {
+                event.preventDefault();
+                event.stopPropagation();
+            }
+            form.classList.add("was-validated");
+        }, false);
+    });
+})();
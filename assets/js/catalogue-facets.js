@@ -0,0 +1,9 @@
+// Catalogue filters: a facet link under a field (e.g. "4p (12)") fills that field in.
+(function () {
+    document.querySelectorAll("a[data-facet-input]").forEach(function (link) {
+        link.addEventListener("click", function (event) {
+            event.preventDefault();
+            document.getElementById(link.dataset.facetInput).value = link.dataset.facetValue;
+        });
+    });
+})();
@@ -0,0 +1,56 @@
+// Catalogue search box: suggestions from the autocomplete API as the patron types.
+(function () {
+    const input = document.getElementById("gameSearch");
+    const suggestions = document.getElementById("searchSuggestions");
+    if (!input || !suggestions) {
+        return;
+    }
+    let timer = null;
+    let pending = null;
+
+    function show(results) {
+        suggestions.replaceChildren();
+        for (const result of results) {
+            const link = document.createElement("a");
+            link.href = result.url;
+            link.className = "list-group-item list-group-item-action d-flex justify-content-between";
+            link.textContent = result.label;
+            if (result.type === "category") {
+                const badge = document.createElement("span");
+                badge.className = "badge bg-secondary";
+                badge.textContent = "Category";
+                link.append(badge);
+            }
+            suggestions.append(link);
+        }
+        suggestions.classList.toggle("d-none", results.length === 0);
+    }
+
+    input.addEventListener("input", () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            if (pending) {
+                pending.abort();
+            }
+            if (!input.value.trim()) {
+                show([]);
+                return;
+            }
+            pending = new AbortController();
+            fetch(input.dataset.url + "?" + new URLSearchParams({q: input.value}), {signal: pending.signal})
+                .then((response) => (response.ok ? response.json() : {results: []}))
+                .then((data) => show(data.results))
+                .catch(() => {});
+        }, 150);
+    });
+    input.addEventListener("keydown", (event) => {
+        if (event.key === "Escape") {
+            show([]);
+        }
+    });
+    document.addEventListener("click", (event) => {
+        if (!suggestions.contains(event.target) && event.target !== input) {
+            show([]);
+        }
+    });
+})();
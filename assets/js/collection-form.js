@@ -0,0 +1,69 @@
+// Collection form: private settings toggle, game picker and its search box.
+document.addEventListener('DOMContentLoaded', function() {
+    const selectedGamesContainer = document.getElementById('selectedGames');
+    if (!selectedGamesContainer) {
+        return;
+    }
+
+    // Show/hide private collection settings
+    const visibilitySelect = document.querySelector('select[name="visibility"]');
+    const privateSettings = document.getElementById('private-settings');
+
+    if (visibilitySelect) {
+        visibilitySelect.addEventListener('change', function() {
+            if (this.value === 'private') {
+                privateSettings.classList.remove('d-none');
+            } else {
+                privateSettings.classList.add('d-none');
+            }
+        });
+    }
+
+    // Game selection functionality
+    const gameCheckboxes = document.querySelectorAll('.game-checkbox');
+    const noSelectedGamesElement = document.getElementById('noSelectedGames');
+    const gameSearch = document.getElementById('gameSearch');
+
+    // Initialize selected games
+    updateSelectedGames();
+
+    // Add event listeners to checkboxes
+    gameCheckboxes.forEach(checkbox => {
+        checkbox.addEventListener('change', updateSelectedGames);
+    });
+
+    // Search functionality
+    if (gameSearch) {
+        gameSearch.addEventListener('input', function() {
+            const searchTerm = this.value.toLowerCase();
+            const gameItems = document.querySelectorAll('#availableGames .list-group-item');
+
+            gameItems.forEach(item => {
+                const gameTitle = item.querySelector('strong')?.textContent.toLowerCase() || '';
+                if (gameTitle.includes(searchTerm)) {
+                    item.style.display = '';
+                } else {
+                    item.style.display = 'none';
+                }
+            });
+        });
+    }
+
+    function updateSelectedGames() {
+        const selectedCheckboxes = document.querySelectorAll('.game-checkbox:checked');
+
+        // Clear all children
+        selectedGamesContainer.innerHTML = '';
+
+        if (selectedCheckboxes.length === 0) {
+            selectedGamesContainer.appendChild(noSelectedGamesElement);
+            noSelectedGamesElement.style.display = '';
+        } else {
+            selectedCheckboxes.forEach(checkbox => {
+                const gameItem = checkbox.closest('.list-group-item').cloneNode(true);
+                gameItem.querySelector('.form-check').remove(); // Remove checkbox
+                selectedGamesContainer.appendChild(gameItem);
+            });
+        }
+    }
+});
@@ -0,0 +1,63 @@
+// Image pickers on the profile and board game forms: send the file straight to S3
+// with a presigned POST, then put the upload token in the form instead of the file.
+(function () {
+    const inputs = document.querySelectorAll("input[data-direct-upload]");
+    inputs.forEach(function (input) {
+        const form = input.form;
+        const token = document.getElementById(input.dataset.directUpload);
+        const status = document.getElementById(input.id + "_status");
+        const submits = form.querySelectorAll("[type=submit]");
+
+        function finish(message) {
+            status.textContent = message;
+            submits.forEach((button) => (button.disabled = false));
+        }
+
+        input.addEventListener("change", function () {
+            const file = input.files[0];
+            token.value = "";
+            if (!file) {
+                finish("");
+                return;
+            }
+            if (file.size > Number(input.dataset.maxSize)) {
+                finish("That file is too large.");
+                return;
+            }
+            submits.forEach((button) => (button.disabled = true));
+            status.textContent = "Uploading…";
+
+            const csrf = form.querySelector("[name=csrfmiddlewaretoken]").value;
+            fetch(input.dataset.url, {
+                method: "POST",
+                headers: {"X-CSRFToken": csrf},
+                body: new URLSearchParams({kind: input.dataset.kind, content_type: file.type}),
+            })
+                .then((response) => response.json().then((data) => {
+                    if (!response.ok) {
+                        throw new Error(data.error || "The upload could not start.");
+                    }
+                    return data;
+                }))
+                .then((upload) => {
+                    const body = new FormData();
+                    for (const [name, value] of Object.entries(upload.fields)) {
+                        body.append(name, value);
+                    }
+                    // S3 ignores any field after the file
+                    body.append("file", file);
+                    return fetch(upload.url, {method: "POST", body: body}).then((response) => {
+                        if (!response.ok) {
+                            throw new Error("The upload was refused; check the file's size and type.");
+                        }
+                        token.value = upload.token;
+                        finish("Uploaded, save to keep it.");
+                    });
+                })
+                .catch((error) => {
+                    input.value = "";
+                    finish(error.message);
+                });
+        });
+    });
+})();
@@ -0,0 +1,56 @@
+// Infinite scrolling: append the next page from the JSON feed instead of reloading.
+// Without JavaScript the button is a plain link to the next page.
+(function () {
+    const button = document.getElementById("loadMoreReviews");
+    if (!button) {
+        return;
+    }
+    const feed = document.getElementById("reviewFeed");
+
+    function renderReview(review) {
+        const item = document.createElement("div");
+        item.className = "mb-3 pb-3 border-bottom";
+        const header = document.createElement("div");
+        header.className = "d-flex justify-content-between";
+        const title = document.createElement("h6");
+        title.textContent = review.title || "Review";
+        const meta = document.createElement("div");
+        const rating = document.createElement("span");
+        rating.className = "badge bg-warning text-dark";
+        rating.textContent = review.rating + "/5";
+        const date = document.createElement("small");
+        date.className = "text-muted ms-2";
+        date.textContent = new Date(review.created_at).toLocaleDateString(undefined, {month: "short", day: "2-digit", year: "numeric"});
+        meta.append(rating, date);
+        header.append(title, meta);
+        const comment = document.createElement("p");
+        comment.className = "mb-1";
+        comment.textContent = review.comment;
+        const author = document.createElement("small");
+        author.className = "text-muted";
+        author.textContent = "- " + review.author;
+        item.append(header, comment, author);
+        return item;
+    }
+
+    async function loadMore(event) {
+        event.preventDefault();
+        button.classList.add("disabled");
+        const response = await fetch(button.dataset.feedUrl + "?cursor=" + encodeURIComponent(button.dataset.cursor));
+        const data = await response.json();
+        data.results.forEach(review => feed.appendChild(renderReview(review)));
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.classList.remove("disabled");
+        } else {
+            button.remove();
+        }
+    }
+
+    button.addEventListener("click", loadMore);
+    new IntersectionObserver(entries => {
+        if (entries[0].isIntersecting && !button.classList.contains("disabled")) {
+            button.click();
+        }
+    }).observe(button);
+})();
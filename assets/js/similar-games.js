@@ -0,0 +1,22 @@
+// Game detail page: fill the "similar games" card from the JSON API.
+(function () {
+    const card = document.getElementById("similarGames");
+    if (!card) {
+        return;
+    }
+    fetch(card.dataset.url)
+        .then((response) => (response.ok ? response.json() : {results: []}))
+        .then((data) => {
+            const list = document.getElementById("similarGamesList");
+            for (const game of data.results) {
+                const item = document.createElement("li");
+                item.className = "list-group-item";
+                const link = document.createElement("a");
+                link.href = card.dataset.gameUrl.replace("/0/", "/" + game.id + "/");
+                link.textContent = game.title;
+                item.append(link);
+                list.append(item);
+            }
+            card.classList.toggle("d-none", data.results.length === 0);
+        });
+})();
@@ -12,13 +12,13 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os
 import secrets
+import sys
 from pathlib import Path
 
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
-print(BASE_DIR)
 SITE_ID = 1
 
 # load .env only if in development
@@ -111,6 +111,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so every log record written while handling the request carries its ID.
+    "users.log.RequestIDMiddleware",
+    # Outside the session middleware, so session writes also pin reads to the primary.
+    "users.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     # Django doesn't support serving static assets in a production-ready way, so we use the
     # excellent WhiteNoise package to do so instead. The WhiteNoise middleware must be listed
@@ -151,20 +155,62 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+DB_POOL = os.environ.get("DB_POOL", "")
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 0)) or None
+DB_POOL_STATS_INTERVAL = float(os.environ.get("DB_POOL_STATS_INTERVAL", 60))
+# Must match gunicorn.conf.py, which reads the same variables
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", 5))
+
 if IS_HEROKU_APP:
     # In production on Heroku the database configuration is derived from the `DATABASE_URL`
     # environment variable by the dj-database-url package. `DATABASE_URL` will be set
     # automatically by Heroku when a database addon is attached to your Heroku app. See:
     # https://devcenter.heroku.com/articles/provisioning-heroku-postgres#application-config-vars
     # https://github.com/jazzband/dj-database-url
+    #
+    # DB_POOL picks how connections are shared:
+    # - unset: each thread keeps its own persistent connection (CONN_MAX_AGE);
+    # - "psycopg": each process keeps a psycopg pool, sized from the gunicorn threads and
+    #   capped so WEB_CONCURRENCY pools fit in DB_MAX_CONNECTIONS (see users/pooling.py);
+    # - "pgbouncer": connect through PgBouncer in transaction mode, e.g. Heroku's connection
+    #   pooling attachment (DATABASE_CONNECTION_POOL_URL).
     DATABASES = {
         "default": dj_database_url.config(
-            env="DATABASE_URL",
-            conn_max_age=600,
+            env=(
+                "DATABASE_CONNECTION_POOL_URL"
+                if DB_POOL == "pgbouncer"
+                and "DATABASE_CONNECTION_POOL_URL" in os.environ
+                else "DATABASE_URL"
+            ),
+            # Pooled connections are returned after each request instead
+            conn_max_age=0 if DB_POOL == "psycopg" else 600,
             conn_health_checks=True,
             ssl_require=True,
         ),
     }
+    if DB_POOL == "psycopg":
+        from users.pooling import pool_options
+
+        DATABASES["default"]["OPTIONS"]["pool"] = pool_options(
+            WEB_CONCURRENCY, GUNICORN_THREADS, DB_MAX_CONNECTIONS
+        )
+    elif DB_POOL == "pgbouncer":
+        # Server-side cursors don't survive PgBouncer's transaction pooling
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+    if "DATABASE_REPLICA_URL" in os.environ:
+        # A follower database for the read-only views (see users/routers.py)
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            **dj_database_url.config(
+                env="DATABASE_REPLICA_URL",
+                conn_max_age=DATABASES["default"]["CONN_MAX_AGE"],
+                conn_health_checks=True,
+                ssl_require=True,
+            ),
+            "OPTIONS": DATABASES["default"]["OPTIONS"],
+            "TEST": {"MIRROR": "default"},
+        }
 else:
     # When running locally in development or in CI, a sqlite database file will be used instead
     # to simplify initial setup. Longer term it's recommended to use Postgres locally too.
@@ -172,8 +218,27 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction starts, so concurrent writers (e.g.
+            # run_worker's threads) wait for it instead of failing with "database is locked"
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
         }
     }
+    if os.environ.get("SQLITE_REPLICA"):
+        # A second SQLite file standing in for a read replica; it only catches up when
+        # `python manage.py sync_replica` copies the primary over it.
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "NAME": BASE_DIR / "db.replica.sqlite3",
+        }
+
+# Reads in the listing and detail views go to the "replica" alias when there is one;
+# after a write the browser reads from the primary for REPLICA_PIN_SECONDS.
+DATABASE_ROUTERS = ["users.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 10))
+
+# Shared caches may keep anonymous game and collection pages this many seconds; signed-in
+# pages are always revalidated (see users/conditional.py).
+ANONYMOUS_PAGE_MAX_AGE = int(os.environ.get("ANONYMOUS_PAGE_MAX_AGE", 60))
 
 
 # Password validation
@@ -237,10 +302,62 @@ WHITENOISE_KEEP_ONLY_HASHED_FILES = True
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# How often (in seconds) each process checks whether its in-memory indexes
+# (users/indexes.py) are stale. Lookups between checks never query the database.
+INDEX_VERSION_CHECK_INTERVAL = float(os.environ.get("INDEX_VERSION_CHECK_INTERVAL", 1))
+
+# A shared Redis cache (e.g. Heroku Key-Value Store) when REDIS_URL is set; otherwise each
+# process keeps its own in-memory cache.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            # Heroku's TLS endpoint uses a self-signed certificate
+            "OPTIONS": (
+                {"ssl_cert_reqs": None} if REDIS_URL.startswith("rediss://") else {}
+            ),
+        }
+    }
+
+# Where sessions are kept: "db" (one SELECT per request), "cached_db" (read through the
+# cache, written through to the database) or "signed_cookies" (patrons in signed cookies,
+# librarians and staff in cached_db; see users/sessions.py). Existing sessions stay valid
+# when switching, except that leaving "signed_cookies" signs patrons out.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "cached_db" if REDIS_URL else "db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "users.sessions",
+}[SESSION_BACKEND]
+
+# Staff accounts are redirected to the admin site from every path starting with one of
+# STAFF_RESTRICTED_PATHS, except those starting with one of STAFF_EXEMPT_PATHS or STATIC_URL
+# (see users/middleware.py). "/" restricts every page.
+STAFF_RESTRICTED_PATHS = ["/"]
+STAFF_EXEMPT_PATHS = ["/admin/"]
+
+# Alert emails (users/alerts.py) are printed to the console until a real backend, e.g.
+# "django.core.mail.backends.smtp.EmailBackend" with the EMAIL_HOST* settings, is set.
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
+)
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "noreply@shelfshare.local")
+
 # Customise the default logging config, since by default full Django logs are only emitted when
 # `DEBUG=True` (which otherwise makes diagnosing errors much harder in production):
 # https://docs.djangoproject.com/en/5.1/ref/logging/#default-logging-configuration
 # For more advanced logging you may want to try: https://django-structlog.readthedocs.io
+# The `users` app logs logfmt lines tagged with the request ID through a queue, so the writes
+# happen on a background thread (see `users/log.py`). LOG_LEVEL=DEBUG turns on its debug
+# events, of which only a LOG_DEBUG_SAMPLE_RATE fraction is kept. Under `manage.py test` it
+# defaults to WARNING so its INFO events don't interleave with the test runner's output.
+LOG_LEVEL = os.environ.get(
+    "LOG_LEVEL", "WARNING" if sys.argv[1:2] == ["test"] else "INFO"
+)
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.01))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -249,12 +366,30 @@ LOGGING = {
             "format": "[{levelname}] {message}",
             "style": "{",
         },
+        "logfmt": {
+            "()": "users.log.LogfmtFormatter",
+        },
+    },
+    "filters": {
+        "request_id": {
+            "()": "users.log.RequestIDFilter",
+        },
+        "sample_debug": {
+            "()": "users.log.SamplingFilter",
+            "rate": LOG_DEBUG_SAMPLE_RATE,
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
             "formatter": "simple",
         },
+        "users": {
+            # A factory rather than "class", which Python 3.12+ would wire up as a stock QueueHandler
+            "()": "users.log.BackgroundHandler",
+            "formatter": "logfmt",
+            "filters": ["sample_debug", "request_id"],
+        },
     },
     # Fallback for anything not configured via `loggers`.
     "root": {
@@ -273,6 +408,11 @@ LOGGING = {
             # web crawlers), but still show any ERRORs from HTTP 5xx responses/exceptions.
             "level": "ERROR",
         },
+        "users": {
+            "handlers": ["users"],
+            "level": LOG_LEVEL,
+            "propagate": False,
+        },
     },
 }
 
@@ -316,6 +456,8 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = 'board-game-lending-shoug'
 AWS_S3_REGION_NAME = "us-east-1"
+# A local S3 stand-in (e.g. MinIO) for media and direct uploads, see users/uploads.py
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL")
 
 
 # Django told to use s3 for media
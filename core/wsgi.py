@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 application = get_wsgi_application()
+
+# Import the URLconf (and with it every view module) and build the search-box prefix
+# index before serving; with gunicorn's `preload_app` this runs once in the master and
+# the forked workers share the result instead of each paying for it on its first request
+from django.urls import get_resolver  # noqa: E402
+from users.autocomplete import autocomplete_index  # noqa: E402
+from users.indexes import warm_up  # noqa: E402
+
+get_resolver().url_patterns
+warm_up(autocomplete_index)
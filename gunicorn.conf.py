@@ -29,6 +29,7 @@ bind = ["[::]:{}".format(os.environ.get("PORT", 5006))]
 # Note: When changing the number of dynos/workers/threads you will want to make sure you
 # do not exceed the maximum number of connections to external services such as DBs:
 # https://devcenter.heroku.com/articles/python-concurrency-and-database-connections
+# Setting `DB_POOL=psycopg` and `DB_MAX_CONNECTIONS` makes the settings cap the pools to fit.
 worker_class = "gthread"
 
 # gunicorn will start this many worker processes. The Python buildpack automatically sets a
@@ -36,8 +37,9 @@ worker_class = "gthread"
 # https://devcenter.heroku.com/articles/python-concurrency
 workers = os.environ.get("WEB_CONCURRENCY", 1)
 
-# Each `gthread` worker process will use a pool of this many threads.
-threads = 5
+# Each `gthread` worker process will use a pool of this many threads. With `DB_POOL=psycopg`
+# the settings size each process's database connection pool from the same variable.
+threads = int(os.environ.get("GUNICORN_THREADS", 5))
 
 # Workers silent for more than this many seconds are killed and restarted.
 # Note: This only affects the maximum request time when using the `sync` worker.
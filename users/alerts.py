@@ -0,0 +1,164 @@
+"""
+"Notify me when available" alerts and saved-search alerts.
+
+When a copy comes back (``GameCopy`` flips to available), a background job runs
+``notify_available`` for the game (see ``users/tasks.py``). It reads the game's direct
+subscribers through the ``AvailabilityAlert.game`` index, narrows saved searches in
+SQL before matching the rest in Python, and writes one ``Notification`` per patron
+and game to the outbox. ``deliver_notifications`` sends the outbox by email.
+"""
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    AvailabilityAlert,
+    BoardGame,
+    Collection,
+    GameLoan,
+    Notification,
+    SavedSearch,
+)
+
+DELIVERY_BATCH_SIZE = 100
+
+
+def _saved_search_candidates(games, category_names):
+    """Return the saved searches that could match one of ``games``, narrowed in SQL."""
+    complexities = {game.complexity for game in games}
+    return (
+        SavedSearch.objects.filter(notify=True)
+        .filter(
+            models.Q(category="")
+            | models.Q(category__in=set().union(*category_names.values()))
+        )
+        .filter(
+            models.Q(complexity__isnull=True) | models.Q(complexity__in=complexities)
+        )
+        .filter(
+            models.Q(players__isnull=True)
+            | models.Q(
+                players__gte=min(game.min_players for game in games),
+                players__lte=max(game.max_players for game in games),
+            )
+        )
+    )
+
+
+def notify_available(game_ids):
+    """
+    Write outbox notifications for the given games that now have a free copy.
+
+    Direct alerts fire once and are deleted; saved searches keep notifying. A patron
+    matched by both hears about a game once, and patrons who currently have the game
+    on loan are skipped, keeping their alerts.
+
+    :return: Number of notifications written
+    """
+    games = list(
+        BoardGame.objects.filter(pk__in=game_ids, copies__is_available=True)
+        .distinct()
+        .annotate(
+            is_private=models.Exists(
+                Collection.games.through.objects.filter(
+                    boardgame=models.OuterRef("pk"), collection__visibility="private"
+                )
+            )
+        )
+        .prefetch_related("categories")
+    )
+    if not games:
+        return 0
+    category_names = {
+        game.pk: {category.name for category in game.categories.all()} for game in games
+    }
+
+    recipients = {}
+    alerts = list(
+        AvailabilityAlert.objects.filter(game__in=games).values_list(
+            "pk", "user_id", "game_id"
+        )
+    )
+    for _, user_id, game_id in alerts:
+        recipients.setdefault((user_id, game_id), None)
+    public_games = [game for game in games if not game.is_private]
+    if public_games:
+        for search in _saved_search_candidates(public_games, category_names):
+            for game in public_games:
+                if search.matches(game, category_names[game.pk]):
+                    recipients.setdefault((search.user_id, game.pk), search.name)
+    if not recipients:
+        return 0
+
+    borrowing = set(
+        GameLoan.objects.filter(game_copy__game__in=games, returned=False).values_list(
+            "user_id", "game_copy__game_id"
+        )
+    )
+    titles = {game.pk: game.title for game in games}
+    notifications = [
+        Notification(
+            user_id=user_id,
+            game_id=game_id,
+            subject=f"'{titles[game_id]}' is available to borrow",
+            body=(
+                f"A copy of '{titles[game_id]}' has been returned"
+                + (f" and matches your saved search '{search}'" if search else "")
+                + f". See {reverse('board_game_detail', args=[game_id])}"
+            ),
+        )
+        for (user_id, game_id), search in sorted(recipients.items())
+        if (user_id, game_id) not in borrowing
+    ]
+    # Alerts of patrons skipped because they borrow the game wait for the next return
+    notified = {(n.user_id, n.game_id) for n in notifications}
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications)
+        AvailabilityAlert.objects.filter(
+            pk__in=[
+                pk for pk, user_id, game_id in alerts if (user_id, game_id) in notified
+            ]
+        ).delete()
+    return len(notifications)
+
+
+def deliver_notifications(batch_size=DELIVERY_BATCH_SIZE):
+    """
+    Email the unsent outbox notifications, oldest first, in batches.
+
+    Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, sent over one
+    connection and marked sent in its own transaction, so concurrent deliveries never
+    send a notification twice and a crash can at worst resend one batch.
+
+    :return: Number of notifications sent
+    """
+    sent = 0
+    connection = get_connection()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(sent_at__isnull=True)
+                .select_related("user")
+                .order_by("created_at", "pk")[:batch_size]
+            )
+            if not batch:
+                return sent
+            connection.send_messages(
+                [
+                    EmailMessage(
+                        notification.subject,
+                        notification.body,
+                        settings.DEFAULT_FROM_EMAIL,
+                        [notification.user.email],
+                    )
+                    for notification in batch
+                ]
+            )
+            Notification.objects.filter(pk__in=[n.pk for n in batch]).update(
+                sent_at=timezone.now()
+            )
+        sent += len(batch)
@@ -0,0 +1,227 @@
+"""
+Loan statistics kept in daily rollups (``DailyLoanStats``).
+
+Each loan adds to its borrow day's row when it is created and to its return day's
+row when it is returned, so the dashboard only ever aggregates the small rollup
+table. Both count under the location the loan was borrowed from
+(``GameLoan.pickup_location``), so moving copies later does not rewrite history. ``rebuild_loan_stats`` recomputes the rollups from ``GameLoan`` for history
+(or after bulk inserts, which skip the signals).
+"""
+
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import DailyLoanStats, GameCopy, GameLoan
+from .queries import availability_snapshot
+
+REBUILD_BATCH_SIZE = 1000
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _increment(day, game_id, location, **deltas):
+    """Add ``deltas`` to one rollup row, creating it if this is its first event."""
+    key = {"date": day, "game_id": game_id, "pickup_location": location}
+    increments = {field: models.F(field) + value for field, value in deltas.items()}
+    if DailyLoanStats.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DailyLoanStats.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Another request created the row in the meantime
+        DailyLoanStats.objects.filter(**key).update(**increments)
+
+
+def record_borrow(loan):
+    """Count a new loan on the day it was borrowed."""
+    _increment(
+        timezone.localdate(loan.borrowed_on),
+        loan.game_copy.game_id,
+        loan.pickup_location,
+        borrows=1,
+    )
+
+
+def record_return(loan):
+    """Count a returned loan, its length and whether it was late."""
+    returned_on = loan.returned_on or timezone.now()
+    _increment(
+        timezone.localdate(returned_on),
+        loan.game_copy.game_id,
+        loan.pickup_location,
+        returns=1,
+        overdue_returns=int(bool(loan.due_date) and returned_on > loan.due_date),
+        loan_seconds=max(0, int((returned_on - loan.borrowed_on).total_seconds())),
+    )
+
+
+def rebuild_loan_stats(since=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute the rollups from ``GameLoan`` with grouped queries.
+
+    :param since: Only rebuild days on or after this date (default: everything)
+    :return: Number of rollup rows written
+    """
+    loans = GameLoan.objects.order_by()
+    borrowed = loans
+    returned = loans.filter(returned=True, returned_on__isnull=False)
+    if since is not None:
+        borrowed = borrowed.filter(borrowed_on__date__gte=since)
+        returned = returned.filter(returned_on__date__gte=since)
+
+    rows = {}
+
+    def row(day, game_id, location):
+        key = (day, game_id, location)
+        if key not in rows:
+            rows[key] = DailyLoanStats(
+                date=day, game_id=game_id, pickup_location=location
+            )
+        return rows[key]
+
+    for stats in borrowed.values(
+        day=TruncDate("borrowed_on"),
+        game_id=models.F("game_copy__game"),
+        location=models.F("pickup_location"),
+    ).annotate(count=models.Count("pk")):
+        row(stats["day"], stats["game_id"], stats["location"]).borrows = stats["count"]
+
+    for stats in returned.values(
+        day=TruncDate("returned_on"),
+        game_id=models.F("game_copy__game"),
+        location=models.F("pickup_location"),
+    ).annotate(
+        count=models.Count("pk"),
+        overdue=models.Count(
+            "pk", filter=models.Q(returned_on__gt=models.F("due_date"))
+        ),
+        duration=models.Sum(
+            models.ExpressionWrapper(
+                models.F("returned_on") - models.F("borrowed_on"),
+                output_field=models.DurationField(),
+            )
+        ),
+    ):
+        rollup = row(stats["day"], stats["game_id"], stats["location"])
+        rollup.returns = stats["count"]
+        rollup.overdue_returns = stats["overdue"]
+        rollup.loan_seconds = max(0, int(stats["duration"].total_seconds()))
+
+    with transaction.atomic():
+        existing = DailyLoanStats.objects.all()
+        if since is not None:
+            existing = existing.filter(date__gte=since)
+        existing.delete()
+        DailyLoanStats.objects.bulk_create(rows.values(), batch_size=batch_size)
+    return len(rows)
+
+
+def loan_summary(since):
+    """Return totals, average loan length (days) and overdue rate since a date."""
+    totals = DailyLoanStats.objects.filter(date__gte=since).aggregate(
+        borrows=models.Sum("borrows", default=0),
+        returns=models.Sum("returns", default=0),
+        overdue_returns=models.Sum("overdue_returns", default=0),
+        loan_seconds=models.Sum("loan_seconds", default=0),
+    )
+    returns = totals["returns"]
+    return totals | {
+        "average_loan_days": (
+            round(totals["loan_seconds"] / returns / SECONDS_PER_DAY, 1)
+            if returns
+            else None
+        ),
+        "overdue_rate": (
+            round(totals["overdue_returns"] / returns * 100, 1) if returns else None
+        ),
+    }
+
+
+def weekly_borrows(since, game=None):
+    """Return borrows and returns per week (optionally for one game), oldest first."""
+    stats = DailyLoanStats.objects.filter(date__gte=since)
+    if game is not None:
+        stats = stats.filter(game=game)
+    return list(
+        stats.order_by()
+        .values(week=TruncWeek("date"))
+        .annotate(
+            borrows=models.Sum("borrows"),
+            returns=models.Sum("returns"),
+        )
+        .order_by("week")
+    )
+
+
+def top_games(since, limit=10):
+    """Return the most borrowed games since a date."""
+    return list(
+        DailyLoanStats.objects.filter(date__gte=since)
+        .order_by()
+        .values("game", title=models.F("game__title"))
+        .annotate(borrows=models.Sum("borrows"))
+        .filter(borrows__gt=0)
+        .order_by("-borrows", "title")[:limit]
+    )
+
+
+def location_utilization(since, copies_per_location, today=None):
+    """
+    Return borrows and utilization for each pickup location since a date.
+
+    Utilization is the share of copy-time spent on loan, counting loans returned in
+    the period, against the copies currently shelved at each location.
+
+    :param copies_per_location: ``{location: copies}``, e.g. from the cached
+        availability snapshot so no copy or loan table is scanned
+    """
+    days = max(1, ((today or timezone.localdate()) - since).days + 1)
+    stats = {
+        row["pickup_location"]: row
+        for row in DailyLoanStats.objects.filter(date__gte=since)
+        .order_by()
+        .values("pickup_location")
+        .annotate(
+            borrows=models.Sum("borrows"), loan_seconds=models.Sum("loan_seconds")
+        )
+    }
+    results = []
+    for location, label in GameCopy.PICKUP_LOCATION_CHOICES:
+        row = stats.get(location, {})
+        copies = copies_per_location.get(location, 0)
+        capacity = copies * days * SECONDS_PER_DAY
+        results.append(
+            {
+                "location": location,
+                "label": label,
+                "copies": copies,
+                "borrows": row.get("borrows") or 0,
+                "utilization": (
+                    round(min(1, (row.get("loan_seconds") or 0) / capacity) * 100, 1)
+                    if capacity
+                    else None
+                ),
+            }
+        )
+    return results
+
+
+def dashboard(weeks=12, today=None):
+    """Collect everything the loan dashboard shows for the last ``weeks`` weeks."""
+    today = today or timezone.localdate()
+    since = today - timedelta(weeks=weeks) + timedelta(days=1)
+    copies = {
+        location: sum(total for _, total in games.values())
+        for location, games in availability_snapshot().items()
+    }
+    return {
+        "since": since,
+        "weeks": weeks,
+        "summary": loan_summary(since),
+        "weekly": weekly_borrows(since),
+        "top_games": top_games(since),
+        "locations": location_utilization(since, copies, today),
+    }
@@ -0,0 +1,410 @@
+"""
+Read-only JSON API (v1) for kiosk displays and the mobile client.
+
+Every endpoint sends its successful responses with a strong ETag derived from the
+``ResourceVersion`` counters of the data it reads, so a conditional GET for an
+unchanged resource is answered with ``304 Not Modified`` after a single version
+lookup.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.db import models
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from . import autocomplete, queries
+from .routers import reads_from_replica
+from .similarity import similar_games_index
+from .models import BoardGame, Collection, GameCopy, ResourceVersion
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_SIMILAR_GAMES = 50
+# Suggestions may lag a catalogue edit by this long in browser caches
+AUTOCOMPLETE_MAX_AGE = 60
+
+GAME_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "min_players",
+    "max_players",
+    "playing_time",
+    "complexity",
+    "categories",
+    "available_copies",
+    "image_url",
+    "updated_at",
+)
+
+COLLECTION_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "games",
+    "created_at",
+    "updated_at",
+)
+
+
+class BadRequest(ValueError):
+    """Raised for invalid query parameters; rendered as a 400 JSON error."""
+
+
+def versioned_etag(*names, index=None):
+    """
+    Build an ``etag_func`` for ``@condition`` from the given resource versions.
+
+    The full path is part of the tag so each filter, field selection and page has
+    its own ETag. Views answered from an in-memory ``index`` pass it instead of
+    ``names``: the tag then uses the versions the index was loaded at, which may lag
+    the database by ``INDEX_VERSION_CHECK_INTERVAL``, so it always matches the body.
+    """
+
+    def etag(request, *args, **kwargs):
+        versions = index.load().versions if index else ResourceVersion.current(*names)
+        key = "|".join(
+            [request.get_full_path()]
+            + [f"{name}={version}" for name, version in sorted(versions.items())]
+        )
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    return etag
+
+
+def versioned_condition(*names, index=None):
+    """
+    Answer conditional GETs like ``@condition(etag_func=versioned_etag(...))``.
+
+    The ETag is only sent with ``200`` responses, so a client cannot revalidate a
+    404 or 400 and be told it is still current.
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=versioned_etag(*names, index=index))(
+            view
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                response.headers.pop("ETag", None)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _json_error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _parse_fields(request, allowed):
+    """Return the requested ``fields`` (comma separated) or all allowed fields."""
+    requested = request.GET.get("fields")
+    if not requested:
+        return list(allowed)
+    fields = [field.strip() for field in requested.split(",") if field.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _parse_limit(request):
+    limit = request.GET.get("limit", "")
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return int(limit)
+
+
+def _page(queryset, ordering, request):
+    try:
+        return queries.keyset_page(
+            queryset, ordering, request.GET.get("cursor"), _parse_limit(request)
+        )
+    except BadRequest:
+        raise
+    except ValueError as e:
+        raise BadRequest(str(e)) from e
+
+
+def _serialize_game(game, fields):
+    values = {
+        "id": lambda: game.pk,
+        "title": lambda: game.title,
+        "description": lambda: game.description,
+        "min_players": lambda: game.min_players,
+        "max_players": lambda: game.max_players,
+        "playing_time": lambda: game.playing_time,
+        "complexity": lambda: game.complexity,
+        "categories": lambda: [category.name for category in game.categories.all()],
+        "available_copies": lambda: game.available_copies,
+        "image_url": lambda: game.get_image_url(),
+        "updated_at": lambda: game.updated_at.isoformat(),
+    }
+    return {field: values[field]() for field in fields}
+
+
+def _serialize_collection(collection, fields):
+    values = {
+        "id": lambda: collection.pk,
+        "title": lambda: collection.title,
+        "description": lambda: collection.description,
+        "games": lambda: [
+            {"id": game.pk, "title": game.title} for game in collection.games.all()
+        ],
+        "created_at": lambda: collection.created_at.isoformat(),
+        "updated_at": lambda: collection.updated_at.isoformat(),
+    }
+    return {field: values[field]() for field in fields}
+
+
+def _available_copies_subquery():
+    return models.Subquery(
+        GameCopy.objects.filter(game=models.OuterRef("pk"), is_available=True)
+        .order_by()
+        .values("game")
+        .annotate(count=models.Count("pk"))
+        .values("count")
+    )
+
+
+def _api_view(func):
+    """Turn ``BadRequest`` into a 400 JSON response."""
+
+    def wrapper(request, *args, **kwargs):
+        try:
+            return func(request, *args, **kwargs)
+        except BadRequest as e:
+            return _json_error(str(e))
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@require_GET
+@reads_from_replica
+@versioned_condition(*ResourceVersion.ALL)
+@_api_view
+def game_list(request):
+    """
+    List catalogue games, filtered exactly like ``board_game_catalogue``.
+
+    Query parameters: the catalogue filters (search, complexity, players,
+    availability, category), ``fields``, ``limit`` and ``cursor``.
+    """
+    fields = _parse_fields(request, GAME_FIELDS)
+    games = queries.filter_games(
+        BoardGame.objects.exclude(collections__visibility="private"), request.GET
+    )
+    if "categories" in fields:
+        games = games.prefetch_related("categories")
+    if "available_copies" in fields:
+        games = games.annotate(available_copies=_available_copies_subquery())
+
+    page, next_cursor = _page(games, ("title", "pk"), request)
+    for game in page:
+        if "available_copies" in fields and game.available_copies is None:
+            game.available_copies = 0
+    return JsonResponse(
+        {
+            "results": [_serialize_game(game, fields) for game in page],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@require_GET
+@reads_from_replica
+@versioned_condition(*ResourceVersion.ALL)
+@_api_view
+def game_detail(request, pk):
+    """Return a single catalogue game."""
+    fields = _parse_fields(request, GAME_FIELDS)
+    game = (
+        BoardGame.objects.exclude(collections__visibility="private")
+        .prefetch_related("categories")
+        .annotate(available_copies=_available_copies_subquery())
+        .filter(pk=pk)
+        .first()
+    )
+    if game is None:
+        raise Http404("No such game.")
+    game.available_copies = game.available_copies or 0
+    return JsonResponse(_serialize_game(game, fields))
+
+
+@require_GET
+@versioned_condition(index=similar_games_index)
+@_api_view
+def game_similar(request, pk):
+    """
+    Return the games most similar to one game by categories and attributes.
+
+    Answered from the in-memory feature-vector index (``users/similarity.py``); pass
+    ``k`` (default 10) for the number of games.
+    """
+    k = request.GET.get("k", "10")
+    if not k.isdigit() or not 1 <= int(k) <= MAX_SIMILAR_GAMES:
+        raise BadRequest(f"k must be between 1 and {MAX_SIMILAR_GAMES}")
+    index = similar_games_index.load()
+    snapshot = index.snapshot
+    row = snapshot.rows.get(pk)
+    if row is None or snapshot.hidden[row]:
+        raise Http404("No such game.")
+    return JsonResponse(
+        {
+            "game": pk,
+            "results": [
+                {"id": game_id, "title": title, "score": score}
+                for game_id, title, score in index.similar(pk, int(k))
+            ],
+        }
+    )
+
+
+@require_GET
+@cache_control(max_age=AUTOCOMPLETE_MAX_AGE)
+@_api_view
+def game_autocomplete(request):
+    """
+    Suggest games and categories for the catalogue search box.
+
+    Answered from the in-memory prefix index (``users/autocomplete.py``) without a
+    versioned ETag, since looking up the versions would cost a query per keystroke.
+    Query parameters: ``q`` (what has been typed so far) and ``limit`` (default 8).
+    """
+    limit = request.GET.get("limit", str(autocomplete.DEFAULT_LIMIT))
+    if not limit.isdigit() or not 1 <= int(limit) <= autocomplete.MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {autocomplete.MAX_LIMIT}")
+    catalogue_url = reverse("board_game_catalogue")
+    results = []
+    for kind, pk, label in autocomplete.complete(request.GET.get("q", ""), int(limit)):
+        if kind == autocomplete.GAME:
+            url = reverse("board_game_detail", args=[pk])
+        else:
+            url = f"{catalogue_url}?{urlencode({'category': label})}"
+        results.append({"type": kind, "id": pk, "label": label, "url": url})
+    return JsonResponse({"results": results})
+
+
+@require_GET
+@versioned_condition(
+    ResourceVersion.GAMES, ResourceVersion.AVAILABILITY, ResourceVersion.COLLECTIONS
+)
+@_api_view
+def game_availability(request, pk):
+    """Return available and total copies of one game per pickup location."""
+    games = BoardGame.objects.exclude(collections__visibility="private")
+    if not games.filter(pk=pk).exists():
+        raise Http404("No such game.")
+    labels = dict(GameCopy.PICKUP_LOCATION_CHOICES)
+    counts = {
+        row["pickup_location"]: row
+        for row in GameCopy.objects.filter(game_id=pk)
+        .order_by()
+        .values("pickup_location")
+        .annotate(
+            total=models.Count("pk"),
+            available=models.Count("pk", filter=models.Q(is_available=True)),
+        )
+    }
+    locations = [
+        {
+            "location": location,
+            "label": labels[location],
+            "available": counts.get(location, {}).get("available", 0),
+            "total": counts.get(location, {}).get("total", 0),
+        }
+        for location, _ in GameCopy.PICKUP_LOCATION_CHOICES
+    ]
+    return JsonResponse(
+        {
+            "game": pk,
+            "available": sum(location["available"] for location in locations),
+            "locations": locations,
+        }
+    )
+
+
+@require_GET
+@reads_from_replica
+@versioned_condition(ResourceVersion.COLLECTIONS, ResourceVersion.GAMES)
+@_api_view
+def collection_list(request):
+    """List public collections, optionally with their games."""
+    fields = _parse_fields(request, COLLECTION_FIELDS)
+    collections = Collection.objects.filter(visibility="public")
+    if "games" in fields:
+        collections = collections.prefetch_related(
+            models.Prefetch("games", BoardGame.objects.order_by("title"))
+        )
+    page, next_cursor = _page(collections, ("title", "pk"), request)
+    return JsonResponse(
+        {
+            "results": [_serialize_collection(c, fields) for c in page],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@require_GET
+@reads_from_replica
+@versioned_condition(ResourceVersion.COLLECTIONS, ResourceVersion.GAMES)
+@_api_view
+def collection_detail(request, pk):
+    """Return a single public collection."""
+    fields = _parse_fields(request, COLLECTION_FIELDS)
+    collection = (
+        Collection.objects.filter(visibility="public", pk=pk)
+        .prefetch_related(models.Prefetch("games", BoardGame.objects.order_by("title")))
+        .first()
+    )
+    if collection is None:
+        raise Http404("No such collection.")
+    return JsonResponse(_serialize_collection(collection, fields))
+
+
+@require_GET
+@versioned_condition(ResourceVersion.AVAILABILITY, ResourceVersion.COLLECTIONS)
+@_api_view
+def location_list(request):
+    """List available and total copies per pickup location."""
+    snapshot = queries.public_availability_snapshot()
+    return JsonResponse({"results": queries.location_summary(snapshot)})
+
+
+@require_GET
+@versioned_condition(ResourceVersion.AVAILABILITY, ResourceVersion.COLLECTIONS)
+@_api_view
+def location_inventory(request, location):
+    """
+    Return copy counts for every game shelved at one pickup location.
+
+    Served from the cached availability snapshot, without games in private
+    collections; pass ``available=1`` to list only games with a copy on the shelf.
+    """
+    if location not in dict(GameCopy.PICKUP_LOCATION_CHOICES):
+        raise Http404("Unknown pickup location.")
+    snapshot = queries.public_availability_snapshot()
+    available_only = request.GET.get("available") == "1"
+    games = [
+        {"id": game_id, "available": available, "total": total}
+        for game_id, (available, total) in sorted(snapshot[location].items())
+        if available or not available_only
+    ]
+    summary = next(
+        row for row in queries.location_summary(snapshot) if row["location"] == location
+    )
+    return JsonResponse(summary | {"games": games})
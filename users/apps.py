@@ -7,3 +7,5 @@ class UsersConfig(AppConfig):
 
     def ready(self):
         import users.signals  # keep this here login doesn't work without it... # noqa: F401
+        import users.tasks  # registers the background job tasks # noqa: F401
+        import users.checks  # registers the system checks # noqa: F401
@@ -0,0 +1,193 @@
+"""
+Build step for the site's own static assets.
+
+Sources live in ``assets/`` at the top of the repository and
+``python manage.py build_assets`` writes the results to ``users/static/build/``:
+
+- ``site.min.css`` and ``site.min.js``, every ``assets/css/*.css`` and
+  ``assets/js/*.js`` concatenated in name order and minified, so each page loads one
+  stylesheet and one deferred script that browsers cache across pages;
+- ``images/<name>-<width>.webp`` for each default image and width in
+  ``IMAGE_WIDTHS``, sized for where the templates show them.
+
+The output is committed, since Heroku runs ``collectstatic`` itself. From there
+WhiteNoise serves it under content-hashed names, compressed, with
+``Cache-Control: max-age=315360000, public, immutable``. ``manifest.json`` records a
+hash of the sources and build settings, and ``build_assets --check`` fails when the
+output is out of date.
+
+The minifiers are deliberately conservative (whitespace and comments only), which
+with WhiteNoise's compression on top gets almost all of what a full minifier would.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+SOURCE_DIR = Path(settings.BASE_DIR) / "assets"
+BUILD_DIR = Path(__file__).resolve().parent / "static" / "build"
+MANIFEST = "manifest.json"
+
+# Thumbnails (collection and management tables), game pages and cards, avatars
+IMAGE_WIDTHS = {
+    "default-game.png": (96, 513),
+    "default-avatar.jpg": (300,),
+}
+WEBP_QUALITY = 80
+
+_CSS_STRINGS = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_STATIC_REFERENCES = re.compile(r"""(?:href|src)=["']([^"']+)["']""")
+# Sent compressed by WhiteNoise, so weighed compressed
+_COMPRESSED_TYPES = {".css": "css", ".js": "js", ".svg": "images", ".ico": "images"}
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace, leaving quoted strings alone."""
+    parts = _CSS_STRINGS.split(re.sub(r"/\*.*?\*/", "", source, flags=re.S))
+    # Even parts are outside strings
+    for i in range(0, len(parts), 2):
+        text = re.sub(r"\s+", " ", parts[i])
+        text = re.sub(r" ?([{};,]) ?", r"\1", text)
+        parts[i] = text.replace(": ", ":").replace(";}", "}")
+    return "".join(parts).strip() + "\n"
+
+
+def minify_js(source):
+    """
+    Drop indentation, blank lines and whole-line ``//`` comments.
+
+    Nothing inside a line is touched, so this is safe for any script that does not
+    spread a string over several lines.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _sources():
+    return sorted(
+        path
+        for pattern in ("css/*.css", "js/*.js", "images/*")
+        for path in SOURCE_DIR.glob(pattern)
+    )
+
+
+def source_hash():
+    """Hash the sources and build settings the output is made from."""
+    digest = hashlib.sha256()
+    digest.update(repr((sorted(IMAGE_WIDTHS.items()), WEBP_QUALITY)).encode())
+    for path in _sources():
+        digest.update(path.relative_to(SOURCE_DIR).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _bundle(pattern, minify):
+    return [minify(path.read_text()) for path in sorted(SOURCE_DIR.glob(pattern))]
+
+
+def _resize(source, widths):
+    from PIL import Image
+
+    outputs = {}
+    with Image.open(source) as image:
+        for width in widths:
+            if width > image.width:
+                raise ValueError(
+                    f"{source.name} is {image.width}px wide, can't make {width}px"
+                )
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            name = f"images/{source.stem}-{width}.webp"
+            outputs[name] = resized
+    return outputs
+
+
+def build():
+    """
+    Write the bundles, image sizes and manifest to ``BUILD_DIR``.
+
+    :return: ``{output name: size in bytes}``
+    """
+    (BUILD_DIR / "images").mkdir(parents=True, exist_ok=True)
+    sizes = {}
+
+    scripts = [
+        # A script without a trailing semicolon must not run into the next one
+        script if script.endswith(";") else script + ";"
+        for script in _bundle("js/*.js", minify_js)
+    ]
+    bundles = {
+        "site.min.css": "".join(_bundle("css/*.css", minify_css)),
+        "site.min.js": "\n".join(scripts) + "\n",
+    }
+    for name, content in bundles.items():
+        (BUILD_DIR / name).write_text(content)
+        sizes[name] = len(content.encode())
+
+    for source_name, widths in IMAGE_WIDTHS.items():
+        for name, image in _resize(SOURCE_DIR / "images" / source_name, widths).items():
+            image.save(BUILD_DIR / name, "WEBP", quality=WEBP_QUALITY, method=6)
+            sizes[name] = (BUILD_DIR / name).stat().st_size
+
+    manifest = {"source_hash": source_hash(), "outputs": sorted(sizes)}
+    (BUILD_DIR / MANIFEST).write_text(json.dumps(manifest, indent=2) + "\n")
+    return sizes
+
+
+def check():
+    """
+    Tell whether the committed output matches the sources.
+
+    :return: List of human readable problems, empty if the build is current
+    """
+    try:
+        manifest = json.loads((BUILD_DIR / MANIFEST).read_text())
+    except FileNotFoundError:
+        return ["no build output; run `python manage.py build_assets`"]
+    problems = [
+        f"{name} is missing"
+        for name in manifest["outputs"]
+        if not (BUILD_DIR / name).exists()
+    ]
+    if manifest["source_hash"] != source_hash():
+        problems.append("assets/ changed since the last build")
+    if problems:
+        problems.append("run `python manage.py build_assets` and commit the result")
+    return problems
+
+
+def page_weight(html):
+    """
+    Weigh a rendered page and the same-origin static files it references.
+
+    Text (HTML, CSS, JS, SVG, icons) is weighed gzipped, as WhiteNoise sends it;
+    images as they are. Files on other origins (CDNs) are only counted.
+    :return: ``{"html", "css", "js", "images", "total": bytes, "external": count}``
+    """
+    weight = dict.fromkeys(("css", "js", "images", "external"), 0)
+    weight["html"] = len(gzip.compress(html.encode()))
+    static_url = settings.STATIC_URL
+    if not static_url.startswith(("/", "http")):
+        static_url = "/" + static_url
+    for url in set(_STATIC_REFERENCES.findall(html)):
+        if url.startswith(static_url):
+            path = finders.find(url.removeprefix(static_url).split("?")[0])
+            if path is None:
+                continue
+            data = Path(path).read_bytes()
+            kind = _COMPRESSED_TYPES.get(Path(path).suffix)
+            if kind is None:
+                weight["images"] += len(data)
+            else:
+                weight[kind] += len(gzip.compress(data))
+        elif url.startswith(("http://", "https://", "//")) and url.endswith(
+            (".css", ".js")
+        ):
+            weight["external"] += 1
+    weight["total"] = weight["html"] + weight["css"] + weight["js"] + weight["images"]
+    return weight
@@ -0,0 +1,104 @@
+"""
+Search-box suggestions from an in-memory prefix index over game titles and categories.
+
+Every label is stored under a normalised key (case folded, accents stripped, runs of
+whitespace collapsed) in sorted lists, so the entries starting with a prefix are one
+contiguous slice found with two ``bisect`` calls. A second list holds the same labels
+keyed from each later word, so "ride" also finds "Ticket to Ride".
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+
+from .indexes import VersionedIndex
+from .models import BoardGame, Category, ResourceVersion
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+GAME = "game"
+CATEGORY = "category"
+
+_WORD_START = re.compile(r"(?<!\w)\w")
+
+
+def normalize(text):
+    """Fold ``text`` into the form the index compares prefixes in."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class PrefixTable:
+    """Sorted ``(key, kind, id, label)`` entries with their keys for bisecting."""
+
+    def __init__(self, entries):
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def starting_with(self, prefix):
+        """Yield the entries whose key starts with ``prefix``, in key order."""
+        for i in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                return
+            yield self.entries[i]
+
+
+class AutocompleteIndex(VersionedIndex):
+    """Prefix index of public game titles and category names."""
+
+    resources = (ResourceVersion.GAMES, ResourceVersion.COLLECTIONS)
+
+    def build(self):
+        labels = [
+            (GAME, pk, title)
+            for pk, title in BoardGame.objects.exclude(
+                collections__visibility="private"
+            ).values_list("pk", "title")
+        ] + [
+            (CATEGORY, pk, name)
+            for pk, name in Category.objects.values_list("pk", "name")
+        ]
+
+        whole, words = [], []
+        for kind, pk, label in labels:
+            key = normalize(label)
+            whole.append((key, kind, pk, label))
+            for match in _WORD_START.finditer(key):
+                start = match.start()
+                if start > 0:
+                    words.append((key[start:], kind, pk, label))
+        # Both tables are swapped in together so readers never mix two builds
+        self.tables = (PrefixTable(whole), PrefixTable(words))
+
+    def complete(self, query, limit=DEFAULT_LIMIT):
+        """
+        Return up to ``limit`` suggestions for what the user has typed so far.
+
+        Labels starting with the query come first, then labels with a later word
+        starting with it; each group is alphabetical.
+
+        :return: ``[(kind, id, label), ...]`` where kind is "game" or "category"
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        seen, results = set(), []
+        for table in self.tables:
+            for _, kind, pk, label in table.starting_with(prefix):
+                if (kind, pk) in seen:
+                    continue
+                seen.add((kind, pk))
+                results.append((kind, pk, label))
+                if len(results) == limit:
+                    return results
+        return results
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def complete(query, limit=DEFAULT_LIMIT):
+    """Return suggestions for ``query`` from the process-wide index."""
+    return autocomplete_index.load().complete(query, limit)
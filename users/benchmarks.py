@@ -0,0 +1,403 @@
+"""
+Latency and query-count benchmarks for the lending workflows.
+
+Scenarios are driven in-process through the Django test client (which lets us count
+queries) or, with ``run_http_benchmarks``, against a running server over HTTP.
+"""
+
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from .models import User, BoardGame, Category, Collection, GameLoan
+
+REPORT_VERSION = 1
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` using linear interpolation."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies_ms, query_counts=None):
+    """Collapse raw samples into the numbers stored in a report."""
+    summary = {
+        "samples": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3),
+    }
+    if query_counts:
+        summary["queries"] = max(query_counts)
+    return summary
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries without needing DEBUG logging."""
+
+    def __init__(self):
+        self.count = 0
+        self.session_count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if '"django_session"' in sql:
+            self.session_count += 1
+        return execute(sql, params, many, context)
+
+
+class BenchmarkFixtures:
+    """The handful of rows each scenario needs, picked from already-seeded data."""
+
+    def __init__(self):
+        patron_group, _ = Group.objects.get_or_create(name="Patron")
+        librarian_group, _ = Group.objects.get_or_create(name="Librarian")
+
+        self.patron, _ = User.objects.get_or_create(email="bench-patron@example.com")
+        self.patron.groups.add(patron_group)
+        self.librarian, _ = User.objects.get_or_create(
+            email="bench-librarian@example.com"
+        )
+        self.librarian.groups.add(librarian_group)
+
+        # Keep the benchmark patron under the three-loan limit between runs
+        for loan in GameLoan.objects.filter(user=self.patron, returned=False):
+            loan.mark_as_returned()
+
+        self.game = (
+            BoardGame.objects.filter(copies__is_available=True).order_by("pk").first()
+        )
+        if self.game is None:
+            raise ValueError("Benchmarks need at least one game with a free copy.")
+        self.category = Category.objects.order_by("name").first()
+        self.collection, _ = Collection.objects.get_or_create(
+            title="Benchmark Collection", creator=self.patron
+        )
+        self.collection_games = list(
+            BoardGame.objects.order_by("pk").values_list("pk", flat=True)[:10]
+        )
+
+
+def catalogue_scenarios(fixtures):
+    """Catalogue requests, one for each filter the sidebar offers."""
+    url = reverse("board_game_catalogue")
+    return [
+        ("catalogue", url, {}),
+        ("catalogue_search", url, {"search": "Castle"}),
+        ("catalogue_complexity", url, {"complexity": "3"}),
+        ("catalogue_players", url, {"players": "4"}),
+        ("catalogue_available", url, {"availability": "available"}),
+        (
+            "catalogue_category",
+            url,
+            {"category": fixtures.category.name if fixtures.category else ""},
+        ),
+    ]
+
+
+class ClientBenchmark:
+    """Run every scenario through the Django test client and collect samples."""
+
+    def __init__(self, iterations=20, warmup=2):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.fixtures = BenchmarkFixtures()
+        # "testserver" is only an allowed host under the test runner
+        self.patron_client = Client(HTTP_HOST="localhost")
+        self.patron_client.force_login(self.fixtures.patron)
+        self.librarian_client = Client(HTTP_HOST="localhost")
+        self.librarian_client.force_login(self.fixtures.librarian)
+
+    def _measure(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = request()
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"Benchmark request failed with {response.status_code}")
+        return elapsed, counter.count
+
+    def _run(self, request, setup=None):
+        latencies, query_counts = [], []
+        for i in range(self.warmup + self.iterations):
+            if setup is not None:
+                setup()
+            elapsed, queries = self._measure(request)
+            if i >= self.warmup:
+                latencies.append(elapsed)
+                query_counts.append(queries)
+        return summarize(latencies, query_counts)
+
+    def run(self):
+        fixtures = self.fixtures
+        results = {}
+
+        for name, url, params in catalogue_scenarios(fixtures):
+            results[name] = self._run(
+                lambda u=url, p=params: self.patron_client.get(u, p)
+            )
+
+        # Anonymous, so the only possible query is the index's version check
+        autocomplete_url = reverse("api_game_autocomplete")
+        anonymous_client = Client(HTTP_HOST="localhost")
+        results["autocomplete"] = self._run(
+            lambda: anonymous_client.get(autocomplete_url, {"q": "Ca"})
+        )
+
+        detail_url = reverse("board_game_detail", args=[fixtures.game.pk])
+        results["detail"] = self._run(lambda: self.patron_client.get(detail_url))
+        # A browser revalidating its copy: answered with 304 after the ETag's query
+        etag = self.patron_client.get(detail_url)["ETag"]
+        results["detail_revalidate"] = self._run(
+            lambda: self.patron_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        )
+
+        profile_url = reverse("profile", args=[fixtures.patron.pk])
+        results["profile"] = self._run(lambda: self.patron_client.get(profile_url))
+
+        results.update(self._run_borrow_return())
+
+        requests_url = reverse("manage_requests")
+        results["manage_requests"] = self._run(
+            lambda: self.librarian_client.get(requests_url)
+        )
+
+        edit_url = reverse("edit_collection", args=[fixtures.collection.pk])
+        results["collection_edit"] = self._run(
+            lambda: self.patron_client.post(
+                edit_url,
+                {
+                    "title": fixtures.collection.title,
+                    "description": "",
+                    "visibility": "public",
+                    "games": fixtures.collection_games,
+                },
+            )
+        )
+        return results
+
+    def _run_borrow_return(self):
+        """Borrow and return the same game so every iteration starts from one state."""
+        borrow_url = reverse("borrow_game", args=[self.fixtures.game.pk])
+        borrow_latencies, borrow_queries = [], []
+        return_latencies, return_queries = [], []
+        for i in range(self.warmup + self.iterations):
+            elapsed, queries = self._measure(lambda: self.patron_client.get(borrow_url))
+            loan = GameLoan.objects.filter(
+                user=self.fixtures.patron, returned=False
+            ).latest("borrowed_on")
+            return_url = reverse("return_game", args=[loan.pk])
+            returned_elapsed, returned_queries = self._measure(
+                lambda u=return_url: self.patron_client.post(u)
+            )
+            if i >= self.warmup:
+                borrow_latencies.append(elapsed)
+                borrow_queries.append(queries)
+                return_latencies.append(returned_elapsed)
+                return_queries.append(returned_queries)
+        return {
+            "borrow": summarize(borrow_latencies, borrow_queries),
+            "return": summarize(return_latencies, return_queries),
+        }
+
+
+def run_http_benchmarks(
+    base_url, paths, requests_per_path=50, concurrency=5, cookies=None, timeout=10
+):
+    """
+    Locust-style load driver: fire concurrent GET requests at a running server.
+
+    :param paths: Mapping of scenario name to path, e.g. ``{"catalogue": "/catalogue/"}``
+    :param cookies: Optional cookies (e.g. ``{"sessionid": ...}``) for logged-in pages
+    """
+    import requests
+
+    session = requests.Session()
+    if cookies:
+        session.cookies.update(cookies)
+
+    def fetch(path):
+        start = time.perf_counter()
+        response = session.get(base_url.rstrip("/") + path, timeout=timeout)
+        elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, response.status_code
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, path in paths.items():
+            samples = list(pool.map(fetch, [path] * requests_per_path))
+            latencies = [elapsed for elapsed, _ in samples]
+            summary = summarize(latencies)
+            summary["errors"] = sum(1 for _, status in samples if status >= 400)
+            results[name] = summary
+    return results
+
+
+def middleware_overhead(middleware_class=None, rounds=20, calls=2000):
+    """
+    Time a middleware per request, net of the empty view it wraps.
+
+    The cases are the requests ``BlockAdminMiddleware`` (the default) sees in
+    production. Anonymous requests get a fresh session and lazy user per call, as
+    ``AuthenticationMiddleware`` attaches them, so evaluating the user is part of the
+    cost; signed-in users are attached already loaded, leaving out the session and
+    user queries a real request would add.
+
+    :return: ``{case: {"p50_us": ..., "p95_us": ...}}`` per request, in microseconds
+    """
+    if middleware_class is None:
+        from .middleware import BlockAdminMiddleware as middleware_class
+
+    factory = RequestFactory()
+    signed_in = {settings.SESSION_COOKIE_NAME: "benchmark"}
+    cases = {
+        "static": ("/static/css/site.css", {}, None),
+        "anonymous": ("/games/", {}, None),
+        "patron": ("/games/", signed_in, User(email="patron@example.com")),
+        "staff_admin": ("/admin/", signed_in, User(is_staff=True)),
+        "staff_redirect": ("/games/", signed_in, User(is_staff=True)),
+    }
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    response = HttpResponse()
+
+    def view(request):
+        return response
+
+    middleware = middleware_class(view)
+    results = {}
+    for name, (path, cookies, user) in cases.items():
+        request = factory.get(path)
+        request.COOKIES = cookies
+        samples = []
+        for _ in range(rounds):
+            timings = []
+            for handler in (middleware, view):
+                start = time.perf_counter()
+                for _ in range(calls):
+                    if user is None:
+                        request.session = session_store()
+                        request.user = SimpleLazyObject(partial(get_user, request))
+                    else:
+                        request.user = user
+                    handler(request)
+                timings.append(time.perf_counter() - start)
+            samples.append((timings[0] - timings[1]) / calls * 1e6)
+        results[name] = {
+            "p50_us": round(percentile(samples, 50), 3),
+            "p95_us": round(percentile(samples, 95), 3),
+        }
+    return results
+
+
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "users.sessions",
+}
+
+
+def session_round_trips(iterations=20, warmup=2):
+    """
+    Time a signed-in patron's profile page under each session engine.
+
+    ``session_queries`` counts the queries on the session table, i.e. the round
+    trips the engine adds to every authenticated request; ``queries`` is the total.
+
+    :return: ``{engine: summary}`` like the client benchmark scenarios
+    """
+    patron, _ = User.objects.get_or_create(email="bench-patron@example.com")
+    patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+    url = reverse("profile", args=[patron.pk])
+    results = {}
+    for name, engine in SESSION_ENGINES.items():
+        with override_settings(SESSION_ENGINE=engine):
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(patron)
+            latencies, query_counts, session_counts = [], [], []
+            for i in range(warmup + iterations):
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"Benchmark request failed with {response.status_code}"
+                    )
+                if i >= warmup:
+                    latencies.append(elapsed)
+                    query_counts.append(counter.count)
+                    session_counts.append(counter.session_count)
+        results[name] = summarize(latencies, query_counts)
+        results[name]["session_queries"] = max(session_counts)
+    return results
+
+
+def build_report(scenarios, scale=None, driver="client"):
+    return {
+        "version": REPORT_VERSION,
+        "driver": driver,
+        "scale": scale,
+        "database": connection.vendor,
+        "scenarios": scenarios,
+    }
+
+
+def compare_reports(report, baseline, latency_tolerance=1.0):
+    """
+    Diff a report against a stored baseline.
+
+    Query counts must not grow at all. Latency may grow by ``latency_tolerance``
+    (1.0 allows up to twice the baseline p95) to absorb noise between machines.
+    :return: List of human readable regression messages, empty if none
+    """
+    regressions = []
+    for name, expected in baseline.get("scenarios", {}).items():
+        actual = report["scenarios"].get(name)
+        if actual is None:
+            regressions.append(f"{name}: scenario missing from report")
+            continue
+        if "queries" in expected and actual.get("queries", 0) > expected["queries"]:
+            regressions.append(
+                f"{name}: {actual['queries']} queries (baseline {expected['queries']})"
+            )
+        limit = expected["p95_ms"] * (1 + latency_tolerance)
+        if actual["p95_ms"] > limit:
+            regressions.append(
+                f"{name}: p95 {actual['p95_ms']}ms exceeds {limit:.1f}ms "
+                f"(baseline {expected['p95_ms']}ms)"
+            )
+    return regressions
+
+
+def load_report(path):
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def write_report(report, path):
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+        report_file.write("\n")
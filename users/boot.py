@@ -0,0 +1,151 @@
+"""
+Startup profile of the web process.
+
+``profile_boot`` runs, in a fresh interpreter, what the gunicorn master does before it
+forks the workers (``preload_app``, see ``core/wsgi.py``): load the settings, set up the
+apps, then import the WSGI module, which loads the middleware and URLconf and builds the
+in-memory indexes. It reports the time each phase took, the whole boot as seen from
+outside (interpreter start-up included), peak resident memory, and whether modules
+that should only load on first use (``DEFERRED_MODULES``) stayed unloaded. Optionally it
+also ranks the slowest imports from Python's ``-X importtime``.
+
+Run it with ``python manage.py boot_profile``; ``--budget`` fails on regressions.
+"""
+
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Nothing from Django at module level: the child process imports this module before
+# it starts timing, so anything imported here would go missing from the phases
+BASE_DIR = Path(__file__).resolve().parent.parent
+# Imported on first use only; loading them at boot is a regression
+DEFERRED_MODULES = ("boto3", "botocore")
+
+
+def _boot():
+    """Boot the app in this (fresh) process and print the measurements as JSON."""
+    started = time.perf_counter()
+    phases = {}
+
+    def phase(name):
+        nonlocal started
+        now = time.perf_counter()
+        phases[name] = round((now - started) * 1000, 1)
+        started = now
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    from django.conf import settings
+
+    settings.INSTALLED_APPS
+    phase("settings")
+
+    import django
+
+    django.setup()
+    phase("apps")
+
+    import core.wsgi  # noqa: F401
+
+    phase("wsgi")
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    max_rss_mb = max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(
+        json.dumps(
+            {
+                "phases_ms": phases,
+                "max_rss_mb": round(max_rss_mb, 1),
+                "modules": len(sys.modules),
+                "loaded_deferred": [m for m in DEFERRED_MODULES if m in sys.modules],
+            }
+        )
+    )
+
+
+def parse_importtime(output, limit=15):
+    """
+    Return the ``limit`` slowest imports from ``-X importtime`` output.
+
+    :return: List of ``(module, cumulative_ms, self_ms)``, slowest first
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        imports.append(
+            (
+                module.strip(),
+                round(int(cumulative_us) / 1000, 1),
+                round(int(self_us) / 1000, 1),
+            )
+        )
+    imports.sort(key=lambda entry: entry[1], reverse=True)
+    return imports[:limit]
+
+
+def _run(importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", "from users.boot import _boot; _boot()"]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True)
+    boot_ms = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        raise RuntimeError(f"Booting the app failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["boot_ms"] = round(boot_ms, 1)
+    return report, result.stderr
+
+
+def profile_boot(runs=3, imports=0):
+    """
+    Boot the app ``runs`` times in fresh interpreters and report the median run.
+
+    :param imports: Also boot once under ``-X importtime`` and add this many of the
+        slowest imports as ``imports``; that run is not counted, as it is slower
+    """
+    reports = [_run()[0] for _ in range(max(runs, 1))]
+    report = sorted(reports, key=lambda r: r["boot_ms"])[len(reports) // 2]
+    report["runs"] = len(reports)
+    report["boot_ms_spread"] = [
+        min(r["boot_ms"] for r in reports),
+        max(r["boot_ms"] for r in reports),
+    ]
+    report["max_rss_mb"] = statistics.median(r["max_rss_mb"] for r in reports)
+    if imports:
+        report["imports"] = parse_importtime(_run(importtime=True)[1], imports)
+    return report
+
+
+def check_budget(report, budget):
+    """
+    Compare a ``profile_boot`` report with a budget.
+
+    The budget may set ``boot_ms`` and ``max_rss_mb`` ceilings; any module in
+    ``DEFERRED_MODULES`` loaded at boot is always a regression.
+    :return: List of human readable regression messages, empty if none
+    """
+    regressions = []
+    if "boot_ms" in budget and report["boot_ms"] > budget["boot_ms"]:
+        regressions.append(
+            f"boot took {report['boot_ms']}ms (budget {budget['boot_ms']}ms)"
+        )
+    if "max_rss_mb" in budget and report["max_rss_mb"] > budget["max_rss_mb"]:
+        regressions.append(
+            f"boot used {report['max_rss_mb']}MB resident memory "
+            f"(budget {budget['max_rss_mb']}MB)"
+        )
+    for module in report["loaded_deferred"]:
+        regressions.append(f"{module} is imported at boot; import it on first use")
+    return regressions
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core import checks
+
+# Session engines that read sessions through SESSION_CACHE_ALIAS
+CACHED_SESSION_ENGINES = {
+    "django.contrib.sessions.backends.cached_db",
+    "users.sessions",
+}
+
+
+@checks.register(checks.Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """Warn when cached sessions use a cache that each process keeps to itself."""
+    if settings.DEBUG or settings.SESSION_ENGINE not in CACHED_SESSION_ENGINES:
+        return []
+    backend = settings.CACHES[settings.SESSION_CACHE_ALIAS]["BACKEND"]
+    if backend != "django.core.cache.backends.locmem.LocMemCache":
+        return []
+    return [
+        checks.Warning(
+            "Sessions are cached per process, so a session ended in one process "
+            "(e.g. by logging out) stays valid in the others until it expires.",
+            hint="Set REDIS_URL to share the cache, or SESSION_BACKEND=db.",
+            id="users.W001",
+        )
+    ]
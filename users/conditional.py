@@ -0,0 +1,81 @@
+"""
+Conditional GET for the HTML detail pages.
+
+``@conditional_page`` gives a page a strong ETag built from a "validators" function
+that returns, in one query, everything the rendered page depends on (see
+``queries.game_detail_validators``). A browser revalidating an unchanged page gets
+``304 Not Modified`` after that one query instead of the full render.
+
+Signed-in pages are ``Cache-Control: private, no-cache``: only the browser keeps
+them, and it revalidates every time. The ETag also covers who is signed in and their
+CSRF secret, so a copy rendered for another session (whose forms would be rejected)
+is never reused. Anonymous pages are the same for everyone and may be kept by shared
+caches for ``ANONYMOUS_PAGE_MAX_AGE`` seconds. Both vary on ``Cookie``.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def page_etag(validators_func):
+    """Build an ``etag_func`` for ``@condition`` from a validators function."""
+
+    def etag(request, *args, **kwargs):
+        # Flash messages show once; a cached copy would drop them
+        if len(messages.get_messages(request)):
+            return None
+        validators = validators_func(request, *args, **kwargs)
+        if validators is None:
+            return None
+        parts = [request.get_full_path(), repr(validators)]
+        user = request.user
+        if user.is_authenticated:
+            # Makes sure the CSRF secret exists now, not only once the page renders
+            get_token(request)
+            parts += [
+                str(user.pk),
+                user.email,
+                user.given_name or "",
+                request.META["CSRF_COOKIE"],
+            ]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+    return etag
+
+
+def conditional_page(validators_func):
+    """
+    Answer conditional GETs for the decorated view and set its caching headers.
+
+    :param validators_func: Called with the view's arguments; returns a value that
+        changes whenever the page would render differently, or None to render it
+        without an ETag (e.g. when the user may not see it)
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=page_etag(validators_func))(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code == 304 or response.has_header("ETag"):
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True, no_cache=True)
+                else:
+                    patch_cache_control(
+                        response,
+                        public=True,
+                        max_age=settings.ANONYMOUS_PAGE_MAX_AGE,
+                    )
+                patch_vary_headers(response, ["Cookie"])
+            return response
+
+        return wrapper
+
+    return decorator
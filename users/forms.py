@@ -1,9 +1,107 @@
+import logging
+
 from django import forms
-from .models import User, Category, BoardGame, GameCopy, Collection
+from .models import (
+    User,
+    Category,
+    BoardGame,
+    GameCopy,
+    Collection,
+    ResourceVersion,
+    SavedSearch,
+)
 from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from . import uploads
+
+
+logger = logging.getLogger(__name__)
+
+
+class DirectUploadInput(forms.Widget):
+    """
+    A file picker that uploads straight to storage and submits the upload token.
+
+    Like ``ClearableFileInput``, it links the current file and, when the field is
+    optional, offers a "Clear" checkbox.
+    """
+
+    input_type = "file"
+    template_name = "users/widgets/direct_upload.html"
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def clear_checkbox_name(self, name):
+        return f"{name}-clear"
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        rule = uploads.RULES[self.kind]
+        # A token after a failed submit, otherwise the model's current file
+        is_token = isinstance(value, str)
+        context["widget"].update(
+            value=value if is_token else "",
+            current=None if is_token or not value else value,
+            clear_name=self.clear_checkbox_name(name),
+            kind=self.kind,
+            accept=",".join(rule.content_types),
+            max_size=rule.max_size,
+            presign_url=reverse("presign_upload"),
+        )
+        return context
+
+    def value_from_datadict(self, data, files, name):
+        token = data.get(name)
+        if (
+            not token
+            and not self.is_required
+            and forms.CheckboxInput().value_from_datadict(
+                data, files, self.clear_checkbox_name(name)
+            )
+        ):
+            # False makes FileField.save_form_data clear the field
+            return False
+        return token
+
+
+class DirectUploadField(forms.CharField):
+    """
+    The key of a file the browser uploaded with ``uploads.presign``.
+
+    Cleans to ``None`` when nothing was uploaded, which leaves the model's file
+    field as it was, and to ``False`` when the "Clear" box was ticked.
+    """
+
+    def __init__(self, kind, **kwargs):
+        kwargs.setdefault("required", False)
+        kwargs.setdefault("widget", DirectUploadInput(kind))
+        super().__init__(**kwargs)
+        self.kind = kind
+
+    def bound_data(self, data, initial):
+        # Keep showing the current file when the form comes back with errors
+        return data or initial
+
+    def clean(self, value):
+        if value is False:
+            return False
+        token = super().clean(value)
+        if not token:
+            return None
+        return uploads.claim(self.kind, token)
 
 
 class ProfileEditForm(forms.ModelForm):
+    # Size and type limits are in the upload policy, see users/uploads.py
+    profile_picture = DirectUploadField(
+        "profile_picture",
+        label="Profile picture",
+        help_text="Upload a JPG, PNG, or GIF image (Max 2MB).",
+    )
+
     class Meta:
         model = User
         fields = ["given_name", "family_name", "email", "profile_picture"]
@@ -13,27 +111,6 @@ class ProfileEditForm(forms.ModelForm):
         for field in self.fields:
             if field != "profile_picture":
                 self.fields[field].widget.attrs.update({"class": "form-control"})
-            else:
-                self.fields[field].widget.attrs.update({"class": "form-control-file"})
-                self.fields["profile_picture"].help_text = (
-                    "Upload a JPG, PNG, or GIF image (Max 2MB)."
-                )
-
-    def clean_profile_picture(
-        self,
-    ):  # Overriding Djangos default to get our specific message out (only works for the image size msg not type)
-        picture = self.cleaned_data.get("profile_picture")
-
-        if picture:
-            max_file_size = (
-                2 * 1024 * 1024
-            )  # 2MB Image size gap, we can shrink if too large
-            if picture.size > max_file_size:
-                raise ValidationError(
-                    "The file you uploaded is too large. Maximum size allowed is 2MB."
-                )
-
-        return picture
 
 
 class BoardGameForm(forms.ModelForm):
@@ -57,6 +134,14 @@ class BoardGameForm(forms.ModelForm):
         widget=forms.Select(attrs={"class": "form-select"}),
     )
 
+    move_copies = forms.BooleanField(
+        required=False,
+        label="Move every copy here",
+        help_text="Shelve all existing copies at this location, e.g. to undo a rebalancing",
+    )
+
+    image = DirectUploadField("board_game_image", label="Image")
+
     class Meta:
         model = BoardGame
         fields = [
@@ -97,17 +182,32 @@ class BoardGameForm(forms.ModelForm):
                     )
 
     def save(self, commit=True):
-        print(f"[INFO] User submitted form with data {self.cleaned_data}")
-
         # 1) Save the BoardGame itself
         board_game = super().save(commit=False)
         board_game.save()
+        logger.info(
+            "Board game saved",
+            extra={"game_id": board_game.pk, "fields": sorted(self.changed_data)},
+        )
 
         # 2) Grab the user’s chosen location
         default_location = self.cleaned_data.get("default_pickup_location", "shannon")
 
+        self.moved_copies = 0
         if commit:
-            self.instance.copies.update(pickup_location=default_location)
+            # Only move existing copies when the librarian picked a new location or
+            # asked for it, so saving the game does not undo a rebalancing plan. The
+            # initial location is the most common one, so picking it again to gather
+            # every copy there is not a change; that needs the checkbox.
+            if "default_pickup_location" in self.changed_data or self.cleaned_data.get(
+                "move_copies"
+            ):
+                self.moved_copies = self.instance.copies.exclude(
+                    pickup_location=default_location
+                ).update(pickup_location=default_location)
+                if self.moved_copies:
+                    # .update() bypasses the post_save signal that tracks copy changes
+                    ResourceVersion.bump(ResourceVersion.AVAILABILITY)
 
             # 3b) Then handle creating any *new* copies if num_copies increased
             num_copies = self.cleaned_data.get("num_copies", 1)
@@ -149,3 +249,18 @@ class CollectionForm(forms.ModelForm):
                 for choice in self.fields["visibility"].choices
                 if choice[0] != "private"
             ]
+
+
+class SavedSearchForm(forms.ModelForm):
+    """Save the catalogue's current filters (posted from the catalogue page)."""
+
+    class Meta:
+        model = SavedSearch
+        fields = ["name", "search", "category", "complexity", "players", "notify"]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        filters = ("search", "category", "complexity", "players")
+        if not any(cleaned_data.get(field) for field in filters):
+            raise ValidationError("Pick at least one filter before saving a search.")
+        return cleaned_data
@@ -0,0 +1,89 @@
+"""
+Per-process in-memory indexes kept current through ``ResourceVersion`` counters.
+
+Each web process builds an index on first use and afterwards compares the counters
+it was built from with the database at most once per
+``settings.INDEX_VERSION_CHECK_INTERVAL`` seconds, refreshing only when they moved.
+Lookups in between never touch the database.
+"""
+
+import threading
+import time
+import warnings
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .models import ResourceVersion
+from .pooling import close_pools
+
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class VersionedIndex:
+    """
+    Base class for an index derived from the resources named in ``resources``.
+
+    Subclasses implement ``build`` and may override ``refresh`` to apply changes
+    incrementally. Both should assemble new data and then swap it in, so readers on
+    other threads always see a consistent index.
+    """
+
+    resources = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.versions = None
+        self._checked_at = 0.0
+
+    def load(self):
+        """Return the index, building or refreshing it if its versions are stale."""
+        interval = getattr(
+            settings, "INDEX_VERSION_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL
+        )
+        if self.versions is not None and time.monotonic() - self._checked_at < interval:
+            return self
+
+        with self._lock:
+            # Read the versions first: a change committed while we build bumps them
+            # again, so the next check refreshes instead of missing it
+            current = ResourceVersion.current(*self.resources)
+            if self.versions is None:
+                self.build()
+            elif current != self.versions:
+                self.refresh(self.versions, current)
+            self.versions = current
+            self._checked_at = time.monotonic()
+        return self
+
+    def reset(self):
+        """Drop the index so the next ``load`` rebuilds it from scratch."""
+        with self._lock:
+            self.versions = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self, old_versions, new_versions):
+        """Bring the index up to date after the given versions changed."""
+        self.build()
+
+
+def warm_up(*indexes):
+    """
+    Build ``indexes`` ahead of the first request, e.g. while the server boots.
+
+    Skipped with a warning when the database is not ready (such as before the first
+    ``migrate``); the indexes are then built on first use instead. Connections (and
+    connection pools) are closed afterwards so forked workers do not share them.
+    """
+    try:
+        for index in indexes:
+            index.load()
+    except DatabaseError as e:
+        warnings.warn(
+            f"Skipped building in-memory indexes: {e}", RuntimeWarning, stacklevel=2
+        )
+    finally:
+        connections.close_all()
+        close_pools()
@@ -0,0 +1,213 @@
+"""
+Database-backed job queue for side effects that should not hold up a request.
+
+``enqueue`` inserts a ``Job`` row inside the caller's transaction, so a job exists
+exactly when the event that caused it committed (the transactional outbox pattern).
+``run_worker`` then claims due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of workers can share the table, and runs them on a thread pool. A failing job
+is retried with exponential backoff until ``max_attempts``, then left as failed.
+
+Tasks are plain functions registered with ``@task`` (see ``users/tasks.py``) and are
+called with the job's JSON payload as keyword arguments.
+"""
+
+import functools
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.db import close_old_connections, connections, models, transaction
+from django.utils import timezone
+
+from .log import request_id
+from .models import Job
+
+DEFAULT_THREADS = 4
+# Retry delays double from RETRY_BASE_DELAY up to MAX_RETRY_DELAY (seconds)
+RETRY_BASE_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+# A running job whose worker has been silent this long is presumed dead and re-claimed
+LOCK_TIMEOUT = timedelta(minutes=10)
+DONE_RETENTION = timedelta(days=1)
+PURGE_INTERVAL = 60 * 60
+
+_tasks = {}
+
+logger = logging.getLogger(__name__)
+
+
+def task(func=None, *, atomic=True):
+    """
+    Register ``func`` as a job task under its function name.
+
+    Use ``@task(atomic=False)`` for a task that commits its own work as it goes, such
+    as one sending email in batches: it then runs outside the job's transaction, so
+    what it committed before failing stays committed.
+    """
+    if func is None:
+        return functools.partial(task, atomic=atomic)
+    func.atomic = atomic
+    _tasks[func.__name__] = func
+    return func
+
+
+def enqueue(func, unique=False, delay=0, **payload):
+    """
+    Queue ``func(**payload)`` to run in a worker once the current transaction commits.
+
+    :param unique: Skip the insert if an identical job is already waiting, for tasks
+        such as delivering the outbox where one pending run covers every caller
+    :param delay: Seconds before the job may run
+    :return: The new ``Job``, or None when ``unique`` found one waiting
+    """
+    if _tasks.get(func.__name__) is not func:
+        raise ValueError(f"{func.__name__} is not a registered task")
+    if (
+        unique
+        and Job.objects.filter(
+            task=func.__name__, payload=payload, status=Job.QUEUED
+        ).exists()
+    ):
+        return None
+    return Job.objects.create(
+        task=func.__name__,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    """Return the backoff in seconds after the ``attempts``-th failure."""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim(limit):
+    """
+    Lock up to ``limit`` due jobs for this worker and mark them running.
+
+    Rows other workers hold are skipped rather than waited on. Jobs left running by a
+    worker that died more than ``LOCK_TIMEOUT`` ago are claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                models.Q(status=Job.QUEUED, run_at__lte=now)
+                | models.Q(status=Job.RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+            )
+            .order_by("run_at", "pk")[:limit]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, locked_at=now, attempts=models.F("attempts") + 1
+        )
+    for job in jobs:
+        job.status, job.locked_at, job.attempts = Job.RUNNING, now, job.attempts + 1
+    return jobs
+
+
+def run(job):
+    """
+    Run one claimed job and record the outcome.
+
+    The task and the "done" update share a transaction, so a task's writes never
+    commit without the job being marked done (unless the task was registered with
+    ``atomic=False``). Log records written meanwhile carry
+    ``job-<id>`` as their request ID.
+
+    :return: True if the job succeeded
+    """
+    token = request_id.set(f"job-{job.pk}")
+    try:
+        if job.task not in _tasks:
+            raise LookupError(f"Unknown task {job.task!r}")
+        func = _tasks[job.task]
+        with transaction.atomic() if func.atomic else nullcontext():
+            func(**job.payload)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.DONE, finished_at=timezone.now(), last_error=""
+            )
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            changes = {"status": Job.FAILED, "finished_at": timezone.now()}
+        else:
+            run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            changes = {"status": Job.QUEUED, "run_at": run_at}
+        Job.objects.filter(pk=job.pk).update(last_error=error, **changes)
+        logger.warning(
+            "Job %s failed",
+            job.task,
+            extra={"attempt": job.attempts, "status": changes["status"]},
+            exc_info=True,
+        )
+        return False
+    finally:
+        request_id.reset(token)
+
+
+def _run_in_thread(job):
+    close_old_connections()
+    try:
+        return run(job)
+    finally:
+        # Pool threads each open their own connection; don't leak them
+        connections.close_all()
+
+
+def work(threads=DEFAULT_THREADS, batch_size=None):
+    """
+    Claim one batch of due jobs and run it.
+
+    With more than one thread the batch runs on a thread pool; with one it runs in the
+    calling thread (and its connection), which is what tests use.
+
+    :return: Number of jobs run
+    """
+    jobs = claim(batch_size or threads)
+    if threads == 1:
+        for job in jobs:
+            run(job)
+    elif jobs:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(_run_in_thread, jobs))
+    return len(jobs)
+
+
+def drain(threads=1, batch_size=None):
+    """Run jobs until none are due; return how many ran."""
+    total = 0
+    while ran := work(threads, batch_size):
+        total += ran
+    return total
+
+
+def purge_finished(older_than=DONE_RETENTION):
+    """Delete successful jobs finished more than ``older_than`` ago."""
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, finished_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
+
+
+def run_worker(threads=DEFAULT_THREADS, poll_interval=1.0, should_stop=None):
+    """
+    Process jobs until ``should_stop()`` returns true, sleeping while idle.
+
+    :return: Number of jobs run
+    """
+    total, purged_at = 0, None
+    while not (should_stop and should_stop()):
+        ran = work(threads)
+        total += ran
+        if purged_at is None or time.monotonic() - purged_at > PURGE_INTERVAL:
+            purge_finished()
+            purged_at = time.monotonic()
+        if not ran:
+            close_old_connections()
+            time.sleep(poll_interval)
+    return total
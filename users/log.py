@@ -0,0 +1,182 @@
+"""
+Structured, low-overhead logging for the ``users`` app.
+
+Records are rendered as logfmt (``key=value`` pairs, like gunicorn's access log) and
+carry the request ID the Heroku router sends in ``X-Request-Id``, so application
+lines can be joined with the access log. Debug records can be sampled, and the
+``users`` handler only queues records; a background thread does the writing, so a
+request never blocks on stdout.
+
+Use the standard API with lazy ``%s`` arguments and structured fields in ``extra``::
+
+    logger = logging.getLogger(__name__)
+    logger.info("Loan returned", extra={"loan_id": loan.pk})
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import uuid
+
+REQUEST_ID_HEADER = "HTTP_X_REQUEST_ID"
+# Longer incoming IDs are cut, so a client cannot flood the logs through the header
+MAX_REQUEST_ID_LENGTH = 200
+
+request_id = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+
+class RequestIDMiddleware:
+    """Bind the request's ``X-Request-Id`` (or a new one) to its log records."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.META.get(REQUEST_ID_HEADER, "")[:MAX_REQUEST_ID_LENGTH]
+        token = request_id.set(incoming or uuid.uuid4().hex)
+        try:
+            response = self.get_response(request)
+            response.headers.setdefault("X-Request-Id", request_id.get())
+            return response
+        finally:
+            request_id.reset(token)
+
+
+class RequestIDFilter(logging.Filter):
+    """Stamp each record with the current request ID ("-" outside requests)."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a ``rate`` fraction of DEBUG records; other levels always pass.
+
+    The logger's own level still decides whether DEBUG calls are made at all, so at
+    INFO debug logging costs a level check and nothing more.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def _logfmt_value(value):
+    text = str(value)
+    if text and not any(c in text for c in ' ="\\\n'):
+        return text
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+class LogfmtFormatter(logging.Formatter):
+    """Render records as ``level=info logger=... request_id=... msg="..." key=value``."""
+
+    def format(self, record):
+        fields = {
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_")
+        )
+        if record.exc_info:
+            fields["exc_info"] = self.formatException(record.exc_info)
+        return " ".join(
+            f"{key}={_logfmt_value(value)}" for key, value in fields.items()
+        )
+
+
+# One queue and writer thread for every BackgroundHandler in the process. The thread
+# starts with the first record, and flush_and_stop() (also run at exit) ends it.
+_queue = queue.SimpleQueue()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class _Writer:
+    """Hand each queued record to the stream handler of the handler that queued it."""
+
+    def handle(self, record):
+        record._target.handle(record)
+
+
+def _start_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _Writer())
+            _listener.start()
+            atexit.register(flush_and_stop)
+
+
+def flush_and_stop():
+    """Write every queued record, then stop the writer thread until the next record."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            atexit.unregister(flush_and_stop)
+
+
+def _forget_listener():
+    # A forked child has no copy of the parent's writer thread; start its own
+    global _listener, _listener_lock
+    _listener = None
+    _listener_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_listener)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Queue formatted records for a background thread that writes them to ``stream``.
+
+    Formatting (and therefore the lazy ``%`` interpolation) still happens in the
+    logging thread, once the record has passed the level and filters; only the
+    write is moved off it. The writer thread is shared by every handler and is
+    restarted in forked children, since gunicorn's ``preload_app`` configures
+    logging before forking its workers.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(_queue)
+        self.target = logging.StreamHandler(stream)
+
+    def enqueue(self, record):
+        record._target = self.target
+        if _listener is None:
+            _start_listener()
+        super().enqueue(record)
+
+    def flush_and_stop(self):
+        """Write every queued record, then stop the writer thread."""
+        flush_and_stop()
+
+    def close(self):
+        flush_and_stop()
+        super().close()
@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.analytics import rebuild_loan_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily loan statistics rollups from the loan history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only rebuild days on or after this date (YYYY-MM-DD); default all",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError as e:
+                raise CommandError(f"Invalid --since date: {e}") from e
+
+        rows = rebuild_loan_stats(since=since, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily loan stats rows."))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import benchmarks, boot
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the web app in fresh interpreters and report the time and memory "
+        "each startup phase takes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument(
+            "--imports",
+            type=int,
+            default=0,
+            help="Also list this many of the slowest imports (python -X importtime)",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this path")
+        parser.add_argument(
+            "--budget",
+            help="Fail if boot time or memory exceed the limits in this JSON file",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            report = boot.profile_boot(runs=options["runs"], imports=options["imports"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for name, duration in report["phases_ms"].items():
+            self.stdout.write(f"{name:<24} {duration:>8.1f}ms")
+        low, high = report["boot_ms_spread"]
+        self.stdout.write(
+            f"{'boot (median)':<24} {report['boot_ms']:>8.1f}ms "
+            f"({low:.1f}-{high:.1f}ms over {report['runs']} runs)"
+        )
+        self.stdout.write(f"{'max resident memory':<24} {report['max_rss_mb']:>8.1f}MB")
+        self.stdout.write(f"{'modules loaded':<24} {report['modules']:>8}")
+        if options["imports"]:
+            self.stdout.write("\nSlowest imports (cumulative / self):")
+            for module, cumulative, own in report["imports"]:
+                self.stdout.write(f"  {cumulative:>8.1f}ms {own:>8.1f}ms  {module}")
+
+        if options["output"]:
+            benchmarks.write_report(report, options["output"])
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options["budget"]:
+            regressions = boot.check_budget(
+                report, benchmarks.load_report(options["budget"])
+            )
+            if regressions:
+                raise CommandError("Boot regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Boot is within budget."))
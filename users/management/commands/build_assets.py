@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundle and minify the site CSS/JS and resize the default images into "
+        "users/static/build/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only fail if the committed build is out of date with assets/",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            problems = assets.check()
+            if problems:
+                raise CommandError("Static assets are stale:\n" + "\n".join(problems))
+            self.stdout.write(self.style.SUCCESS("Static assets are up to date."))
+            return
+
+        for name, size in sorted(assets.build().items()):
+            self.stdout.write(f"{name:<40} {size:>8} bytes")
+        self.stdout.write(self.style.SUCCESS(f"Built into {assets.BUILD_DIR}"))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute the "patrons who borrowed this also borrowed" neighbours of every '
+        "game (run nightly; use --incremental in between)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=recommendations.DEFAULT_TOP_K,
+            help="Neighbours to store per game",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only refresh games affected by loans and reviews since the last run",
+        )
+        parser.add_argument(
+            "--no-reviews",
+            action="store_true",
+            help="Ignore review ratings and use loans only",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        build = (
+            recommendations.update
+            if options["incremental"]
+            else recommendations.rebuild
+        )
+        rows = build(k=options["k"], use_reviews=not options["no_reviews"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {rows} recommendations in {time.perf_counter() - start:.2f}s."
+            )
+        )
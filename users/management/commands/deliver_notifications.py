@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.alerts import DELIVERY_BATCH_SIZE, deliver_notifications
+
+
+class Command(BaseCommand):
+    help = "Email the pending availability alerts from the notification outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DELIVERY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        sent = deliver_notifications(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} notifications."))
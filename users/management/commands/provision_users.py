@@ -0,0 +1,47 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a CSV roster with email, given_name, family_name "
+        "and optional password columns"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("roster", help="Path to the roster CSV file")
+        parser.add_argument(
+            "--group", default="Patron", help="Group to add every new user to"
+        )
+        parser.add_argument(
+            "--sso",
+            action="store_true",
+            help="Ignore any password column and give everyone an unusable password",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["roster"], newline="", encoding="utf-8-sig") as roster:
+                reader = csv.DictReader(roster)
+                if "email" not in (reader.fieldnames or []):
+                    raise CommandError("The roster needs an 'email' column.")
+                rows = (
+                    {**row, "password": None} if options["sso"] else row
+                    for row in reader
+                    if row.get("email")
+                )
+                created = User.objects.bulk_provision(
+                    rows, group_name=options["group"], batch_size=options["batch_size"]
+                )
+        except OSError as e:
+            raise CommandError(f"Could not read roster: {e}") from e
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Provisioned {len(created)} users into the {options['group']} group."
+            )
+        )
@@ -0,0 +1,67 @@
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import rebalancing
+
+
+class Command(BaseCommand):
+    help = (
+        "Plan moves of shelved game copies between pickup locations to match recent "
+        "demand, and optionally apply them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=rebalancing.DEFAULT_WINDOW_DAYS,
+            help="How many days of loan history count towards demand",
+        )
+        parser.add_argument(
+            "--output", help="Write the planned moves to this JSON file"
+        )
+        parser.add_argument(
+            "--plan", help="Apply a previously reviewed JSON plan instead of planning"
+        )
+        parser.add_argument(
+            "--apply", action="store_true", help="Apply the moves (default: dry run)"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["plan"]:
+            try:
+                with open(options["plan"]) as plan_file:
+                    moves = json.load(plan_file)["moves"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read plan: {e}") from e
+        else:
+            moves = rebalancing.build_plan(days=options["days"])
+
+        routes = Counter((move["from"], move["to"]) for move in moves)
+        for (source, destination), count in sorted(routes.items()):
+            self.stdout.write(f"{source:>8} -> {destination:<8} {count} copies")
+        self.stdout.write(
+            f"{len(moves)} moves planned in {time.perf_counter() - start:.2f}s."
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as plan_file:
+                json.dump(
+                    {"days": options["days"], "moves": moves}, plan_file, indent=2
+                )
+            self.stdout.write(f"Plan written to {options['output']}")
+
+        if options["apply"] or options["plan"]:
+            moved = rebalancing.apply_plan(moves)
+            skipped = len(moves) - moved
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Moved {moved} copies ({skipped} skipped because they changed)."
+                )
+            )
+        else:
+            self.stdout.write("Dry run; pass --apply to move the copies.")
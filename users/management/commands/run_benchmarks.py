@@ -0,0 +1,126 @@
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from users import benchmarks
+from users.seeding import SCALES, seed_library
+
+
+class Command(BaseCommand):
+    help = "Benchmark the lending workflows and write a JSON latency/query report"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=sorted(SCALES),
+            help="Seed this preset data volume before running (omit to use existing data)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", help="Write the JSON report to this path")
+        parser.add_argument(
+            "--baseline", help="Fail if the report regresses against this JSON report"
+        )
+        parser.add_argument(
+            "--latency-tolerance",
+            type=float,
+            default=1.0,
+            help="Allowed relative p95 growth over the baseline (1.0 = twice as slow)",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Drive a running server over HTTP instead of the test client",
+        )
+        parser.add_argument(
+            "--middleware",
+            action="store_true",
+            help="Only time the per-request overhead of BlockAdminMiddleware",
+        )
+        parser.add_argument(
+            "--sessions",
+            action="store_true",
+            help="Only compare the session engines on a signed-in page",
+        )
+        parser.add_argument("--concurrency", type=int, default=5)
+        parser.add_argument(
+            "--sessionid", help="Session cookie to use for logged-in HTTP requests"
+        )
+
+    def handle(self, *args, **options):
+        if options["middleware"]:
+            for name, result in benchmarks.middleware_overhead().items():
+                self.stdout.write(
+                    f"{name:<24} p50={result['p50_us']:>8.3f}us "
+                    f"p95={result['p95_us']:>8.3f}us"
+                )
+            return
+
+        if options["sessions"]:
+            results = benchmarks.session_round_trips(
+                iterations=options["iterations"], warmup=options["warmup"]
+            )
+            for name, result in results.items():
+                self.stdout.write(
+                    f"{name:<24} p50={result['p50_ms']:>8.2f}ms "
+                    f"p95={result['p95_ms']:>8.2f}ms queries={result['queries']} "
+                    f"session_queries={result['session_queries']}"
+                )
+            return
+
+        if options["scale"]:
+            self.stdout.write(f"Seeding '{options['scale']}' data set...")
+            seed_library(
+                seed=options["seed"],
+                prefix=f"bench{options['seed']}",
+                stdout=self.stdout,
+                **SCALES[options["scale"]],
+            )
+
+        if options["base_url"]:
+            fixtures = benchmarks.BenchmarkFixtures()
+            paths = {
+                name: f"{url}?{urlencode(params)}"
+                for name, url, params in benchmarks.catalogue_scenarios(fixtures)
+            }
+            paths["detail"] = reverse("board_game_detail", args=[fixtures.game.pk])
+            cookies = (
+                {"sessionid": options["sessionid"]} if options["sessionid"] else None
+            )
+            scenarios = benchmarks.run_http_benchmarks(
+                options["base_url"],
+                paths,
+                requests_per_path=options["iterations"],
+                concurrency=options["concurrency"],
+                cookies=cookies,
+            )
+            driver = "http"
+        else:
+            scenarios = benchmarks.ClientBenchmark(
+                iterations=options["iterations"], warmup=options["warmup"]
+            ).run()
+            driver = "client"
+
+        report = benchmarks.build_report(scenarios, options["scale"], driver)
+        for name, result in sorted(scenarios.items()):
+            queries = result.get("queries", "-")
+            self.stdout.write(
+                f"{name:<24} p50={result['p50_ms']:>8.2f}ms "
+                f"p95={result['p95_ms']:>8.2f}ms p99={result['p99_ms']:>8.2f}ms "
+                f"queries={queries}"
+            )
+
+        if options["output"]:
+            benchmarks.write_report(report, options["output"])
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options["baseline"]:
+            regressions = benchmarks.compare_reports(
+                report,
+                benchmarks.load_report(options["baseline"]),
+                latency_tolerance=options["latency_tolerance"],
+            )
+            if regressions:
+                raise CommandError("Benchmark regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from users import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (notifications, receipts) until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=jobs.DEFAULT_THREADS)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls while the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run every job that is due now, then exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            ran = jobs.drain(threads=options["threads"])
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs."))
+            return
+
+        stopping = []
+
+        def stop(signum, frame):
+            # Finish the jobs in hand, then exit (Heroku sends SIGTERM on restarts)
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f"Worker started with {options['threads']} threads.")
+        ran = jobs.run_worker(
+            threads=options["threads"],
+            poll_interval=options["poll_interval"],
+            should_stop=lambda: bool(stopping),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped after {ran} jobs."))
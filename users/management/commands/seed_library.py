@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.seeding import BATCH_SIZE, SCALES, seed_library
+
+VOLUME_OPTIONS = [
+    "users",
+    "games",
+    "copies",
+    "loans",
+    "reviews",
+    "collections",
+    "borrow_requests",
+    "access_requests",
+]
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, games, copies, loans, reviews and collections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=sorted(SCALES),
+            default="tiny",
+            help="Preset data volume; individual counts below override it",
+        )
+        for option in VOLUME_OPTIONS:
+            parser.add_argument(f"--{option.replace('_', '-')}", type=int)
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Same seed, same data set"
+        )
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=1.1,
+            help="Skew of game popularity (higher = a few games get most loans)",
+        )
+        parser.add_argument(
+            "--prefix",
+            default=None,
+            help="Email prefix for generated users (defaults to seed<SEED>)",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        volumes = dict(SCALES[options["scale"]])
+        for option in VOLUME_OPTIONS:
+            if options[option] is not None:
+                volumes[option] = options[option]
+
+        start = time.perf_counter()
+        counts = seed_library(
+            seed=options["seed"],
+            zipf_exponent=options["zipf_exponent"],
+            prefix=options["prefix"] or f"seed{options['seed']}",
+            batch_size=options["batch_size"],
+            stdout=self.stdout,
+            **volumes,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {sum(counts.values())} rows in {elapsed:.1f}s (seed {options['seed']})."
+            )
+        )
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the local SQLite database over the SQLite replica (SQLITE_REPLICA=1), "
+        "i.e. let the stand-in replica catch up"
+    )
+
+    def handle(self, *args, **options):
+        replica = settings.DATABASES.get(REPLICA)
+        if replica is None:
+            raise CommandError("No replica database is configured.")
+        primary = settings.DATABASES["default"]
+        if "sqlite3" not in primary["ENGINE"] or "sqlite3" not in replica["ENGINE"]:
+            raise CommandError("Only a local SQLite replica can be synced this way.")
+
+        source = sqlite3.connect(primary["NAME"])
+        target = sqlite3.connect(replica["NAME"])
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied {primary['NAME']} to the replica.")
+        )
@@ -1,31 +1,48 @@
+from django.conf import settings
 from django.shortcuts import redirect
 
 
+def compile_prefixes(prefixes):
+    """
+    Reduce path prefixes to a tuple for a single ``str.startswith`` call.
+
+    Prefixes already covered by a shorter one are dropped, so ``["/", "/games/"]``
+    becomes ``("/",)``.
+    """
+    kept = []
+    # Sorted, every string starting with a prefix directly follows that prefix
+    for prefix in sorted(set(prefixes)):
+        if not kept or not prefix.startswith(kept[-1]):
+            kept.append(prefix)
+    return tuple(kept)
+
+
 class BlockAdminMiddleware:
+    """
+    Send staff and superusers to the admin site instead of the lending pages.
+
+    ``STAFF_RESTRICTED_PATHS`` and ``STAFF_EXEMPT_PATHS`` (plus ``STATIC_URL``) are
+    compiled once at startup. Requests on exempt or unrestricted paths, and requests
+    without a session cookie (which can only be anonymous), are passed on without
+    loading the session or the user.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.session_cookie = settings.SESSION_COOKIE_NAME
+        self.exempt = compile_prefixes(
+            [*settings.STAFF_EXEMPT_PATHS, settings.STATIC_URL]
+        )
+        self.restricted = compile_prefixes(settings.STAFF_RESTRICTED_PATHS)
 
     def __call__(self, request):
-        current_path = request.path
-
-        restricted_urls = [
-            "/",
-            "/collections/",
-            "/games/",
-            "/profile/",
-            "/borrow/",
-            "/reviews/",
-        ]
-
-        if current_path.startswith("/admin/"):
-            return self.get_response(request)
-
-        if request.user.is_authenticated and (
-            request.user.is_staff or request.user.is_superuser
+        path = request.path
+        if (
+            self.session_cookie in request.COOKIES
+            and not path.startswith(self.exempt)
+            and path.startswith(self.restricted)
         ):
-            current_path = request.path
-            if any(current_path.startswith(url) for url in restricted_urls):
+            user = request.user
+            if user.is_authenticated and (user.is_staff or user.is_superuser):
                 return redirect("admin:index")  # Redirect to admin interface
-
-        response = self.get_response(request)
-        return response
+        return self.get_response(request)
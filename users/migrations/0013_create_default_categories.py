@@ -3,6 +3,7 @@ from django.db import migrations
 
 def create_default_categories(apps, schema_editor):
     Category = apps.get_model("users", "Category")
+    db_alias = schema_editor.connection.alias
     default_categories = [
         {
             "name": "Strategy",
@@ -13,7 +14,7 @@ def create_default_categories(apps, schema_editor):
         {"name": "Card Game", "description": "Games primarily using cards"},
     ]
     for category in default_categories:
-        Category.objects.create(**category)
+        Category.objects.using(db_alias).create(**category)
 
 
 class Migration(migrations.Migration):
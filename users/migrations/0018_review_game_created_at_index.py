@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0017_alter_boardgame_playing_time"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["game", "-created_at"], name="users_revie_game_id_6ea850_idx"
+            ),
+        ),
+    ]
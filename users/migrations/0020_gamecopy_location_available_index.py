@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0019_resourceversion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gamecopy",
+            index=models.Index(
+                fields=["pickup_location", "is_available", "game"],
+                name="users_gamec_pickup__eabbfd_idx",
+            ),
+        ),
+    ]
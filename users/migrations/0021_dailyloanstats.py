@@ -0,0 +1,75 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0020_gamecopy_location_available_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyLoanStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "pickup_location",
+                    models.CharField(
+                        choices=[
+                            ("shannon", "Shannon Library"),
+                            ("clark", "Clark Library"),
+                            ("clemons", "Clemons Library"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("borrows", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                (
+                    "overdue_returns",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Returns that came back after their due date",
+                    ),
+                ),
+                (
+                    "loan_seconds",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Total length of the loans returned on this day",
+                    ),
+                ),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_loan_stats",
+                        to="users.boardgame",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Loan Stats",
+                "verbose_name_plural": "Daily Loan Stats",
+                "indexes": [
+                    models.Index(
+                        fields=["date", "pickup_location"],
+                        name="users_daily_date_619ddc_idx",
+                    )
+                ],
+                "unique_together": {("date", "game", "pickup_location")},
+            },
+        ),
+    ]
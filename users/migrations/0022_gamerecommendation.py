@@ -0,0 +1,58 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0021_dailyloanstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GameRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "score",
+                    models.FloatField(
+                        help_text="Cosine similarity of the co-borrow vectors"
+                    ),
+                ),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommendations",
+                        to="users.boardgame",
+                    ),
+                ),
+                (
+                    "recommended",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="users.boardgame",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Game Recommendation",
+                "verbose_name_plural": "Game Recommendations",
+                "ordering": ["game", "rank"],
+                "unique_together": {("game", "rank")},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:38
+
+from django.db import migrations, models
+
+
+def record_loan_locations(apps, schema_editor):
+    # Where a copy was when it was lent is not known any more; its current location
+    # is the best guess for existing loans
+    GameCopy = apps.get_model("users", "GameCopy")
+    GameLoan = apps.get_model("users", "GameLoan")
+    GameLoan.objects.using(schema_editor.connection.alias).update(
+        pickup_location=models.Subquery(
+            GameCopy.objects.filter(pk=models.OuterRef("game_copy")).values(
+                "pickup_location"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0024_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameloan",
+            name="pickup_location",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("shannon", "Shannon Library"),
+                    ("clark", "Clark Library"),
+                    ("clemons", "Clemons Library"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(record_loan_locations, migrations.RunPython.noop),
+    ]
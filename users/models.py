@@ -4,13 +4,15 @@ from django.contrib.auth.models import (
     PermissionsMixin,
     Group,
 )
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.urls import reverse
 from django.templatetags.static import static
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import timedelta
+from itertools import islice
 
 
 class UserManager(BaseUserManager):
@@ -47,6 +49,67 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", True)
         return self._create_user(email, password, **extra_fields)
 
+    def bulk_provision(self, rows, group_name="Patron", batch_size=1000):
+        """
+        Create users in batches from an iterable of dicts, e.g. a class roster.
+
+        Each row needs an ``email`` and may have ``given_name``, ``family_name`` and
+        ``password``. Rows without a password are SSO accounts and get an unusable
+        password, so nothing is hashed for them. Emails that already exist, in any
+        case, are skipped. The group is looked up once and memberships are inserted in
+        bulk. Either every row is provisioned or, on an error, none is.
+
+        :return: List of the created users
+        """
+        with transaction.atomic():
+            group, _ = Group.objects.get_or_create(name=group_name)
+            membership = self.model.groups.through
+            created = []
+            seen = set()
+            rows = iter(rows)
+
+            while batch := list(islice(rows, batch_size)):
+                # Keyed by lowercased email, since normalize_email only lowercases
+                # the domain and an import must not duplicate "Ann@x" as "ann@x"
+                users = {}
+                for row in batch:
+                    email = self.normalize_email((row.get("email") or "").strip())
+                    if not email:
+                        raise ValueError("Users must have an email address")
+                    if email.lower() in seen:
+                        continue
+                    seen.add(email.lower())
+                    user = self.model(
+                        email=email,
+                        given_name=row.get("given_name") or "",
+                        family_name=row.get("family_name") or "",
+                    )
+                    if row.get("password"):
+                        user.set_password(row["password"])
+                    else:
+                        user.set_unusable_password()
+                    users[email.lower()] = user
+
+                existing = set(
+                    self.annotate(email_lower=Lower("email"))
+                    .filter(email_lower__in=users.keys())
+                    .values_list("email_lower", flat=True)
+                )
+                new_users = self.bulk_create(
+                    [user for email, user in users.items() if email not in existing],
+                    batch_size=batch_size,
+                )
+                membership.objects.bulk_create(
+                    [
+                        membership(user_id=user.pk, group_id=group.pk)
+                        for user in new_users
+                    ],
+                    batch_size=batch_size,
+                )
+                created.extend(new_users)
+
+        return created
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model that uses email instead of username for authentication."""
@@ -110,7 +173,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Return the URL of the user's profile picture or a default image."""
         if self.profile_picture and hasattr(self.profile_picture, "url"):
             return self.profile_picture.url
-        return static("images/default-avatar.jpg")
+        return static("build/images/default-avatar-300.webp")
 
     def get_full_name(self):
         """Return the user's full name."""
@@ -177,7 +240,13 @@ class BoardGame(models.Model):
         """Return the URL of the game's image or a default image."""
         if self.image and hasattr(self.image, "url"):
             return self.image.url
-        return static("images/default-game.png")
+        return static("build/images/default-game-513.webp")
+
+    def get_thumbnail_url(self):
+        """Return the URL of the game's image, or a small default for thumbnails."""
+        if self.image and hasattr(self.image, "url"):
+            return self.image.url
+        return static("build/images/default-game-96.webp")
 
     def available_copies_count(self):
         """Return the number of available copies of this game."""
@@ -248,6 +317,8 @@ class GameCopy(models.Model):
         verbose_name = "Game Copy"
         verbose_name_plural = "Game Copies"
         ordering = ["game__title", "pk"]
+        # Serves "what is on this desk's shelf" and the per-location counts
+        indexes = [models.Index(fields=["pickup_location", "is_available", "game"])]
 
     def __str__(self):
         return f"{self.game.title} (#{self.pk})"
@@ -283,6 +354,11 @@ class GameLoan(models.Model):
     returned_on = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="borrowed")
     notes = models.TextField(blank=True)
+    # Where the copy was shelved when it was borrowed (set by save()), so statistics
+    # do not move with the copy when it is rebalanced later
+    pickup_location = models.CharField(
+        max_length=20, choices=GameCopy.PICKUP_LOCATION_CHOICES, blank=True
+    )
 
     class Meta:
         verbose_name = "Game Loan"
@@ -301,6 +377,8 @@ class GameLoan(models.Model):
         # Set due date if not set (default to 2 weeks)
         if not self.due_date:
             self.due_date = timezone.now() + timedelta(days=14)
+        if not self.pickup_location:
+            self.pickup_location = self.game_copy.pickup_location
 
         # Update status based on returned flag and due date
         if self.returned:
@@ -362,6 +440,8 @@ class Review(models.Model):
         ordering = ["-created_at"]
         # Ensure a user can only review a game once
         unique_together = [["user", "game"]]
+        # Serves the newest-first review feed of a single game
+        indexes = [models.Index(fields=["game", "-created_at"])]
 
     def __str__(self):
         return f"{self.game.title} - {self.rating}★ by {self.user.get_full_name()}"
@@ -494,3 +574,288 @@ class CollectionAccessRequest(models.Model):
 
     def __str__(self):
         return f"CollectionAccessRequest({self.user}, {self.collection}, {self.status})"
+
+
+class ResourceVersion(models.Model):
+    """
+    Counter bumped whenever a group of resources changes (e.g. "games").
+
+    Caches and ETags are keyed on these counters, so checking whether something
+    changed costs one indexed lookup instead of re-running the underlying queries.
+    """
+
+    GAMES = "games"
+    AVAILABILITY = "availability"
+    COLLECTIONS = "collections"
+    ALL = (GAMES, AVAILABILITY, COLLECTIONS)
+
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resource Version"
+        verbose_name_plural = "Resource Versions"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def bump(cls, *names):
+        """Increment the counters for the given resource names."""
+        for name in names:
+            updated = cls.objects.filter(name=name).update(
+                version=models.F("version") + 1, updated_at=timezone.now()
+            )
+            if not updated:
+                version, created = cls.objects.get_or_create(
+                    name=name, defaults={"version": 1}
+                )
+                if not created:
+                    cls.objects.filter(pk=version.pk).update(
+                        version=models.F("version") + 1, updated_at=timezone.now()
+                    )
+
+    @classmethod
+    def current(cls, *names):
+        """Return ``{name: version}`` for the given names in one query (0 if unset)."""
+        versions = dict.fromkeys(names, 0)
+        versions.update(
+            cls.objects.filter(name__in=names).values_list("name", "version")
+        )
+        return versions
+
+
+class DailyLoanStats(models.Model):
+    """
+    Loan activity for one game at one pickup location on one day.
+
+    Maintained incrementally from loan signals (see ``users/analytics.py``) so the
+    librarian dashboard never has to scan ``GameLoan``.
+    """
+
+    date = models.DateField()
+    game = models.ForeignKey(
+        BoardGame, on_delete=models.CASCADE, related_name="daily_loan_stats"
+    )
+    pickup_location = models.CharField(
+        max_length=20, choices=GameCopy.PICKUP_LOCATION_CHOICES
+    )
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue_returns = models.PositiveIntegerField(
+        default=0, help_text="Returns that came back after their due date"
+    )
+    loan_seconds = models.PositiveBigIntegerField(
+        default=0, help_text="Total length of the loans returned on this day"
+    )
+
+    class Meta:
+        verbose_name = "Daily Loan Stats"
+        verbose_name_plural = "Daily Loan Stats"
+        unique_together = [["date", "game", "pickup_location"]]
+        indexes = [models.Index(fields=["date", "pickup_location"])]
+
+    def __str__(self):
+        return f"{self.game} at {self.pickup_location} on {self.date}"
+
+
+class GameRecommendation(models.Model):
+    """
+    One precomputed "patrons who borrowed this also borrowed" neighbour of a game.
+
+    Rows are written in batch by ``users/recommendations.py``; the detail page reads a
+    game's top neighbours with a single indexed lookup.
+    """
+
+    game = models.ForeignKey(
+        BoardGame, on_delete=models.CASCADE, related_name="recommendations"
+    )
+    recommended = models.ForeignKey(
+        BoardGame, on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(help_text="Cosine similarity of the co-borrow vectors")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Game Recommendation"
+        verbose_name_plural = "Game Recommendations"
+        ordering = ["game", "rank"]
+        unique_together = [["game", "rank"]]
+
+    def __str__(self):
+        return f"{self.game} -> {self.recommended} (#{self.rank})"
+
+
+class SavedSearch(models.Model):
+    """
+    A patron's catalogue filters, kept to re-run later and to alert on.
+
+    The filters mirror the catalogue's query parameters. With ``notify`` set, the
+    patron is told whenever a game matching them comes back onto the shelf.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="saved_searches",
+    )
+    name = models.CharField(max_length=100)
+    search = models.CharField(max_length=200, blank=True)
+    category = models.CharField(max_length=100, blank=True)
+    complexity = models.PositiveSmallIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
+    players = models.PositiveSmallIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)]
+    )
+    notify = models.BooleanField(
+        default=True, help_text="Notify when a matching game becomes available"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Saved Search"
+        verbose_name_plural = "Saved Searches"
+        ordering = ["name", "pk"]
+        # Narrows the searches an availability batch has to match in Python
+        indexes = [models.Index(fields=["notify", "category"])]
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+    def params(self):
+        """Return the filters as catalogue query parameters (blank ones left out)."""
+        params = {
+            "search": self.search,
+            "category": self.category,
+            "complexity": self.complexity,
+            "players": self.players,
+        }
+        return {key: str(value) for key, value in params.items() if value}
+
+    def matches(self, game, category_names):
+        """Check ``game`` against the filters the way ``queries.filter_games`` does."""
+        if self.category and self.category not in category_names:
+            return False
+        if self.complexity and game.complexity != self.complexity:
+            return False
+        if self.players and not game.min_players <= self.players <= game.max_players:
+            return False
+        if self.search:
+            needle = self.search.casefold()
+            return any(
+                needle in text.casefold()
+                for text in [game.title, game.description, *category_names]
+            )
+        return True
+
+
+class AvailabilityAlert(models.Model):
+    """
+    A one-off "notify me when available" request for a game.
+
+    Fired and deleted by the availability batch in ``users/alerts.py``; the index on
+    ``game`` is the reverse index that finds a returned game's subscribers.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="availability_alerts",
+    )
+    game = models.ForeignKey(
+        BoardGame, on_delete=models.CASCADE, related_name="availability_alerts"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Availability Alert"
+        verbose_name_plural = "Availability Alerts"
+        unique_together = [["user", "game"]]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.game}"
+
+
+class Notification(models.Model):
+    """
+    Outbox of messages to patrons.
+
+    Rows are written in the same transaction as the event that caused them and
+    delivered later by ``deliver_notifications``, which sets ``sent_at``. They also
+    serve as the patron's in-app alert history.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notifications",
+    )
+    game = models.ForeignKey(
+        BoardGame,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="notifications",
+    )
+    subject = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        ordering = ["-created_at", "-pk"]
+        indexes = [
+            models.Index(fields=["sent_at", "created_at"]),
+            models.Index(fields=["user", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.user}"
+
+
+class Job(models.Model):
+    """
+    A background job, written in the same transaction as the event that needs it.
+
+    ``run_worker`` claims due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` and
+    runs the task registered under ``task`` with ``payload`` as keyword arguments
+    (see ``users/jobs.py``).
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(
+        default=timezone.now, help_text="Not claimed before this time (retry backoff)"
+    )
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ["run_at", "pk"]
+        indexes = [models.Index(fields=["status", "run_at"])]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
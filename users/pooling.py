@@ -0,0 +1,101 @@
+"""
+Database connection pool sizing and metrics.
+
+With ``DB_POOL=psycopg`` each process keeps a psycopg pool (Django's ``"pool"``
+database option) instead of one persistent connection per thread. A gthread worker
+runs at most ``threads`` requests at once, so that is all its pool ever needs; with
+``DB_MAX_CONNECTIONS`` set, the pools are shrunk so ``WEB_CONCURRENCY`` of them fit.
+
+Pool counters are logged (logfmt, see ``users/log.py``) at most once per
+``DB_POOL_STATS_INTERVAL`` seconds per process, when a request finishes.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# A checkout waiting longer than this raises PoolTimeout (a 500) instead of hanging
+DEFAULT_POOL_TIMEOUT = 10
+# Connections idle this long are closed, down to the pool's min_size
+DEFAULT_MAX_IDLE = 5 * 60
+
+REPORTED_COUNTERS = (
+    "requests_num",
+    "requests_queued",
+    "requests_wait_ms",
+    "requests_errors",
+    "usage_ms",
+)
+
+_logged_at = None
+
+
+def pool_options(workers, threads, max_connections=None, timeout=DEFAULT_POOL_TIMEOUT):
+    """
+    Return Django's ``OPTIONS["pool"]`` for one of ``workers`` processes.
+
+    :param threads: Threads per process, i.e. the most connections it uses at once
+    :param max_connections: Connections the database allows this app, if limited
+    """
+    workers, size = max(int(workers), 1), max(int(threads), 1)
+    if max_connections:
+        share = int(max_connections) // workers
+        if share < size:
+            logger.warning(
+                "Database pool capped at %d connections per process; requests may "
+                "wait for one",
+                max(share, 1),
+                extra={"workers": workers, "threads": size},
+            )
+            size = max(share, 1)
+    return {
+        "min_size": 1,
+        "max_size": size,
+        "timeout": timeout,
+        "max_idle": DEFAULT_MAX_IDLE,
+    }
+
+
+def pool_stats(connection=None):
+    """
+    Return the pool's gauges and counters since the previous call, or None.
+
+    :param connection: A database connection; the default one if omitted
+
+    Besides psycopg's own figures (``requests_num`` checkouts, ``requests_wait_ms``
+    spent waiting for one, ``usage_ms`` connections were held, ...) this adds
+    ``requests_wait_ms_avg``, the mean wait per checkout.
+    """
+    pool = getattr(connection or connections["default"], "pool", None)
+    if pool is None:
+        return None
+    # psycopg leaves out counters that are still zero; keep log lines uniform
+    stats = dict.fromkeys(REPORTED_COUNTERS, 0) | pool.pop_stats()
+    checkouts = stats["requests_num"]
+    stats["requests_wait_ms_avg"] = (
+        round(stats["requests_wait_ms"] / checkouts, 3) if checkouts else 0
+    )
+    return stats
+
+
+def log_pool_stats():
+    """Log ``pool_stats()`` if the last report is older than the interval."""
+    global _logged_at
+    now = time.monotonic()
+    if _logged_at is not None and now - _logged_at < settings.DB_POOL_STATS_INTERVAL:
+        return
+    _logged_at = now
+    stats = pool_stats()
+    if stats is not None:
+        logger.info("Database pool stats", extra=stats)
+
+
+def close_pools():
+    """Close every connection pool, e.g. before gunicorn forks its workers."""
+    for connection in connections.all():
+        if getattr(connection, "pool", None) is not None:
+            connection.close_pool()
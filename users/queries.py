@@ -0,0 +1,567 @@
+"""Query builders shared by views that need a page's data in a fixed number of queries."""
+
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.shortcuts import get_object_or_404
+
+from .models import (
+    AvailabilityAlert,
+    BoardGame,
+    Category,
+    Collection,
+    GameCopy,
+    GameLoan,
+    GameRecommendation,
+    ResourceVersion,
+    Review,
+    User,
+)
+
+RECENT_REVIEWS_LIMIT = 10
+RECOMMENDATIONS_LIMIT = 6
+REVIEW_PAGE_SIZE = 20
+AVAILABILITY_SNAPSHOT_TIMEOUT = 60 * 60
+FACET_COUNTS_TIMEOUT = 60 * 60
+FILTER_PARAMS = ("search", "complexity", "players", "availability", "category")
+COMPLEXITY_FACETS = {1: "Simple", 2: "Easy", 3: "Medium", 4: "Hard", 5: "Complex"}
+PLAYER_COUNT_FACETS = range(1, 9)
+
+
+def filter_games(games, params):
+    """
+    Apply the catalogue filters (search, complexity, players, availability, category).
+
+    :param params: ``request.GET`` or any mapping with the same keys
+    """
+    # Search functionality
+    search_query = params.get("search", "")
+    if search_query:
+        games = games.filter(
+            models.Q(title__icontains=search_query)
+            | models.Q(description__icontains=search_query)
+            | models.Q(categories__name__icontains=search_query)
+        ).distinct()
+
+    # Filter by complexity
+    complexity = params.get("complexity", "")
+    if complexity and complexity.isdigit():
+        games = games.filter(complexity=int(complexity))
+
+    # Filter by player count
+    players = params.get("players", "")
+    if players and players.isdigit():
+        players_count = int(players)
+        games = games.filter(
+            min_players__lte=players_count, max_players__gte=players_count
+        )
+
+    # Filter by availability
+    availability = params.get("availability", "")
+    if availability and availability == "available":
+        games = games.filter(copies__is_available=True).distinct()
+
+    # Filter by category
+    category = params.get("category", "")
+    if category:
+        games = games.filter(categories__name=category)
+
+    return games
+
+
+def _facet_base(games, params, facet):
+    """
+    Games matching every filter except ``facet``'s own, as a join-free queryset.
+
+    Leaving a facet's own filter out means its counts answer "how many games would
+    I get if I picked this instead", which is what a single-choice filter needs.
+    """
+    others = {key: params.get(key, "") for key in FILTER_PARAMS if key != facet}
+    matching = filter_games(games, others).order_by().values("pk")
+    return BoardGame.objects.order_by().filter(pk__in=matching)
+
+
+def _build_facet_counts(games, params):
+    in_categories = _facet_base(games, params, "category").values("pk")
+    categories = [
+        {"name": category.name, "count": category.count}
+        for category in Category.objects.order_by("name").annotate(
+            count=models.Count("games", filter=models.Q(games__pk__in=in_categories))
+        )
+    ]
+
+    complexity = dict(
+        _facet_base(games, params, "complexity")
+        .filter(complexity__isnull=False)
+        .values_list("complexity")
+        .annotate(count=models.Count("pk"))
+    )
+
+    players = _facet_base(games, params, "players").aggregate(
+        **{
+            str(count): models.Count(
+                "pk",
+                filter=models.Q(min_players__lte=count, max_players__gte=count),
+            )
+            for count in PLAYER_COUNT_FACETS
+        }
+    )
+
+    availability = _facet_base(games, params, "availability").aggregate(
+        all=models.Count("pk"),
+        available=models.Count(
+            "pk",
+            filter=models.Exists(
+                GameCopy.objects.filter(game=models.OuterRef("pk"), is_available=True)
+            ),
+        ),
+    )
+
+    return {
+        "categories": categories,
+        "complexity": [
+            {"value": value, "label": label, "count": complexity.get(value, 0)}
+            for value, label in COMPLEXITY_FACETS.items()
+        ],
+        "players": [
+            {"value": count, "count": players[str(count)]}
+            for count in PLAYER_COUNT_FACETS
+        ],
+        "availability": availability,
+    }
+
+
+def facet_counts(games, params):
+    """
+    Count the catalogue games behind every filter option, given the active filters.
+
+    Each facet (category, complexity, player count, availability) is one grouped or
+    conditional aggregate over the games matching the other filters, so the whole
+    sidebar costs four queries however many options it lists. Results are cached
+    under the filter values and the versions of the data they read, so a repeated
+    filter costs one version lookup.
+
+    :param games: The catalogue's base queryset (e.g. without private games); the
+        same for every call, since it is not part of the cache key
+    :param params: ``request.GET`` or any mapping with the catalogue filter keys
+    """
+    versions = ResourceVersion.current(
+        ResourceVersion.GAMES, ResourceVersion.AVAILABILITY, ResourceVersion.COLLECTIONS
+    )
+    signature = json.dumps(
+        [[key, params.get(key, "")] for key in FILTER_PARAMS] + sorted(versions.items())
+    )
+    key = "catalogue-facets:" + hashlib.sha256(signature.encode()).hexdigest()
+    facets = cache.get(key)
+    if facets is None:
+        facets = _build_facet_counts(games, params)
+        cache.set(key, facets, FACET_COUNTS_TIMEOUT)
+    return facets
+
+
+def _review_subquery(aggregate):
+    """Per-game review aggregate usable as an annotation without joining reviews."""
+    return models.Subquery(
+        Review.objects.filter(game=models.OuterRef("pk"))
+        .order_by()
+        .values("game")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+
+
+def game_detail(pk, user):
+    """
+    Load everything the board game detail page shows in six queries.
+
+    1. the game with its rating aggregates, the user's borrow and alert state
+    2. its categories (prefetched)
+    3. copy counts per pickup location
+    4. the user's own review
+    5. the most recent reviews with their authors
+    6. the precomputed "also borrowed" recommendations
+    """
+    game = get_object_or_404(
+        BoardGame.objects.prefetch_related("categories").annotate(
+            rating_average=_review_subquery(models.Avg("rating")),
+            rating_count=_review_subquery(models.Count("pk")),
+            has_borrowed=models.Exists(
+                GameLoan.objects.filter(
+                    user=user, game_copy__game=models.OuterRef("pk"), returned=True
+                )
+            ),
+            has_alert=models.Exists(
+                AvailabilityAlert.objects.filter(user=user, game=models.OuterRef("pk"))
+            ),
+        ),
+        pk=pk,
+    )
+
+    location_labels = dict(GameCopy.PICKUP_LOCATION_CHOICES)
+    pickup_locations = [
+        {
+            "pickup_location": row["pickup_location"],
+            "label": location_labels.get(row["pickup_location"]),
+            "available": row["available"],
+            "total": row["total"],
+        }
+        for row in GameCopy.objects.filter(game=game)
+        .order_by("pickup_location")
+        .values("pickup_location")
+        .annotate(
+            total=models.Count("pk"),
+            available=models.Count("pk", filter=models.Q(is_available=True)),
+        )
+    ]
+
+    average = game.rating_average
+    return {
+        "game": game,
+        "categories": list(game.categories.all()),
+        "pickup_locations": pickup_locations,
+        "available_copies_count": sum(row["available"] for row in pickup_locations),
+        "average_rating": round(average, 1) if average is not None else None,
+        "review_count": game.rating_count or 0,
+        "existing_review": Review.objects.filter(user=user, game=game).first(),
+        "recent_reviews": list(
+            game.reviews.select_related("user").order_by("-created_at")[
+                :RECENT_REVIEWS_LIMIT
+            ]
+        ),
+        "has_borrowed": game.has_borrowed,
+        "has_alert": game.has_alert,
+        "recommendations": [
+            recommendation.recommended
+            for recommendation in GameRecommendation.objects.filter(game=game)
+            .select_related("recommended")
+            .order_by("rank")[:RECOMMENDATIONS_LIMIT]
+        ],
+    }
+
+
+def _version(name):
+    """Annotate with the current value of a ``ResourceVersion`` counter."""
+    return models.Subquery(
+        ResourceVersion.objects.filter(name=name).values("version")[:1]
+    )
+
+
+def _role_annotations(user):
+    """Annotate with whether ``user`` is a librarian and whether a patron."""
+    memberships = User.groups.through.objects.filter(user=user.pk)
+    return {
+        "is_librarian": models.Exists(memberships.filter(group__name="Librarian")),
+        "is_patron": models.Exists(memberships.filter(group__name="Patron")),
+    }
+
+
+def game_detail_validators(pk, user):
+    """
+    Return, in one query, everything ``game_detail`` pages for ``user`` depend on.
+
+    The game's ``updated_at``, the catalogue and availability counters (loans move
+    the latter through their copies), the review count and latest review edit, when
+    the recommendations were computed, and the user's alert and roles. None if there
+    is no such game.
+    """
+    return (
+        BoardGame.objects.filter(pk=pk)
+        .annotate(
+            games_version=_version(ResourceVersion.GAMES),
+            availability_version=_version(ResourceVersion.AVAILABILITY),
+            review_count=_review_subquery(models.Count("pk")),
+            reviews_updated_at=_review_subquery(models.Max("updated_at")),
+            recommendations_computed_at=models.Subquery(
+                GameRecommendation.objects.filter(game=models.OuterRef("pk"))
+                .order_by()
+                .values("game")
+                .annotate(latest=models.Max("computed_at"))
+                .values("latest")
+            ),
+            has_alert=models.Exists(
+                AvailabilityAlert.objects.filter(
+                    user=user.pk, game=models.OuterRef("pk")
+                )
+            ),
+            **_role_annotations(user),
+        )
+        .values(
+            "updated_at",
+            "games_version",
+            "availability_version",
+            "review_count",
+            "reviews_updated_at",
+            "recommendations_computed_at",
+            "has_alert",
+            "is_librarian",
+            "is_patron",
+        )
+        .first()
+    )
+
+
+def collection_detail_validators(pk, user):
+    """
+    Return, in one query, everything the collection page for ``user`` depends on.
+
+    The collection's ``updated_at``, the collection, catalogue and availability
+    counters (membership changes only move the first) and the user's roles. None if
+    there is no such collection or ``user`` may not see it (see ``can_user_access``).
+    """
+    row = (
+        Collection.objects.filter(pk=pk)
+        .annotate(
+            collections_version=_version(ResourceVersion.COLLECTIONS),
+            games_version=_version(ResourceVersion.GAMES),
+            availability_version=_version(ResourceVersion.AVAILABILITY),
+            is_authorized=models.Exists(
+                Collection.authorized_users.through.objects.filter(
+                    collection=models.OuterRef("pk"), user=user.pk
+                )
+            ),
+            **_role_annotations(user),
+        )
+        .values(
+            "visibility",
+            "creator",
+            "updated_at",
+            "collections_version",
+            "games_version",
+            "availability_version",
+            "is_authorized",
+            "is_librarian",
+            "is_patron",
+        )
+        .first()
+    )
+    if row is None or not (
+        row["visibility"] == "public"
+        or (
+            user.is_authenticated
+            and (
+                row["creator"] == user.pk or row["is_librarian"] or row["is_authorized"]
+            )
+        )
+    ):
+        return None
+    return row
+
+
+def encode_cursor(*values):
+    """Encode a keyset position as an opaque, URL-safe cursor string."""
+    raw = json.dumps(
+        [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in values
+        ]
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by ``encode_cursor`` into its list of raw values.
+
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError as e:  # also covers binascii, unicode and JSON decode errors
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _cursor_value(field, value):
+    """
+    Convert one decoded cursor value for ``field``, checking its JSON type first.
+
+    ``field.clean`` also applies the database's range for integer fields, so a
+    tampered cursor is a ``ValueError`` (a 400) rather than a database error.
+    """
+    if isinstance(field, models.IntegerField):
+        expected = int
+    elif isinstance(field, models.FloatField):
+        expected = (int, float)
+    else:
+        expected = str  # dates and times are ISO strings, see encode_cursor
+    if isinstance(value, bool) or not isinstance(value, expected):
+        raise ValueError("Invalid cursor")
+    try:
+        return field.clean(value, None)
+    except ValidationError as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=REVIEW_PAGE_SIZE):
+    """
+    Return one page of ``queryset`` ordered by two fields, using keyset pagination.
+
+    Seeking from the last seen row (e.g. ``WHERE (title, id) > (...)``) keeps every
+    page an index range scan no matter how deep the reader goes, unlike OFFSET.
+
+    :param ordering: Two field names such as ``("-created_at", "-pk")``; the second
+        must be unique so rows with equal first values are not skipped
+    :return: Tuple of (rows, next cursor or None on the last page)
+    :raises ValueError: If the cursor is malformed
+    """
+    names = [field.lstrip("-") for field in ordering]
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(names):
+            raise ValueError("Invalid cursor")
+        meta = queryset.model._meta
+        first, second = (
+            _cursor_value(meta.pk if name == "pk" else meta.get_field(name), value)
+            for name, value in zip(names, values)
+        )
+        lookup = ["lt" if field.startswith("-") else "gt" for field in ordering]
+        queryset = queryset.filter(
+            models.Q(**{f"{names[0]}__{lookup[0]}": first})
+            | models.Q(**{names[0]: first, f"{names[1]}__{lookup[1]}": second})
+        )
+
+    page = list(queryset[: limit + 1])
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    last = page[-1]
+    return page, encode_cursor(*(getattr(last, name) for name in names))
+
+
+def review_page(game, cursor=None, limit=REVIEW_PAGE_SIZE):
+    """
+    Return one page of a game's reviews, newest first.
+
+    The ``(created_at, pk)`` keyset is served by the ``(game, -created_at)`` index.
+
+    :return: Tuple of (reviews, next cursor or None on the last page)
+    """
+    reviews = Review.objects.filter(game=game).select_related("user")
+    return keyset_page(reviews, ("-created_at", "-pk"), cursor, limit)
+
+
+def rating_histogram(game):
+    """Return ``{rating: count}`` for ratings 1-5 from one grouped query."""
+    histogram = dict.fromkeys(range(1, 6), 0)
+    for row in (
+        Review.objects.filter(game=game)
+        .order_by()
+        .values("rating")
+        .annotate(count=models.Count("pk"))
+    ):
+        histogram[row["rating"]] = row["count"]
+    return histogram
+
+
+def location_inventory(location, available_only=False):
+    """
+    Return per-game copy counts at one pickup location, ordered by title.
+
+    A single grouped query answered from the ``(pickup_location, is_available,
+    game)`` index, so a desk never scans copies held elsewhere.
+
+    :return: Queryset of dicts with ``game``, ``title``, ``available`` and ``total``
+    """
+    copies = GameCopy.objects.filter(pickup_location=location)
+    if available_only:
+        copies = copies.filter(is_available=True)
+    return (
+        copies.order_by()
+        .values("game")
+        .annotate(
+            title=models.F("game__title"),
+            total=models.Count("pk"),
+            available=models.Count("pk", filter=models.Q(is_available=True)),
+        )
+        .order_by("title", "game")
+    )
+
+
+def _build_availability_snapshot():
+    snapshot = {location: {} for location, _ in GameCopy.PICKUP_LOCATION_CHOICES}
+    for row in (
+        GameCopy.objects.order_by()
+        .values("pickup_location", "game")
+        .annotate(
+            total=models.Count("pk"),
+            available=models.Count("pk", filter=models.Q(is_available=True)),
+        )
+    ):
+        snapshot.setdefault(row["pickup_location"], {})[row["game"]] = (
+            row["available"],
+            row["total"],
+        )
+    return snapshot
+
+
+def availability_snapshot():
+    """
+    Return ``{location: {game_id: (available, total)}}`` for the whole catalogue.
+
+    Built from one grouped query and cached under the current availability version,
+    so any copy-state change (which bumps that version) makes the next call rebuild
+    it while unchanged data costs one version lookup and a cache hit.
+    """
+    version = ResourceVersion.current(ResourceVersion.AVAILABILITY)[
+        ResourceVersion.AVAILABILITY
+    ]
+    key = f"availability-snapshot:{version}"
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _build_availability_snapshot()
+        cache.set(key, snapshot, AVAILABILITY_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def public_availability_snapshot():
+    """
+    Return ``availability_snapshot()`` without games in private collections.
+
+    This is what anonymous callers (the JSON API) may see, matching the catalogue.
+    The hidden ids are cached under the collections version.
+    """
+    version = ResourceVersion.current(ResourceVersion.COLLECTIONS)[
+        ResourceVersion.COLLECTIONS
+    ]
+    key = f"private-game-ids:{version}"
+    hidden = cache.get(key)
+    if hidden is None:
+        hidden = set(
+            BoardGame.objects.filter(collections__visibility="private").values_list(
+                "pk", flat=True
+            )
+        )
+        cache.set(key, hidden, AVAILABILITY_SNAPSHOT_TIMEOUT)
+    snapshot = availability_snapshot()
+    if not hidden:
+        return snapshot
+    return {
+        location: {
+            game_id: counts
+            for game_id, counts in games.items()
+            if game_id not in hidden
+        }
+        for location, games in snapshot.items()
+    }
+
+
+def location_summary(snapshot=None):
+    """Return available and total copies per pickup location, in choice order."""
+    snapshot = availability_snapshot() if snapshot is None else snapshot
+    return [
+        {
+            "location": location,
+            "label": label,
+            "available": sum(available for available, _ in snapshot[location].values()),
+            "total": sum(total for _, total in snapshot[location].values()),
+        }
+        for location, label in GameCopy.PICKUP_LOCATION_CHOICES
+    ]
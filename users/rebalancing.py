@@ -0,0 +1,178 @@
+"""
+Plan and apply moves of game copies between pickup locations to follow demand.
+
+Demand for a game at a location is the number of loans of its copies shelved there
+over a recent window; pending borrow requests (which have no location) are spread
+over the game's locations in proportion to that history. Each game's copies are
+then divided between locations in proportion to demand, and only copies that are
+on the shelf are moved.
+"""
+
+from datetime import timedelta
+from itertools import islice
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import BorrowRequest, GameCopy, GameLoan, ResourceVersion
+
+DEFAULT_WINDOW_DAYS = 180
+APPLY_BATCH_SIZE = 1000
+
+
+def location_demand(days=DEFAULT_WINDOW_DAYS, now=None):
+    """
+    Return ``{game_id: {location: demand}}`` from two grouped queries.
+
+    :param days: How far back to count loans
+    """
+    since = (now or timezone.now()) - timedelta(days=days)
+    demand = {}
+    for row in (
+        GameLoan.objects.filter(borrowed_on__gte=since)
+        .order_by()
+        .values("game_copy__game", "pickup_location")
+        .annotate(loans=models.Count("pk"))
+    ):
+        demand.setdefault(row["game_copy__game"], {})[row["pickup_location"]] = float(
+            row["loans"]
+        )
+
+    locations = [location for location, _ in GameCopy.PICKUP_LOCATION_CHOICES]
+    for game_id, pending in (
+        BorrowRequest.objects.filter(status="pending")
+        .order_by()
+        .values_list("game")
+        .annotate(count=models.Count("pk"))
+    ):
+        history = demand.setdefault(game_id, {})
+        total = sum(history.values())
+        for location in locations:
+            share = history.get(location, 0) / total if total else 1 / len(locations)
+            history[location] = history.get(location, 0) + pending * share
+    return demand
+
+
+def allocate(total, weights):
+    """
+    Split ``total`` copies over locations in proportion to ``weights``.
+
+    Uses the largest remainder method, so the result always sums to ``total`` and
+    never strays more than one copy from the exact proportional share.
+    """
+    weight_sum = sum(weights.values())
+    if not weight_sum:
+        return {}
+    exact = {
+        location: total * weight / weight_sum for location, weight in weights.items()
+    }
+    allocation = {location: int(share) for location, share in exact.items()}
+    leftover = total - sum(allocation.values())
+    # Stable sort, so ties go to locations in the order they were given
+    by_remainder = sorted(
+        exact, key=lambda location: allocation[location] - exact[location]
+    )
+    for location in by_remainder[:leftover]:
+        allocation[location] += 1
+    return allocation
+
+
+def plan_moves(demand, copies):
+    """
+    Return the smallest list of moves that brings each game to its target split.
+
+    Every copy costs the same to move, so pairing any surplus copy with any deficit
+    is optimal: the number of moves equals the total deficit that shelved copies
+    can cover. Copies on loan count towards their location but stay put.
+
+    :param demand: Output of ``location_demand``
+    :param copies: Iterable of ``(copy_id, game_id, location, is_available)``
+    :return: List of ``{"copy", "game", "from", "to"}`` dicts
+    """
+    shelves = {}
+    for copy_id, game_id, location, is_available in copies:
+        if game_id in demand:
+            shelves.setdefault(game_id, []).append((copy_id, location, is_available))
+
+    locations = [location for location, _ in GameCopy.PICKUP_LOCATION_CHOICES]
+    moves = []
+    for game_id, game_copies in sorted(shelves.items()):
+        weights = {location: demand[game_id].get(location, 0) for location in locations}
+        target = allocate(len(game_copies), weights)
+        if not target:
+            continue
+
+        current = dict.fromkeys(locations, 0)
+        movable = {location: [] for location in locations}
+        for copy_id, location, is_available in game_copies:
+            current[location] = current.get(location, 0) + 1
+            if is_available:
+                movable.setdefault(location, []).append(copy_id)
+
+        deficits = [
+            [location, target.get(location, 0) - count]
+            for location, count in current.items()
+            if target.get(location, 0) > count
+        ]
+        for location, count in current.items():
+            surplus = max(
+                0, min(count - target.get(location, 0), len(movable[location]))
+            )
+            for copy_id in sorted(movable[location])[:surplus]:
+                while deficits and deficits[0][1] == 0:
+                    deficits.pop(0)
+                if not deficits:
+                    break
+                deficits[0][1] -= 1
+                moves.append(
+                    {
+                        "copy": copy_id,
+                        "game": game_id,
+                        "from": location,
+                        "to": deficits[0][0],
+                    }
+                )
+    return moves
+
+
+def build_plan(days=DEFAULT_WINDOW_DAYS, now=None):
+    """Compute demand and plan the moves for the whole catalogue."""
+    demand = location_demand(days, now)
+    copies = GameCopy.objects.order_by().values_list(
+        "pk", "game", "pickup_location", "is_available"
+    )
+    return plan_moves(demand, copies.iterator(chunk_size=APPLY_BATCH_SIZE))
+
+
+def apply_plan(moves, batch_size=APPLY_BATCH_SIZE):
+    """
+    Apply an accepted plan with one ``bulk_update``.
+
+    Moves whose copy has since been borrowed or moved are skipped, so a plan
+    reviewed a while ago can still be applied safely.
+
+    :return: Number of copies moved
+    """
+    wanted = {move["copy"]: move for move in moves}
+    pks = iter(sorted(wanted))
+    with transaction.atomic():
+        updated = []
+        # Chunked so the IN lists stay under the database's parameter limit
+        while batch := list(islice(pks, batch_size)):
+            current = (
+                GameCopy.objects.select_for_update()
+                .filter(pk__in=batch, is_available=True)
+                .values_list("pk", "pickup_location")
+            )
+            updated.extend(
+                GameCopy(pk=pk, pickup_location=wanted[pk]["to"])
+                for pk, location in current
+                if location == wanted[pk]["from"]
+            )
+        GameCopy.objects.bulk_update(
+            updated, ["pickup_location"], batch_size=batch_size
+        )
+        if updated:
+            # bulk_update() skips the post_save signal that tracks copy changes
+            ResourceVersion.bump(ResourceVersion.AVAILABILITY)
+    return len(updated)
@@ -0,0 +1,235 @@
+"""
+Item-to-item "patrons who borrowed this also borrowed" recommendations.
+
+Loans (and optionally review ratings) form a sparse user x game matrix. Two games are
+similar when the same patrons borrowed both: the cosine similarity of their columns.
+The top-k neighbours of every game are computed in a nightly batch and stored in
+``GameRecommendation`` so the detail page only does an indexed lookup.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.db import models, transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import BoardGame, GameLoan, GameRecommendation, Review
+
+DEFAULT_TOP_K = 10
+# Rows of the similarity matrix computed at once; bounds memory on large catalogues
+BLOCK_SIZE = 1000
+# A loan or review can commit after an update that started later, or come from a dyno
+# with a skewed clock; updates also look at those stamped this long before the last one
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def candidate_games():
+    """Return the sorted ids of games outside private collections."""
+    return np.fromiter(
+        BoardGame.objects.exclude(collections__visibility="private")
+        .order_by("pk")
+        .values_list("pk", flat=True),
+        dtype=np.int64,
+    )
+
+
+def _columns(game_ids, ids):
+    """Map game ids to matrix columns; also return which ids have a column."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(game_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    columns = np.searchsorted(game_ids, ids)
+    clipped = np.minimum(columns, len(game_ids) - 1)
+    return clipped, (columns < len(game_ids)) & (game_ids[clipped] == ids)
+
+
+def _pairs(queryset, *fields):
+    rows = list(queryset.order_by().values_list(*fields))
+    if not rows:
+        return tuple(np.empty(0) for _ in fields)
+    return tuple(np.asarray(column) for column in zip(*rows))
+
+
+def build_matrix(game_ids, use_reviews=True):
+    """
+    Build the user x game interaction matrix as CSR.
+
+    A borrowed game scores 1. With ``use_reviews`` a review replaces that with
+    ``rating / 3`` (so 5 stars counts more than a plain loan and 1 star less), and
+    games reviewed without a loan count too.
+
+    :param game_ids: Sorted game ids that become the matrix columns
+    """
+    loan_users, loan_games = _pairs(
+        GameLoan.objects.distinct(), "user_id", "game_copy__game_id"
+    )
+    review_users, review_games, ratings = (
+        _pairs(Review.objects.all(), "user_id", "game_id", "rating")
+        if use_reviews
+        else (np.empty(0), np.empty(0), np.empty(0))
+    )
+
+    user_ids, user_index = np.unique(
+        np.concatenate([loan_users, review_users]).astype(np.int64),
+        return_inverse=True,
+    )
+    game_index, known = _columns(game_ids, np.concatenate([loan_games, review_games]))
+    shape = (len(user_ids), len(game_ids))
+
+    def matrix(rows, values):
+        keep = known[rows]
+        return sparse.csr_matrix(
+            (values[keep], (user_index[rows][keep], game_index[rows][keep])),
+            shape=shape,
+        )
+
+    n_loans = len(loan_users)
+    loans = matrix(np.arange(n_loans), np.ones(n_loans))
+    loans.data[:] = 1  # repeat loans of one game count once
+    if not len(review_users):
+        return loans
+    reviews = matrix(
+        np.arange(n_loans, n_loans + len(review_users)),
+        ratings.astype(np.float64) / 3,
+    )
+    return (loans - loans.multiply(reviews > 0) + reviews).tocsr()
+
+
+def top_neighbours(matrix, rows=None, k=DEFAULT_TOP_K):
+    """
+    Return the ``k`` most similar columns for each requested column of ``matrix``.
+
+    Columns are L2-normalised once, then the similarity matrix is built in blocks of
+    ``BLOCK_SIZE`` rows with sparse products, so memory stays proportional to the
+    co-borrow pairs in a block rather than games squared.
+
+    :param rows: Column indices to compute neighbours for (default: all)
+    :return: ``{column: [(neighbour column, score), ...]}``, best first
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (matrix @ sparse.diags(scale)).tocsc()
+    by_game = normalized.T.tocsr()
+
+    rows = np.arange(matrix.shape[1]) if rows is None else np.asarray(rows)
+    neighbours = {}
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:][:BLOCK_SIZE]
+        similarity = (by_game[block] @ normalized).tocsr()
+        for offset, column in enumerate(block):
+            begin, end = similarity.indptr[offset], similarity.indptr[offset + 1]
+            indices = similarity.indices[begin:end]
+            scores = similarity.data[begin:end]
+            keep = (indices != column) & (scores > 0)
+            indices, scores = indices[keep], scores[keep]
+            if len(scores) > k:
+                best = np.argpartition(-scores, k)[:k]
+                indices, scores = indices[best], scores[best]
+            order = np.lexsort((indices, -scores))
+            neighbours[int(column)] = [
+                (int(indices[i]), float(scores[i])) for i in order
+            ]
+    return neighbours
+
+
+def _store(game_ids, neighbours, computed_at, replace=None):
+    """Write the neighbours; ``replace`` limits the delete to those game ids."""
+    rows = [
+        GameRecommendation(
+            game_id=int(game_ids[column]),
+            recommended_id=int(game_ids[other]),
+            rank=rank,
+            score=round(score, 6),
+            computed_at=computed_at,
+        )
+        for column, others in neighbours.items()
+        for rank, (other, score) in enumerate(others, start=1)
+    ]
+    with transaction.atomic():
+        existing = GameRecommendation.objects.all()
+        if replace is not None:
+            existing = existing.filter(game_id__in=replace)
+        existing.delete()
+        GameRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild(k=DEFAULT_TOP_K, use_reviews=True):
+    """
+    Recompute every game's neighbours (the nightly job).
+
+    :return: Number of recommendation rows written
+    """
+    computed_at = timezone.now()
+    game_ids = candidate_games()
+    if not len(game_ids):
+        return _store(game_ids, {}, computed_at)
+    matrix = build_matrix(game_ids, use_reviews)
+    return _store(game_ids, top_neighbours(matrix, k=k), computed_at)
+
+
+def update(k=DEFAULT_TOP_K, use_reviews=True):
+    """
+    Refresh only the games whose neighbour lists new loans or reviews can change.
+
+    A new loan of game ``g`` changes ``g``'s column and therefore its similarity to
+    every game co-borrowed with it, so those games are recomputed too. Loans and
+    reviews are looked for from ``REFRESH_OVERLAP`` before the last update. Games
+    moved into a private collection since lose their stored neighbours and are
+    dropped from the others' lists. Falls back to a full ``rebuild`` when nothing
+    has been computed yet.
+
+    :return: Number of recommendation rows written
+    """
+    since = GameRecommendation.objects.aggregate(latest=models.Max("computed_at"))[
+        "latest"
+    ]
+    if since is None:
+        return rebuild(k, use_reviews)
+
+    computed_at = timezone.now()
+    since -= REFRESH_OVERLAP
+    changed = set(
+        GameLoan.objects.filter(borrowed_on__gte=since).values_list(
+            "game_copy__game_id", flat=True
+        )
+    )
+    if use_reviews:
+        changed.update(
+            Review.objects.filter(created_at__gte=since).values_list(
+                "game_id", flat=True
+            )
+        )
+    private = BoardGame.objects.filter(collections__visibility="private").values("pk")
+    withdrawn = list(
+        GameRecommendation.objects.filter(game__in=private)
+        .order_by()
+        .values_list("game_id", flat=True)
+        .distinct()
+    )
+    recommending_private = GameRecommendation.objects.filter(
+        recommended__in=private
+    ).values_list("game_id", flat=True)
+
+    game_ids = candidate_games()
+    columns, known = _columns(game_ids, sorted(changed))
+    columns = columns[known]
+    refill, known = _columns(game_ids, sorted(set(recommending_private)))
+    refill = refill[known]
+    if not len(columns) and not len(refill):
+        if withdrawn:
+            return _store(game_ids, {}, computed_at, replace=withdrawn)
+        return 0
+
+    matrix = build_matrix(game_ids, use_reviews)
+    # Games that share at least one patron with a changed game
+    co_borrowed = (matrix[:, columns].T @ matrix).tocsr()
+    affected = np.union1d(np.union1d(columns, co_borrowed.indices), refill)
+    neighbours = top_neighbours(matrix, rows=affected, k=k)
+    return _store(
+        game_ids,
+        neighbours,
+        computed_at,
+        replace=game_ids[affected].tolist() + withdrawn,
+    )
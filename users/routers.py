@@ -0,0 +1,102 @@
+"""
+Read-replica routing for the read-only listing and detail views.
+
+Views decorated with ``@reads_from_replica`` read from the ``replica`` database alias
+(a Heroku follower, or a second SQLite file locally) while every write, and every read
+elsewhere, goes to ``default``. Replicas lag behind, so after a request writes anything
+``ReplicaRoutingMiddleware`` pins that browser to the primary for
+``REPLICA_PIN_SECONDS`` with a short-lived cookie: a patron redirected to their profile
+after borrowing a game sees the loan. Without a ``replica`` alias nothing changes.
+"""
+
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+PIN_COOKIE = "pin_primary"
+
+_state = contextvars.ContextVar("replica_routing", default=None)
+
+
+class RoutingState:
+    """What the router needs to know about the request being handled."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica_reads = False
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.enabled = REPLICA in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if not self.enabled:
+            return None
+        state = _state.get()
+        if (
+            state is not None
+            and state.replica_reads
+            and not (state.pinned or state.wrote)
+        ):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # Explicit, or Django would write an object back to the alias it was read from
+        return DEFAULT_DB_ALIAS if self.enabled else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True if self.enabled else None
+
+
+class ReplicaRoutingMiddleware:
+    """Track writes per request and pin the browser to the primary after one."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+def reads_from_replica(view):
+    """Let ``view``'s reads go to the replica unless the request is pinned."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+        # Load the session and user from the primary before switching over
+        request.user.is_authenticated
+        state.replica_reads = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica_reads = False
+
+    return wrapper
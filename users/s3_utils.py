@@ -1,7 +1,25 @@
 # s3_utils.py
-import boto3
+import logging
+from functools import cache
+
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+
+@cache
+def s3_client():
+    """Return a shared S3 client, importing boto3 (slow, and large) on first use."""
+    import boto3
+
+    return boto3.client(
+        "s3",
+        region_name=settings.AWS_S3_REGION_NAME,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+    )
+
 
 def generate_presigned_url(key, expires_in=3600):
     """
@@ -12,18 +30,12 @@ def generate_presigned_url(key, expires_in=3600):
     :return: Pre-signed URL string or None
     """
     try:
-        s3_client = boto3.client(
-            "s3",
-            region_name=settings.AWS_S3_REGION_NAME,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        )
-        url = s3_client.generate_presigned_url(
+        url = s3_client().generate_presigned_url(
             "get_object",
             Params={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": key},
             ExpiresIn=expires_in,
         )
         return url
-    except Exception as e:
-        print(f"[S3 Error] Could not generate presigned URL: {e}")
+    except Exception:
+        logger.warning("Could not generate presigned URL for %s", key, exc_info=True)
         return None
@@ -0,0 +1,503 @@
+"""Bulk generation of synthetic library data for load tests and local development."""
+
+import itertools
+import random
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import analytics
+from .models import (
+    User,
+    Category,
+    BoardGame,
+    GameCopy,
+    GameLoan,
+    Review,
+    Collection,
+    BorrowRequest,
+    CollectionAccessRequest,
+    ResourceVersion,
+)
+
+BATCH_SIZE = 5000
+
+# Preset data volumes used by the benchmark suite. "full" mirrors the data volume we
+# expect at peak; the smaller ones are for CI and local runs.
+SCALES = {
+    "tiny": {
+        "users": 50,
+        "games": 40,
+        "copies": 120,
+        "loans": 400,
+        "reviews": 100,
+        "collections": 5,
+        "borrow_requests": 20,
+        "access_requests": 5,
+    },
+    "small": {
+        "users": 1_000,
+        "games": 100,
+        "copies": 500,
+        "loans": 10_000,
+        "reviews": 2_000,
+        "collections": 50,
+        "borrow_requests": 200,
+        "access_requests": 50,
+    },
+    "medium": {
+        "users": 10_000,
+        "games": 1_000,
+        "copies": 5_000,
+        "loans": 100_000,
+        "reviews": 20_000,
+        "collections": 500,
+        "borrow_requests": 2_000,
+        "access_requests": 500,
+    },
+    "full": {
+        "users": 100_000,
+        "games": 10_000,
+        "copies": 50_000,
+        "loans": 1_000_000,
+        "reviews": 200_000,
+        "collections": 5_000,
+        "borrow_requests": 20_000,
+        "access_requests": 5_000,
+    },
+}
+
+CATEGORY_NAMES = [
+    "Strategy",
+    "Family",
+    "Party",
+    "Card Game",
+    "Cooperative",
+    "Deck Building",
+    "Worker Placement",
+    "Abstract",
+    "Dexterity",
+    "Trivia",
+    "Wargame",
+    "Roll and Write",
+]
+
+TITLE_WORDS = [
+    "Castle",
+    "Dragon",
+    "Harbor",
+    "Empire",
+    "Forest",
+    "River",
+    "Station",
+    "Crown",
+    "Garden",
+    "Island",
+    "Market",
+    "Tower",
+    "Voyage",
+    "Shadow",
+    "Quest",
+    "Railway",
+]
+
+# Share of ratings 1..5; reviewers skew positive
+RATING_WEIGHTS = [5, 10, 20, 35, 30]
+
+# Share of games (the least popular ones) reserved for private collections, since a
+# game in a private collection may not appear in any public one
+PRIVATE_GAME_SHARE = 0.02
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_create(model, objects, batch_size):
+    """Insert objects in batches and return the created instances with their pks."""
+    created = []
+    for batch in _batched(objects, batch_size):
+        created.extend(model.objects.bulk_create(batch, batch_size=batch_size))
+    return created
+
+
+def _log(stdout, message):
+    if stdout is not None:
+        stdout.write(message)
+
+
+class ZipfSampler:
+    """
+    Draw items with Zipfian popularity: the item at rank r has weight 1 / r**exponent.
+
+    Items are shuffled first so popularity is not correlated with primary key order.
+    """
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        weights = [1 / (rank**exponent) for rank in range(1, len(self.items) + 1)]
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def sample(self, k):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def ranked(self):
+        """Return the items from most to least popular."""
+        return list(self.items)
+
+
+def seed_library(
+    users=0,
+    games=0,
+    copies=0,
+    loans=0,
+    reviews=0,
+    collections=0,
+    borrow_requests=0,
+    access_requests=0,
+    seed=0,
+    zipf_exponent=1.1,
+    prefix="seed",
+    batch_size=BATCH_SIZE,
+    stdout=None,
+):
+    """
+    Populate the database with synthetic library data using batched ``bulk_create``.
+
+    Game popularity (loans, reviews, requests, collection membership) follows a Zipf
+    distribution, and patron activity a flatter one. Rows are inserted directly, so the
+    per-row ``GameLoan.save`` side effects (status calculation and
+    ``update_availability``) are applied in bulk afterwards instead.
+
+    :param prefix: Prefix for generated emails so repeated runs do not collide
+    :param seed: Seed for the random generator; the same seed yields the same data
+    :return: Dict with the number of rows created per model
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    counts = {}
+
+    with transaction.atomic():
+        # bulk_create skips the signals that keep the version counters current; the
+        # bump becomes visible together with the new rows when the transaction commits
+        ResourceVersion.bump(*ResourceVersion.ALL)
+
+        # Categories are shared between runs
+        category_ids = []
+        for name in CATEGORY_NAMES:
+            category, _ = Category.objects.get_or_create(name=name)
+            category_ids.append(category.pk)
+
+        user_ids = _seed_users(prefix, users, batch_size)
+        counts["users"] = len(user_ids)
+        _log(stdout, f"Created {len(user_ids)} users")
+
+        # Games and their categories
+        created_games = _bulk_create(
+            BoardGame, (_make_game(rng, i) for i in range(games)), batch_size
+        )
+        game_ids = [game.pk for game in created_games]
+        BoardGame.categories.through.objects.bulk_create(
+            [
+                BoardGame.categories.through(boardgame_id=game_id, category_id=cat_id)
+                for game_id in game_ids
+                for cat_id in rng.sample(category_ids, rng.randint(1, 3))
+            ],
+            batch_size=batch_size,
+        )
+        counts["games"] = len(game_ids)
+        _log(stdout, f"Created {len(game_ids)} games")
+
+        if not game_ids:
+            return counts
+
+        game_sampler = ZipfSampler(rng, game_ids, zipf_exponent)
+        user_sampler = ZipfSampler(rng, user_ids, 0.8) if user_ids else None
+
+        # Every game gets one copy, popular games get the extra ones
+        copy_game_ids = game_ids[:copies] + game_sampler.sample(
+            max(0, copies - len(game_ids))
+        )
+        copies_by_game = _seed_copies(rng, copy_game_ids, batch_size)
+        counts["copies"] = sum(len(ids) for ids in copies_by_game.values())
+        _log(stdout, f"Created {counts['copies']} copies")
+
+        if user_sampler is None:
+            return counts
+
+        counts["loans"] = _seed_loans(
+            rng, now, user_sampler, game_sampler, copies_by_game, loans, batch_size
+        )
+        _log(stdout, f"Created {counts['loans']} loans")
+        # The loan signals that maintain the rollups did not fire for bulk inserts
+        counts["loan_stats"] = analytics.rebuild_loan_stats(batch_size=batch_size)
+        _log(stdout, f"Rebuilt {counts['loan_stats']} daily loan stats rows")
+
+        counts["reviews"] = _seed_reviews(
+            rng, user_sampler, game_sampler, reviews, batch_size
+        )
+        _log(stdout, f"Created {counts['reviews']} reviews")
+
+        private_collection_ids, counts["collections"] = _seed_collections(
+            rng, prefix, user_sampler, game_sampler, collections, batch_size
+        )
+        _log(stdout, f"Created {counts['collections']} collections")
+
+        counts["borrow_requests"] = _bulk_count(
+            BorrowRequest,
+            (
+                BorrowRequest(
+                    user_id=user_id,
+                    game_id=game_id,
+                    status=rng.choices(
+                        ["pending", "approved", "denied"], weights=[3, 5, 2]
+                    )[0],
+                )
+                for user_id, game_id in zip(
+                    user_sampler.sample(borrow_requests),
+                    game_sampler.sample(borrow_requests),
+                )
+            ),
+            batch_size,
+        )
+        counts["access_requests"] = 0
+        if private_collection_ids:
+            counts["access_requests"] = _bulk_count(
+                CollectionAccessRequest,
+                (
+                    CollectionAccessRequest(
+                        user_id=user_id,
+                        collection_id=rng.choice(private_collection_ids),
+                        status=rng.choices(
+                            ["pending", "approved", "denied"], weights=[3, 5, 2]
+                        )[0],
+                    )
+                    for user_id in user_sampler.sample(access_requests)
+                ),
+                batch_size,
+            )
+        _log(
+            stdout,
+            f"Created {counts['borrow_requests']} borrow requests and "
+            f"{counts['access_requests']} collection access requests",
+        )
+
+    return counts
+
+
+def _bulk_count(model, objects, batch_size):
+    created = 0
+    for batch in _batched(objects, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def _seed_users(prefix, users, batch_size, group_name="Patron"):
+    """Create users in the given group through the bulk provisioning API."""
+    created = User.objects.bulk_provision(
+        (
+            {
+                "email": f"{prefix}-{group_name.lower()}{i}@example.com",
+                "given_name": f"{group_name}{i}",
+                "family_name": "Seed",
+            }
+            for i in range(users)
+        ),
+        group_name=group_name,
+        batch_size=batch_size,
+    )
+    return [user.pk for user in created]
+
+
+def _make_game(rng, index):
+    min_players = rng.randint(1, 4)
+    return BoardGame(
+        title=f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {index}",
+        description="Generated game",
+        min_players=min_players,
+        max_players=min_players + rng.randint(0, 6),
+        playing_time=rng.choice([15, 30, 45, 60, 90, 120, 180]),
+        complexity=rng.randint(1, 5),
+    )
+
+
+def _seed_copies(rng, copy_game_ids, batch_size):
+    """Create copies and return a mapping of game id to its copy ids."""
+    locations = [choice[0] for choice in GameCopy.PICKUP_LOCATION_CHOICES]
+    created = _bulk_create(
+        GameCopy,
+        (
+            GameCopy(
+                game_id=game_id,
+                condition=rng.choice(["new", "excellent", "good", "fair"]),
+                pickup_location=rng.choice(locations),
+            )
+            for game_id in copy_game_ids
+        ),
+        batch_size,
+    )
+    copies_by_game = {}
+    for game_copy in created:
+        copies_by_game.setdefault(game_copy.game_id, []).append(game_copy.pk)
+    return copies_by_game
+
+
+def _seed_loans(
+    rng, now, user_sampler, game_sampler, copies_by_game, loans, batch_size
+):
+    """Create historical loans plus at most one active loan per copy."""
+    if not loans:
+        return 0
+
+    # About 5% of copies are currently out on loan, each with one open loan
+    all_copy_ids = [copy_id for ids in copies_by_game.values() for copy_id in ids]
+    active_copy_ids = rng.sample(
+        all_copy_ids, min(loans, max(1, len(all_copy_ids) // 20))
+    )
+
+    def generate():
+        for copy_id, user_id in zip(
+            active_copy_ids, user_sampler.sample(len(active_copy_ids))
+        ):
+            borrowed_on = now - timedelta(days=rng.randint(0, 20), minutes=copy_id)
+            due_date = borrowed_on + timedelta(days=14)
+            yield GameLoan(
+                user_id=user_id,
+                game_copy_id=copy_id,
+                borrowed_on=borrowed_on,
+                due_date=due_date,
+                status="overdue" if due_date < now else "borrowed",
+            )
+
+        remaining = loans - len(active_copy_ids)
+        while remaining > 0:
+            chunk = min(remaining, batch_size)
+            for game_id, user_id in zip(
+                game_sampler.sample(chunk), user_sampler.sample(chunk)
+            ):
+                borrowed_on = now - timedelta(
+                    days=rng.randint(22, 730), minutes=rng.randint(0, 1439)
+                )
+                yield GameLoan(
+                    user_id=user_id,
+                    game_copy_id=rng.choice(copies_by_game[game_id]),
+                    borrowed_on=borrowed_on,
+                    due_date=borrowed_on + timedelta(days=14),
+                    returned=True,
+                    returned_on=borrowed_on + timedelta(days=rng.randint(1, 21)),
+                    status="returned",
+                )
+            remaining -= chunk
+
+    created = _bulk_count(GameLoan, generate(), batch_size)
+
+    # bulk_create skips GameLoan.save(), which records where each loan was borrowed
+    GameLoan.objects.filter(pickup_location="").update(
+        pickup_location=models.Subquery(
+            GameCopy.objects.filter(pk=models.OuterRef("game_copy")).values(
+                "pickup_location"
+            )[:1]
+        )
+    )
+
+    # Apply GameCopy.update_availability in one statement instead of once per loan
+    GameCopy.objects.filter(loans__returned=False).update(is_available=False)
+    return created
+
+
+def _seed_reviews(rng, user_sampler, game_sampler, reviews, batch_size):
+    """Create reviews for distinct (user, game) pairs with positively skewed ratings."""
+    pairs = set()
+    # Popular games saturate quickly, so cap the attempts instead of looping forever
+    attempts = 0
+    while len(pairs) < reviews and attempts < 10:
+        needed = reviews - len(pairs)
+        pairs.update(zip(user_sampler.sample(needed), game_sampler.sample(needed)))
+        attempts += 1
+
+    return _bulk_count(
+        Review,
+        (
+            Review(
+                user_id=user_id,
+                game_id=game_id,
+                rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                title="Generated review",
+            )
+            for user_id, game_id in sorted(pairs)[:reviews]
+        ),
+        batch_size,
+    )
+
+
+def _seed_collections(rng, prefix, user_sampler, game_sampler, collections, batch_size):
+    """
+    Create public patron collections and a few private librarian collections.
+
+    :return: Tuple of (private collection ids, number of collections created)
+    """
+    if not collections:
+        return [], 0
+
+    ranked_games = game_sampler.ranked()
+    reserved = max(1, int(len(ranked_games) * PRIVATE_GAME_SHARE))
+    private_games = ranked_games[-reserved:]
+    public_game_set = set(ranked_games[:-reserved]) or set(ranked_games)
+
+    librarian_id = _seed_users(prefix, 1, batch_size, group_name="Librarian")[0]
+    # Roughly one in ten collections is private, as long as there is a public one too
+    private_count = (collections + 9) // 10 if collections > 1 else 0
+    creators = user_sampler.sample(collections - private_count)
+
+    created = _bulk_create(
+        Collection,
+        [
+            Collection(
+                title=f"Collection {i}",
+                description="Generated collection",
+                creator_id=creator_id,
+                visibility="public",
+            )
+            for i, creator_id in enumerate(creators)
+        ]
+        + [
+            Collection(
+                title=f"Private Collection {i}",
+                description="Generated collection",
+                creator_id=librarian_id,
+                visibility="private",
+            )
+            for i in range(private_count)
+        ],
+        batch_size,
+    )
+
+    memberships = []
+    private_ids = []
+    for collection in created:
+        if collection.visibility == "private":
+            private_ids.append(collection.pk)
+            game_ids = rng.sample(private_games, min(len(private_games), 3))
+        else:
+            game_ids = {
+                game_id
+                for game_id in game_sampler.sample(rng.randint(3, 15))
+                if game_id in public_game_set
+            }
+        memberships.extend(
+            Collection.games.through(collection_id=collection.pk, boardgame_id=game_id)
+            for game_id in game_ids
+        )
+    Collection.games.through.objects.bulk_create(memberships, batch_size=batch_size)
+    return private_ids, len(created)
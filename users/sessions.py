@@ -0,0 +1,98 @@
+"""
+Session engine that keeps patrons' sessions in signed cookies.
+
+Patrons, who make up most of the traffic, carry their whole session in a signed cookie,
+so reading it costs no database or cache round trip. Librarian and staff sessions stay
+server side (``cached_db``), where they can be revoked by deleting the row. The store
+is chosen whenever the session is saved, from a flag set at login (``users/signals.py``),
+so a patron promoted to librarian moves server side at their next login.
+
+Sessions created by the ``db`` and ``cached_db`` engines keep working: a cookie holding
+a plain session key is loaded from the database, its user's role is looked up once, and
+a patron's session is re-issued as a signed cookie at the end of that request. The old
+rows expire and are removed by ``clearsessions``.
+
+Enable with ``SESSION_BACKEND=signed_cookies`` (see ``core/settings.py``).
+"""
+
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.core import signing
+from django.db import models
+
+from .models import User
+
+# Session key marking a session that must be stored server side
+SERVER_SIDE = "_server_side"
+# Shared with Django's signed_cookies engine, so either can read the other's cookies
+SALT = "django.contrib.sessions.backends.signed_cookies"
+
+
+def is_signed(session_key):
+    """Tell a signed-cookie payload ("data:timestamp:signature") from a database key."""
+    return session_key is not None and ":" in session_key
+
+
+def needs_server_side(user):
+    """Return whether ``user``'s sessions must stay revocable (librarians and staff)."""
+    return user.is_staff or user.is_superuser or user.is_librarian()
+
+
+def _user_needs_server_side(user_id):
+    return (
+        User.objects.filter(pk=user_id)
+        .filter(
+            models.Q(is_staff=True)
+            | models.Q(is_superuser=True)
+            | models.Q(groups__name="Librarian")
+        )
+        .exists()
+    )
+
+
+class SessionStore(cached_db.SessionStore):
+    def load(self):
+        if not is_signed(self.session_key):
+            data = super().load()
+            if SESSION_KEY in data and not data.get(SERVER_SIDE):
+                # Saved by another engine: place it now, moving patrons to a cookie
+                data[SERVER_SIDE] = _user_needs_server_side(data[SESSION_KEY])
+                self.modified = True
+            return data
+        try:
+            return signing.loads(
+                self.session_key,
+                serializer=self.serializer,
+                max_age=self.get_session_cookie_age(),
+                salt=SALT,
+            )
+        except Exception:
+            # Tampered with, expired or unreadable: start over, as signed_cookies does
+            self.create()
+            return {}
+
+    def exists(self, session_key):
+        return not is_signed(session_key) and super().exists(session_key)
+
+    def create(self):
+        # Where the new session lives is decided when it is first saved
+        self._session_key = None
+        self.modified = True
+
+    def save(self, must_create=False):
+        if self._session.get(SERVER_SIDE):
+            if self.session_key is None or is_signed(self.session_key):
+                # Allocates a database key and saves through save(must_create=True)
+                return super().create()
+            return super().save(must_create)
+        self._session_key = signing.dumps(
+            self._session, compress=True, salt=SALT, serializer=self.serializer
+        )
+        self.modified = True
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        # A signed cookie has nothing server side; the middleware clears the cookie
+        if session_key and not is_signed(session_key):
+            super().delete(session_key)
@@ -1,11 +1,37 @@
+import logging
+
 from allauth.socialaccount.signals import (
     pre_social_login,
     # social_account_added,
     # social_account_updated
 )
 from allauth.account.signals import user_signed_up
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.core.signals import request_finished
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
+from django.contrib.auth.signals import user_logged_in
+from django.utils import timezone
+
+from . import analytics, pooling, tasks
+from .jobs import enqueue
+from .sessions import SERVER_SIDE, needs_server_side
+from .models import (
+    BoardGame,
+    Category,
+    Collection,
+    GameCopy,
+    GameLoan,
+    ResourceVersion,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(pre_social_login)
@@ -17,8 +43,9 @@ def handle_pre_social_login(sender, request, sociallogin, **kwargs):
     user.given_name = extra_data.get("given_name", "")
     user.family_name = extra_data.get("family_name", "")
 
-    print(
-        f"[INFO] Social account information associated with user model for user {user.given_name} {user.family_name}."
+    logger.info(
+        "Social account details copied to user",
+        extra={"provider": sociallogin.account.provider},
     )
 
 
@@ -34,7 +61,7 @@ def handle_social_account_added(sender, request, sociallogin, **kwargs):
     patron_group, _ = Group.objects.get_or_create(name="Patron")
     user.groups.add(patron_group)
 
-    print(f"[INFO] User {user.given_name} {user.family_name} added to Patron group.")
+    logger.info("User added to Patron group", extra={"user_id": user.pk})
 """
 
 
@@ -46,12 +73,108 @@ def user_signed_up_handler(request, user, **kwargs):
         extra_data = sociallogin.account.extra_data
         user.given_name = extra_data.get("given_name", "")
         user.family_name = extra_data.get("family_name", "")
+        user.save(update_fields=["given_name", "family_name"])
 
-    # Add the user to the Patron group
+    # Add the user to the Patron group (a no-op for users provisioned into it already)
     patron_group, _ = Group.objects.get_or_create(name="Patron")
     user.groups.add(patron_group)
-    user.save()
 
-    print(
-        f"[INFO] New user {user.given_name} {user.family_name} signed up and added to Patron group."
+    logger.info(
+        "New user signed up and added to Patron group", extra={"user_id": user.pk}
     )
+
+
+@receiver(user_logged_in)
+def keep_privileged_sessions_server_side(sender, request, user, **kwargs):
+    # Read by users.sessions: only patrons' sessions may live in signed cookies
+    request.session[SERVER_SIDE] = needs_server_side(user)
+
+
+@receiver(request_finished)
+def report_pool_stats(sender, **kwargs):
+    pooling.log_pool_stats()
+
+
+def _is_pre_m2m_action(kwargs):
+    """m2m_changed fires before and after each change; only count the "post_" one."""
+    return kwargs.get("action", "").startswith("pre_")
+
+
+# Keep the ResourceVersion counters in step with the data they describe. Queryset
+# .update() and bulk_create() skip these signals, so callers that use them bump the
+# counters themselves.
+@receiver([post_save, post_delete], sender=BoardGame)
+@receiver([post_save, post_delete], sender=Category)
+@receiver(m2m_changed, sender=BoardGame.categories.through)
+def bump_games_version(sender, **kwargs):
+    if _is_pre_m2m_action(kwargs):
+        return
+    ResourceVersion.bump(ResourceVersion.GAMES)
+
+
+# In-memory indexes (users/similarity.py) refresh the games saved since they were
+# built, so category changes must move updated_at, which m2m writes do not
+@receiver(m2m_changed, sender=BoardGame.categories.through)
+def touch_recategorized_games(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove"):
+        game_ids = pk_set if reverse else [instance.pk]
+    elif action == "pre_clear":
+        game_ids = instance.games.values("pk") if reverse else [instance.pk]
+    else:
+        return
+    BoardGame.objects.filter(pk__in=game_ids).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Category)
+def touch_games_of_deleted_category(sender, instance, **kwargs):
+    instance.games.update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=GameCopy)
+def bump_availability_version(sender, **kwargs):
+    ResourceVersion.bump(ResourceVersion.AVAILABILITY)
+
+
+@receiver([post_save, post_delete], sender=Collection)
+@receiver(m2m_changed, sender=Collection.games.through)
+def bump_collections_version(sender, **kwargs):
+    if _is_pre_m2m_action(kwargs):
+        return
+    ResourceVersion.bump(ResourceVersion.COLLECTIONS)
+
+
+# Keep the daily loan rollups current and queue the patron's receipts. post_init
+# remembers whether a loan was already returned when it was loaded, so post_save can
+# tell a return from any other edit without querying the old row.
+@receiver(post_init, sender=GameLoan)
+def remember_loan_state(sender, instance, **kwargs):
+    instance._was_returned = instance.returned
+
+
+@receiver(post_save, sender=GameLoan)
+def update_loan_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        analytics.record_borrow(instance)
+        enqueue(tasks.loan_receipt, loan_id=instance.pk, event="borrowed")
+    if instance.returned and (created or not instance._was_returned):
+        analytics.record_return(instance)
+        enqueue(tasks.loan_receipt, loan_id=instance.pk, event="returned")
+    instance._was_returned = instance.returned
+
+
+# Availability alerts fire when a copy becomes available, whether returned, marked
+# available by a librarian or newly added. The job commits with the change.
+@receiver(post_init, sender=GameCopy)
+def remember_copy_availability(sender, instance, **kwargs):
+    instance._was_available = instance.is_available
+
+
+@receiver(post_save, sender=GameCopy)
+def queue_availability_alerts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.is_available and (created or not instance._was_available):
+        enqueue(tasks.notify_available, game_ids=[instance.game_id])
+    instance._was_available = instance.is_available
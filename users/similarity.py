@@ -0,0 +1,208 @@
+"""
+"Similar games" from game attributes rather than borrowing history.
+
+Every game is a feature vector: its categories (one-hot, scaled so a game with many
+categories is not favoured) followed by standardised player counts, log playing
+time and complexity. Vectors are L2-normalised and kept in one float32 NumPy array,
+so a cosine kNN query is a single matrix-vector product over the catalogue.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .indexes import VersionedIndex
+from .models import BoardGame, Collection, ResourceVersion
+
+NUMERIC_FIELDS = ("min_players", "max_players", "playing_time", "complexity")
+# Relative weight of the numeric block against the category block
+NUMERIC_WEIGHT = 0.5
+DEFAULT_K = 10
+# Refreshes touching more games than this rebuild instead (keeps IN lists short)
+MAX_INCREMENTAL_GAMES = 500
+# updated_at is taken when a save starts, on that dyno's clock, so a save can commit
+# with a time before the last refresh. Refreshes re-vectorise games saved this long
+# before it too, which is harmless for games that did not change.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class GameVectors:
+    """An immutable snapshot of the index; replaced as a whole on every change."""
+
+    def __init__(self, ids, titles, vectors, hidden):
+        self.ids = ids
+        self.titles = titles
+        self.vectors = vectors
+        self.hidden = hidden
+        self.rows = {int(game_id): row for row, game_id in enumerate(ids)}
+
+
+class SimilarGamesIndex(VersionedIndex):
+    """Feature vectors of every game, refreshed incrementally as games change."""
+
+    resources = (ResourceVersion.GAMES, ResourceVersion.COLLECTIONS)
+
+    def build(self):
+        built_at = timezone.now()
+        games = list(
+            BoardGame.objects.order_by("pk").values_list("pk", "title", *NUMERIC_FIELDS)
+        )
+        links = list(
+            BoardGame.categories.through.objects.values_list(
+                "boardgame_id", "category_id"
+            )
+        )
+        numeric = self._numeric(games)
+        # Mean and spread of each attribute, ignoring games that leave it blank
+        present = ~np.isnan(numeric)
+        counts = np.maximum(present.sum(axis=0), 1)
+        self.mean = np.where(present, numeric, 0).sum(axis=0) / counts
+        variance = (np.where(present, numeric - self.mean, 0) ** 2).sum(axis=0) / counts
+        self.std = np.where(variance > 0, np.sqrt(variance), 1)
+        self.columns = {
+            category_id: i
+            for i, category_id in enumerate(sorted({link[1] for link in links}))
+        }
+
+        ids = np.array([game[0] for game in games], dtype=np.int64)
+        vectors = self._vectorize(ids, numeric, links)
+        self.snapshot = GameVectors(
+            ids, [game[1] for game in games], vectors, self._hidden_mask(ids)
+        )
+        self.built_at = built_at
+
+    def refresh(self, old_versions, new_versions):
+        snapshot = self.snapshot
+        if old_versions[ResourceVersion.GAMES] != new_versions[ResourceVersion.GAMES]:
+            snapshot = self._refresh_games(snapshot)
+            if snapshot is None:
+                return self.build()
+        self.snapshot = GameVectors(
+            snapshot.ids,
+            snapshot.titles,
+            snapshot.vectors,
+            self._hidden_mask(snapshot.ids),
+        )
+
+    def _refresh_games(self, snapshot):
+        """
+        Re-vectorise the games saved since the last build or refresh.
+
+        The window starts ``REFRESH_OVERLAP`` before the last one ended.
+
+        :return: The updated snapshot, or None when a full rebuild is needed instead
+            (a game was deleted, a category is used for the first time or too many
+            games changed)
+        """
+        since, refreshed_at = self.built_at, timezone.now()
+        games = list(
+            BoardGame.objects.filter(updated_at__gte=since - REFRESH_OVERLAP)
+            .order_by("pk")
+            .values_list("pk", "title", *NUMERIC_FIELDS)
+        )
+        if len(games) > MAX_INCREMENTAL_GAMES:
+            return None
+        ids = np.array([game[0] for game in games], dtype=np.int64)
+        new_ids = [int(game_id) for game_id in ids if game_id not in snapshot.rows]
+        if BoardGame.objects.count() != len(snapshot.rows) + len(new_ids):
+            return None
+        links = BoardGame.categories.through.objects.filter(
+            boardgame_id__in=ids.tolist()
+        ).values_list("boardgame_id", "category_id")
+        vectors = self._vectorize(ids, self._numeric(games), links)
+        if vectors is None:
+            return None
+
+        all_ids = np.concatenate([snapshot.ids, np.array(new_ids, dtype=np.int64)])
+        all_vectors = np.vstack(
+            [snapshot.vectors, np.zeros((len(new_ids), vectors.shape[1]), np.float32)]
+        )
+        titles = snapshot.titles + [None] * len(new_ids)
+        rows = snapshot.rows | {
+            game_id: len(snapshot.rows) + i for i, game_id in enumerate(new_ids)
+        }
+        for i, game in enumerate(games):
+            all_vectors[rows[game[0]]] = vectors[i]
+            titles[rows[game[0]]] = game[1]
+
+        self.built_at = refreshed_at
+        return GameVectors(all_ids, titles, all_vectors, None)
+
+    def _numeric(self, games):
+        numeric = np.array([game[2:] for game in games], dtype=np.float64).reshape(
+            len(games), len(NUMERIC_FIELDS)
+        )
+        # Playing times span minutes to days; compare them on a log scale
+        numeric[:, 2] = np.log1p(numeric[:, 2])
+        return numeric
+
+    def _vectorize(self, ids, numeric, links):
+        """Return normalised vectors for ``ids``, or None if a category is unknown."""
+        categories = np.zeros((len(ids), len(self.columns)), dtype=np.float32)
+        position = {int(game_id): i for i, game_id in enumerate(ids)}
+        for game_id, category_id in links:
+            if category_id not in self.columns:
+                return None
+            categories[position[game_id], self.columns[category_id]] = 1
+        counts = categories.sum(axis=1, keepdims=True)
+        categories /= np.sqrt(np.maximum(counts, 1))
+
+        filled = np.where(np.isnan(numeric), self.mean, numeric)
+        standardized = NUMERIC_WEIGHT * (filled - self.mean) / self.std
+        vectors = np.hstack([categories, standardized.astype(np.float32)])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def _hidden_mask(self, ids):
+        """Flag games in private collections, which are never suggested."""
+        private = set(
+            Collection.games.through.objects.filter(
+                collection__visibility="private"
+            ).values_list("boardgame_id", flat=True)
+        )
+        return np.isin(ids, list(private))
+
+    def similar_many(self, game_ids, k=DEFAULT_K):
+        """
+        Answer several "similar to X" queries with one matrix product.
+
+        :return: ``{game_id: [(similar_id, title, score), ...]}``, best first; ids
+            not in the index are left out
+        """
+        snapshot = self.snapshot
+        known = [game_id for game_id in game_ids if game_id in snapshot.rows]
+        if not known:
+            return {}
+        query_rows = np.array([snapshot.rows[game_id] for game_id in known])
+        scores = snapshot.vectors[query_rows] @ snapshot.vectors.T
+        scores[:, snapshot.hidden] = -np.inf
+        scores[np.arange(len(query_rows)), query_rows] = -np.inf
+
+        k = min(k, scores.shape[1] - 1)
+        results = {}
+        for i, game_id in enumerate(known):
+            best = np.argpartition(-scores[i], k - 1)[:k] if k > 0 else []
+            best = sorted(best, key=lambda j: -scores[i][j])
+            results[game_id] = [
+                (
+                    int(snapshot.ids[j]),
+                    snapshot.titles[j],
+                    round(float(scores[i][j]), 4),
+                )
+                for j in best
+                if np.isfinite(scores[i][j])
+            ]
+        return results
+
+    def similar(self, game_id, k=DEFAULT_K):
+        """Return the ``k`` games most similar to one game, or None if unknown."""
+        return self.similar_many([game_id], k).get(game_id)
+
+
+similar_games_index = SimilarGamesIndex()
+
+
+def similar_games(game_id, k=DEFAULT_K):
+    """Return the games most similar to ``game_id`` from the process-wide index."""
+    return similar_games_index.load().similar(game_id, k)
@@ -0,0 +1,260 @@
+(function () {
+const complexity = document.getElementById("complexity");
+const complexityValue = document.getElementById("complexityValue");
+if (complexity && complexityValue) {
+complexity.addEventListener("input", function () {
+complexityValue.textContent = this.value;
+});
+}
+document.querySelectorAll(".needs-validation").forEach(function (form) {
+form.addEventListener("submit", function (event) {
+if (!form.checkValidity()) {
+event.preventDefault();
+event.stopPropagation();
+}
+form.classList.add("was-validated");
+}, false);
+});
+})();
+(function () {
+document.querySelectorAll("a[data-facet-input]").forEach(function (link) {
+link.addEventListener("click", function (event) {
+event.preventDefault();
+document.getElementById(link.dataset.facetInput).value = link.dataset.facetValue;
+});
+});
+})();
+(function () {
+const input = document.getElementById("gameSearch");
+const suggestions = document.getElementById("searchSuggestions");
+if (!input || !suggestions) {
+return;
+}
+let timer = null;
+let pending = null;
+function show(results) {
+suggestions.replaceChildren();
+for (const result of results) {
+const link = document.createElement("a");
+link.href = result.url;
+link.className = "list-group-item list-group-item-action d-flex justify-content-between";
+link.textContent = result.label;
+if (result.type === "category") {
+const badge = document.createElement("span");
+badge.className = "badge bg-secondary";
+badge.textContent = "Category";
+link.append(badge);
+}
+suggestions.append(link);
+}
+suggestions.classList.toggle("d-none", results.length === 0);
+}
+input.addEventListener("input", () => {
+clearTimeout(timer);
+timer = setTimeout(() => {
+if (pending) {
+pending.abort();
+}
+if (!input.value.trim()) {
+show([]);
+return;
+}
+pending = new AbortController();
+fetch(input.dataset.url + "?" + new URLSearchParams({q: input.value}), {signal: pending.signal})
+.then((response) => (response.ok ? response.json() : {results: []}))
+.then((data) => show(data.results))
+.catch(() => {});
+}, 150);
+});
+input.addEventListener("keydown", (event) => {
+if (event.key === "Escape") {
+show([]);
+}
+});
+document.addEventListener("click", (event) => {
+if (!suggestions.contains(event.target) && event.target !== input) {
+show([]);
+}
+});
+})();
+document.addEventListener('DOMContentLoaded', function() {
+const selectedGamesContainer = document.getElementById('selectedGames');
+if (!selectedGamesContainer) {
+return;
+}
+const visibilitySelect = document.querySelector('select[name="visibility"]');
+const privateSettings = document.getElementById('private-settings');
+if (visibilitySelect) {
+visibilitySelect.addEventListener('change', function() {
+if (this.value === 'private') {
+privateSettings.classList.remove('d-none');
+} else {
+privateSettings.classList.add('d-none');
+}
+});
+}
+const gameCheckboxes = document.querySelectorAll('.game-checkbox');
+const noSelectedGamesElement = document.getElementById('noSelectedGames');
+const gameSearch = document.getElementById('gameSearch');
+updateSelectedGames();
+gameCheckboxes.forEach(checkbox => {
+checkbox.addEventListener('change', updateSelectedGames);
+});
+if (gameSearch) {
+gameSearch.addEventListener('input', function() {
+const searchTerm = this.value.toLowerCase();
+const gameItems = document.querySelectorAll('#availableGames .list-group-item');
+gameItems.forEach(item => {
+const gameTitle = item.querySelector('strong')?.textContent.toLowerCase() || '';
+if (gameTitle.includes(searchTerm)) {
+item.style.display = '';
+} else {
+item.style.display = 'none';
+}
+});
+});
+}
+function updateSelectedGames() {
+const selectedCheckboxes = document.querySelectorAll('.game-checkbox:checked');
+selectedGamesContainer.innerHTML = '';
+if (selectedCheckboxes.length === 0) {
+selectedGamesContainer.appendChild(noSelectedGamesElement);
+noSelectedGamesElement.style.display = '';
+} else {
+selectedCheckboxes.forEach(checkbox => {
+const gameItem = checkbox.closest('.list-group-item').cloneNode(true);
+gameItem.querySelector('.form-check').remove(); // Remove checkbox
+selectedGamesContainer.appendChild(gameItem);
+});
+}
+}
+});
+(function () {
+const inputs = document.querySelectorAll("input[data-direct-upload]");
+inputs.forEach(function (input) {
+const form = input.form;
+const token = document.getElementById(input.dataset.directUpload);
+const status = document.getElementById(input.id + "_status");
+const submits = form.querySelectorAll("[type=submit]");
+function finish(message) {
+status.textContent = message;
+submits.forEach((button) => (button.disabled = false));
+}
+input.addEventListener("change", function () {
+const file = input.files[0];
+token.value = "";
+if (!file) {
+finish("");
+return;
+}
+if (file.size > Number(input.dataset.maxSize)) {
+finish("That file is too large.");
+return;
+}
+submits.forEach((button) => (button.disabled = true));
+status.textContent = "Uploading…";
+const csrf = form.querySelector("[name=csrfmiddlewaretoken]").value;
+fetch(input.dataset.url, {
+method: "POST",
+headers: {"X-CSRFToken": csrf},
+body: new URLSearchParams({kind: input.dataset.kind, content_type: file.type}),
+})
+.then((response) => response.json().then((data) => {
+if (!response.ok) {
+throw new Error(data.error || "The upload could not start.");
+}
+return data;
+}))
+.then((upload) => {
+const body = new FormData();
+for (const [name, value] of Object.entries(upload.fields)) {
+body.append(name, value);
+}
+body.append("file", file);
+return fetch(upload.url, {method: "POST", body: body}).then((response) => {
+if (!response.ok) {
+throw new Error("The upload was refused; check the file's size and type.");
+}
+token.value = upload.token;
+finish("Uploaded, save to keep it.");
+});
+})
+.catch((error) => {
+input.value = "";
+finish(error.message);
+});
+});
+});
+})();
+(function () {
+const button = document.getElementById("loadMoreReviews");
+if (!button) {
+return;
+}
+const feed = document.getElementById("reviewFeed");
+function renderReview(review) {
+const item = document.createElement("div");
+item.className = "mb-3 pb-3 border-bottom";
+const header = document.createElement("div");
+header.className = "d-flex justify-content-between";
+const title = document.createElement("h6");
+title.textContent = review.title || "Review";
+const meta = document.createElement("div");
+const rating = document.createElement("span");
+rating.className = "badge bg-warning text-dark";
+rating.textContent = review.rating + "/5";
+const date = document.createElement("small");
+date.className = "text-muted ms-2";
+date.textContent = new Date(review.created_at).toLocaleDateString(undefined, {month: "short", day: "2-digit", year: "numeric"});
+meta.append(rating, date);
+header.append(title, meta);
+const comment = document.createElement("p");
+comment.className = "mb-1";
+comment.textContent = review.comment;
+const author = document.createElement("small");
+author.className = "text-muted";
+author.textContent = "- " + review.author;
+item.append(header, comment, author);
+return item;
+}
+async function loadMore(event) {
+event.preventDefault();
+button.classList.add("disabled");
+const response = await fetch(button.dataset.feedUrl + "?cursor=" + encodeURIComponent(button.dataset.cursor));
+const data = await response.json();
+data.results.forEach(review => feed.appendChild(renderReview(review)));
+if (data.next_cursor) {
+button.dataset.cursor = data.next_cursor;
+button.classList.remove("disabled");
+} else {
+button.remove();
+}
+}
+button.addEventListener("click", loadMore);
+new IntersectionObserver(entries => {
+if (entries[0].isIntersecting && !button.classList.contains("disabled")) {
+button.click();
+}
+}).observe(button);
+})();
+(function () {
+const card = document.getElementById("similarGames");
+if (!card) {
+return;
+}
+fetch(card.dataset.url)
+.then((response) => (response.ok ? response.json() : {results: []}))
+.then((data) => {
+const list = document.getElementById("similarGamesList");
+for (const game of data.results) {
+const item = document.createElement("li");
+item.className = "list-group-item";
+const link = document.createElement("a");
+link.href = card.dataset.gameUrl.replace("/0/", "/" + game.id + "/");
+link.textContent = game.title;
+item.append(link);
+list.append(item);
+}
+card.classList.toggle("d-none", data.results.length === 0);
+});
+})();
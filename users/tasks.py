@@ -0,0 +1,72 @@
+"""
+Background tasks run by ``run_worker`` (see ``users/jobs.py``).
+
+Each is queued with ``jobs.enqueue`` in the transaction of the event it reacts to,
+so a patron's request never waits for notifications or email.
+"""
+
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from . import alerts
+from .jobs import enqueue, task
+from .models import BorrowRequest, CollectionAccessRequest, GameLoan, Notification
+
+
+@task
+def notify_available(game_ids):
+    """Write availability alerts for games that came back, then send them."""
+    if alerts.notify_available(game_ids):
+        enqueue(deliver_notifications, unique=True)
+
+
+@task(atomic=False)
+def deliver_notifications():
+    """Email every unsent notification in the outbox, committing batch by batch."""
+    alerts.deliver_notifications()
+
+
+@task
+def loan_receipt(loan_id, event):
+    """Tell a patron their loan was recorded ("borrowed") or closed ("returned")."""
+    loan = GameLoan.objects.select_related("game_copy__game").filter(pk=loan_id).first()
+    if loan is None:
+        return
+    game = loan.game_copy.game
+    if event == "borrowed":
+        subject = f"You borrowed '{game.title}'"
+        body = (
+            f"Pick it up at {loan.game_copy.get_pickup_location_display()}. "
+            "It is due back on "
+            f"{date_format(timezone.localtime(loan.due_date), 'F j, Y')}."
+        )
+    else:
+        subject = f"You returned '{game.title}'"
+        body = "Thanks! The game is back on the shelf for the next patron."
+    Notification.objects.create(
+        user_id=loan.user_id, game=game, subject=subject, body=body
+    )
+    enqueue(deliver_notifications, unique=True)
+
+
+@task
+def request_decided(kind, request_id):
+    """Tell a patron a librarian approved or denied their borrow or access request."""
+    if kind == "borrow":
+        decided = BorrowRequest.objects.select_related("game").get(pk=request_id)
+        game, about = decided.game, f"borrow request for '{decided.game.title}'"
+        url = reverse("board_game_detail", args=[game.pk])
+    else:
+        decided = CollectionAccessRequest.objects.select_related("collection").get(
+            pk=request_id
+        )
+        game, about = None, f"access request for '{decided.collection.title}'"
+        url = reverse("collection_detail", args=[decided.collection_id])
+    Notification.objects.create(
+        user_id=decided.user_id,
+        game=game,
+        subject=f"Your {about} was {decided.status.lower()}",
+        body=f"See {url}",
+    )
+    enqueue(deliver_notifications, unique=True)
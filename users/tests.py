@@ -1,11 +1,89 @@
-from django.test import TestCase, Client
+import base64
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import skipUnless
+
+import dj_database_url
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.conf import settings
+from django.db.utils import ConnectionHandler
+from django.test import (
+    TestCase,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import Group
+from django.contrib.sessions.models import Session
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 from datetime import timedelta
-from .models import User, Category, BoardGame, GameCopy, GameLoan, Review, Collection
+from botocore.stub import ANY, Stubber
+from .models import (
+    AvailabilityAlert,
+    Notification,
+    SavedSearch,
+    User,
+    Category,
+    BoardGame,
+    GameCopy,
+    GameLoan,
+    Review,
+    Collection,
+    BorrowRequest,
+    CollectionAccessRequest,
+    DailyLoanStats,
+    GameRecommendation,
+    Job,
+    ResourceVersion,
+)
+from .queries import (
+    availability_snapshot,
+    collection_detail_validators,
+    encode_cursor,
+    facet_counts,
+    location_inventory,
+    location_summary,
+    rating_histogram,
+    review_page,
+)
+from .checks import check_session_cache
+from .middleware import BlockAdminMiddleware, compile_prefixes
+from .sessions import is_signed
+from .views import LOAN_HISTORY_PAGE_SIZE
+from django.templatetags.static import static
 from django.urls import reverse
+from . import (
+    alerts,
+    assets,
+    benchmarks,
+    boot,
+    jobs,
+    log,
+    pooling,
+    rebalancing,
+    recommendations,
+    routers,
+    tasks,
+    uploads,
+)
+from .forms import BoardGameForm
+from .s3_utils import s3_client
+from .seeding import SCALES, seed_library
+from .autocomplete import autocomplete_index, complete, normalize
+from .similarity import similar_games, similar_games_index
 
 
 class UserModelTests(TestCase):
@@ -420,6 +498,14 @@ class CollectionModelTests(TestCase):
         self.assertEqual(url, f"/collections/{self.public_collection.pk}/")
 
 
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+
 class AuthorizationViewTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -445,3 +531,2059 @@ class AuthorizationViewTests(TestCase):
         url = reverse("profile", kwargs={"pk": self.user2.pk})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 403)
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_staff_are_sent_to_the_admin_site(self):
+        staff = User.objects.create_user(
+            email="staff@example.com", password="testpass", is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get(reverse("board_game_catalogue"))
+        self.assertRedirects(
+            response, reverse("admin:index"), fetch_redirect_response=False
+        )
+        response = self.client.get(reverse("admin:password_change"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_staff_path_rules_skip_the_user_when_they_cannot_apply(self):
+        self.assertEqual(compile_prefixes(["/games/", "/", "/admin/", "/"]), ("/",))
+        self.assertEqual(
+            compile_prefixes(["/games/", "/gamesroom/", "/admin/"]),
+            ("/admin/", "/games/", "/gamesroom/"),
+        )
+
+        def unexpected_user_load():
+            raise AssertionError("request.user was evaluated")
+
+        with override_settings(
+            STAFF_RESTRICTED_PATHS=["/games/"], STAFF_EXEMPT_PATHS=["/games/rules/"]
+        ):
+            middleware = BlockAdminMiddleware(lambda request: "passed")
+        signed_in = {settings.SESSION_COOKIE_NAME: "key"}
+        for path, cookies in [
+            ("/games/", {}),
+            ("/static/css/site.css", signed_in),
+            ("/games/rules/", signed_in),
+            ("/profile/", signed_in),
+        ]:
+            request = RequestFactory().get(path)
+            request.COOKIES = cookies
+            request.user = SimpleLazyObject(unexpected_user_load)
+            self.assertEqual(middleware(request), "passed", path)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class CollectionDetailViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.librarian = User.objects.create_user(
+            email="librarian@example.com", is_staff=True
+        )
+        self.librarian.groups.add(Group.objects.create(name="Librarian"))
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="testpass"
+        )
+        self.other_user = User.objects.create_user(email="other@example.com")
+        self.game1 = BoardGame.objects.create(
+            title="Ticket to Ride", min_players=2, max_players=5
+        )
+        self.public_collection = Collection.objects.create(
+            title="Family Games", creator=self.patron, visibility="public"
+        )
+        self.private_collection = Collection.objects.create(
+            title="Strategy Favorites", creator=self.librarian, visibility="private"
+        )
+
+    def test_conditional_detail_page(self):
+        url = self.public_collection.get_absolute_url()
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertIn("Cookie", response["Vary"])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.public_collection.games.add(self.game1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Private pages only get an ETag for users who may see them
+        private_url = self.private_collection.get_absolute_url()
+        self.assertEqual(self.client.get(private_url).status_code, 403)
+        self.private_collection.authorized_users.add(self.other_user)
+        for user in (self.patron, self.librarian, self.admin, self.other_user):
+            self.assertEqual(
+                collection_detail_validators(self.private_collection.pk, user)
+                is not None,
+                self.private_collection.can_user_access(user),
+            )
+        self.client.force_login(self.other_user)
+        response = self.client.get(private_url)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        self.assertEqual(
+            self.client.get(
+                private_url, HTTP_IF_NONE_MATCH=response["ETag"]
+            ).status_code,
+            304,
+        )
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile(self):
+        samples = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+        self.assertEqual(benchmarks.percentile(samples, 50), 5.5)
+        self.assertEqual(benchmarks.percentile(samples, 100), 10)
+        self.assertIsNone(benchmarks.percentile([], 50))
+
+    def test_compare_reports(self):
+        baseline = {"scenarios": {"detail": {"p95_ms": 10.0, "queries": 5}}}
+        report = {"scenarios": {"detail": {"p95_ms": 15.0, "queries": 5}}}
+        self.assertEqual(benchmarks.compare_reports(report, baseline), [])
+
+        report["scenarios"]["detail"] = {"p95_ms": 25.0, "queries": 6}
+        regressions = benchmarks.compare_reports(report, baseline)
+        self.assertEqual(len(regressions), 2)
+
+    def test_middleware_overhead(self):
+        results = benchmarks.middleware_overhead(rounds=2, calls=5)
+        self.assertEqual(
+            set(results),
+            {"static", "anonymous", "patron", "staff_admin", "staff_redirect"},
+        )
+        self.assertIn("p95_us", results["anonymous"])
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_client_benchmark_covers_workflows(self):
+        counts = seed_library(users=5, games=5, copies=10, loans=20, seed=1)
+        self.assertEqual(counts["loans"], 20)
+
+        results = benchmarks.ClientBenchmark(iterations=1, warmup=0).run()
+        for scenario in ["catalogue_available", "detail", "borrow", "return"]:
+            self.assertIn(scenario, results)
+            self.assertGreater(results[scenario]["queries"], 0)
+
+
+class SeedLibraryTests(TestCase):
+    def _snapshot(self, prefix):
+        users = User.objects.filter(email__startswith=f"{prefix}-")
+        loans = GameLoan.objects.filter(user__in=users)
+        return {
+            "titles": list(
+                BoardGame.objects.filter(copies__loans__in=loans)
+                .order_by("copies__loans__borrowed_on")
+                .values_list("title", flat=True)
+            ),
+            "ratings": sorted(
+                Review.objects.filter(user__in=users).values_list("rating", flat=True)
+            ),
+        }
+
+    def test_seed_is_deterministic(self):
+        volumes = SCALES["tiny"]
+        seed_library(seed=7, prefix="first", **volumes)
+        seed_library(seed=7, prefix="second", **volumes)
+        self.assertEqual(self._snapshot("first"), self._snapshot("second"))
+
+    def test_seed_library_command(self):
+        out = StringIO()
+        call_command("seed_library", "--scale", "tiny", "--loans", "50", stdout=out)
+
+        self.assertEqual(GameLoan.objects.count(), 50)
+        self.assertEqual(BoardGame.objects.count(), SCALES["tiny"]["games"])
+        self.assertTrue(CollectionAccessRequest.objects.exists())
+        # Loans were bulk inserted, so availability must be applied in bulk too
+        active_copy_ids = GameLoan.objects.filter(returned=False).values("game_copy")
+        self.assertFalse(
+            GameCopy.objects.filter(pk__in=active_copy_ids, is_available=True).exists()
+        )
+
+
+class BulkProvisionTests(TestCase):
+    def setUp(self):
+        self.patron_group = Group.objects.create(name="Patron")
+        User.objects.create_user(email="existing@example.com", password="testpass")
+
+    def test_bulk_provision_creates_patrons(self):
+        rows = [
+            {"email": "a@example.com", "given_name": "Ann", "family_name": "Lee"},
+            {"email": "b@example.com", "password": "s3cret-pass"},
+            {"email": "existing@example.com"},
+            {"email": "A@example.com"},
+            {"email": "Existing@example.com"},
+            {"email": "e@example.com", "given_name": None},
+        ]
+        # Plus the savepoint around the whole provision
+        with self.assertNumQueries(6):
+            created = User.objects.bulk_provision(rows, batch_size=10)
+
+        self.assertEqual(
+            [user.email for user in created],
+            ["a@example.com", "b@example.com", "e@example.com"],
+        )
+        self.assertEqual(User.objects.get(email="e@example.com").given_name, "")
+        ann = User.objects.get(email="a@example.com")
+        self.assertEqual(ann.get_full_name(), "Ann Lee")
+        self.assertFalse(ann.has_usable_password())
+        self.assertTrue(ann.is_patron())
+        self.assertTrue(
+            User.objects.get(email="b@example.com").check_password("s3cret-pass")
+        )
+
+    def test_bulk_provision_is_all_or_nothing(self):
+        rows = [{"email": "f@example.com"}, {"email": ""}]
+        with self.assertRaises(ValueError):
+            User.objects.bulk_provision(rows, batch_size=1)
+        self.assertFalse(User.objects.filter(email="f@example.com").exists())
+
+    def test_provision_users_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as roster:
+            roster.write("email,given_name,family_name,password\n")
+            roster.write("c@example.com,Cam,Diaz,ignored-pass\n")
+            roster.write("d@example.com,Dee,Ng,\n")
+        self.addCleanup(os.remove, roster.name)
+
+        call_command("provision_users", roster.name, "--sso", stdout=StringIO())
+
+        self.assertEqual(self.patron_group.user_set.count(), 3)
+        self.assertFalse(User.objects.get(email="c@example.com").has_usable_password())
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProfileViewTests(TestCase):
+    def setUp(self):
+        Group.objects.create(name="Patron")
+        self.user = User.objects.create_user(
+            email="borrower@example.com", password="testpass"
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("profile", kwargs={"pk": self.user.pk})
+
+    def _add_loans(self, count, overdue=False):
+        for i in range(count):
+            game = BoardGame.objects.create(title=f"Game {i}")
+            copy = GameCopy.objects.create(game=game)
+            BorrowRequest.objects.create(user=self.user, game=game)
+            due_date = timezone.now() + timedelta(days=-1 if overdue else 14)
+            GameLoan.objects.create(user=self.user, game_copy=copy, due_date=due_date)
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_loans(self):
+        self._add_loans(2)
+        few = self._count_queries()
+        self._add_loans(12)
+        self.assertEqual(self._count_queries(), few)
+
+    def test_overdue_flag_matches_the_overdue_counter(self):
+        game = BoardGame.objects.create(title="Azul")
+        copy = GameCopy.objects.create(game=game)
+        GameLoan.objects.create(
+            user=self.user,
+            game_copy=copy,
+            due_date=timezone.now() - timedelta(minutes=5),
+        )
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context["loan_summary"]["overdue"], 1)
+        self.assertContains(response, '<span class="text-danger">Overdue</span>')
+
+    def test_history_is_paginated_with_summary(self):
+        self._add_loans(LOAN_HISTORY_PAGE_SIZE + 5, overdue=True)
+        response = self.client.get(self.url, {"page": 2})
+
+        self.assertEqual(len(response.context["previous_loans"]), 5)
+        summary = response.context["loan_summary"]
+        self.assertEqual(summary["total_borrowed"], LOAN_HISTORY_PAGE_SIZE + 5)
+        self.assertEqual(summary["overdue"], LOAN_HISTORY_PAGE_SIZE + 5)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class BoardGameDetailViewTests(TestCase):
+    def setUp(self):
+        Group.objects.create(name="Patron")
+        self.user = User.objects.create_user(email="viewer@example.com", password="pw")
+        self.game = BoardGame.objects.create(title="Azul", min_players=2, max_players=4)
+        self.game.categories.add(Category.objects.get_or_create(name="Family")[0])
+        self.client.force_login(self.user)
+        self.url = reverse("board_game_detail", kwargs={"pk": self.game.pk})
+
+    def _add_reviews_and_copies(self, count):
+        for i in range(count):
+            reviewer = User.objects.create_user(
+                email=f"r{Review.objects.count()}@x.com"
+            )
+            Review.objects.create(user=reviewer, game=self.game, rating=i % 5 + 1)
+            GameCopy.objects.create(game=self.game, pickup_location="clark")
+
+    def test_constant_number_of_queries(self):
+        self._add_reviews_and_copies(2)
+        # session, user, the ETag's validators, game, categories, locations, own
+        # review, recent reviews, recommendations and the two role checks in
+        # create_context
+        with self.assertNumQueries(11):
+            self.client.get(self.url)
+
+        self._add_reviews_and_copies(8)
+        with self.assertNumQueries(11):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["review_count"], 10)
+
+    def test_detail_context(self):
+        GameCopy.objects.create(game=self.game, pickup_location="shannon")
+        GameCopy.objects.create(
+            game=self.game, pickup_location="clark", is_available=False
+        )
+        Review.objects.create(user=self.user, game=self.game, rating=4)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context["available_copies_count"], 1)
+        self.assertEqual(response.context["average_rating"], 4.0)
+        self.assertEqual(response.context["existing_review"].rating, 4)
+        self.assertFalse(response.context["has_borrowed"])
+        locations = {
+            row["pickup_location"]: (row["available"], row["total"])
+            for row in response.context["pickup_locations"]
+        }
+        self.assertEqual(locations, {"clark": (0, 1), "shannon": (1, 1)})
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        self.assertIn("Cookie", response["Vary"])
+
+        # session, user and the validators
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Review.objects.create(user=self.user, game=self.game, rating=5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        GameCopy.objects.create(game=self.game)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+        other = User.objects.create_user(email="other@example.com")
+        self.client.force_login(other)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ReviewFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@example.com", password="pw")
+        self.game = BoardGame.objects.create(title="Catan")
+        for i in range(25):
+            reviewer = User.objects.create_user(email=f"reviewer{i}@example.com")
+            Review.objects.create(user=reviewer, game=self.game, rating=i % 5 + 1)
+        # Give several reviews the same timestamp so the pk tie-breaker matters
+        same_time = timezone.now()
+        Review.objects.filter(pk__in=Review.objects.values("pk")[:10]).update(
+            created_at=same_time
+        )
+        self.client.force_login(self.user)
+        self.api_url = reverse("game_reviews_api", kwargs={"pk": self.game.pk})
+
+    def test_keyset_pages_cover_every_review_once(self):
+        seen = []
+        reviews, cursor = review_page(self.game, limit=7)
+        seen.extend(review.pk for review in reviews)
+        while cursor:
+            reviews, cursor = review_page(self.game, cursor, limit=7)
+            seen.extend(review.pk for review in reviews)
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), set(Review.objects.values_list("pk", flat=True)))
+
+    def test_rating_histogram(self):
+        with self.assertNumQueries(1):
+            histogram = rating_histogram(self.game)
+        self.assertEqual(histogram, {1: 5, 2: 5, 3: 5, 4: 5, 5: 5})
+
+    def test_review_feed_api(self):
+        first = self.client.get(self.api_url).json()
+        self.assertEqual(len(first["results"]), 20)
+        self.assertEqual(sum(first["histogram"].values()), 25)
+
+        second = self.client.get(self.api_url, {"cursor": first["next_cursor"]}).json()
+        self.assertEqual(len(second["results"]), 5)
+        self.assertIsNone(second["next_cursor"])
+        self.assertNotIn("histogram", second)
+
+        response = self.client.get(self.api_url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        for values in (
+            ["2025-01-01T00:00:00+00:00", 2**70],
+            ["2025-01-01T00:00:00+00:00", "1"],
+            [12, 1],
+            [None, 1],
+        ):
+            response = self.client.get(self.api_url, {"cursor": encode_cursor(*values)})
+            self.assertEqual(response.status_code, 400, values)
+
+    def test_review_page_renders(self):
+        response = self.client.get(reverse("game_reviews", kwargs={"pk": self.game.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["review_count"], 25)
+        self.assertIsNotNone(response.context["next_cursor"])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ApiTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com")
+        librarians, _ = Group.objects.get_or_create(name="Librarian")
+        self.owner.groups.add(librarians)
+        strategy, _ = Category.objects.get_or_create(name="Strategy")
+        self.games = []
+        for i in range(5):
+            game = BoardGame.objects.create(
+                title=f"Game {i}", min_players=2, max_players=4, complexity=i % 3 + 1
+            )
+            game.categories.add(strategy)
+            GameCopy.objects.create(game=game, pickup_location="clark")
+            self.games.append(game)
+        self.hidden = BoardGame.objects.create(title="Hidden Game")
+        private = Collection.objects.create(
+            title="Secret", creator=self.owner, visibility="private"
+        )
+        private.games.add(self.hidden)
+        self.collection = Collection.objects.create(
+            title="Favourites", creator=self.owner
+        )
+        self.collection.games.add(*self.games[:2])
+        self.private = private
+
+    def test_game_list_excludes_private_games(self):
+        data = self.client.get(reverse("api_game_list")).json()
+        titles = [game["title"] for game in data["results"]]
+        self.assertEqual(titles, [f"Game {i}" for i in range(5)])
+        self.assertEqual(data["results"][0]["available_copies"], 1)
+        self.assertEqual(data["results"][0]["categories"], ["Strategy"])
+
+    def test_game_list_filters_and_fields(self):
+        data = self.client.get(
+            reverse("api_game_list"), {"complexity": "1", "fields": "id,title"}
+        ).json()
+        self.assertEqual(
+            data["results"],
+            [
+                {"id": self.games[0].pk, "title": "Game 0"},
+                {"id": self.games[3].pk, "title": "Game 3"},
+            ],
+        )
+        response = self.client.get(reverse("api_game_list"), {"fields": "password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_game_list_pagination(self):
+        seen = []
+        params = {"limit": 2, "fields": "id"}
+        while True:
+            data = self.client.get(reverse("api_game_list"), params).json()
+            seen.extend(game["id"] for game in data["results"])
+            if not data["next_cursor"]:
+                break
+            params["cursor"] = data["next_cursor"]
+        self.assertEqual(seen, [game.pk for game in self.games])
+        response = self.client.get(reverse("api_game_list"), {"limit": "500"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get_costs_one_query(self):
+        url = reverse("api_game_list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Changing availability invalidates the tag
+        self.games[0].copies.update(is_available=False)
+        ResourceVersion.bump(ResourceVersion.AVAILABILITY)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_saving_a_game_bumps_its_version(self):
+        before = ResourceVersion.current(ResourceVersion.GAMES)
+        self.games[0].title = "Renamed"
+        self.games[0].save()
+        after = ResourceVersion.current(ResourceVersion.GAMES)
+        self.assertEqual(
+            after[ResourceVersion.GAMES], before[ResourceVersion.GAMES] + 1
+        )
+
+    def test_game_availability(self):
+        data = self.client.get(
+            reverse("api_game_availability", args=[self.games[0].pk])
+        ).json()
+        self.assertEqual(data["available"], 1)
+        clark = next(row for row in data["locations"] if row["location"] == "clark")
+        self.assertEqual((clark["available"], clark["total"]), (1, 1))
+
+        # Games in private collections are hidden, and errors carry no ETag
+        response = self.client.get(
+            reverse("api_game_availability", args=[self.hidden.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+        url = reverse("api_game_availability", args=[self.games[0].pk])
+        etag = self.client.get(url)["ETag"]
+        self.private.games.add(self.games[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+    def test_collections_hide_private(self):
+        data = self.client.get(reverse("api_collection_list")).json()
+        self.assertEqual([c["title"] for c in data["results"]], ["Favourites"])
+        detail = self.client.get(
+            reverse("api_collection_detail", args=[self.collection.pk])
+        ).json()
+        self.assertEqual(len(detail["games"]), 2)
+        response = self.client.get(
+            reverse("api_collection_detail", args=[self.private.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("api_game_detail", args=[self.hidden.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class LocationInventoryTests(TestCase):
+    def setUp(self):
+        # Versions restart with each test's rollback, the cache does not
+        cache.clear()
+        self.librarian = User.objects.create_user(email="desk@example.com")
+        librarians, _ = Group.objects.get_or_create(name="Librarian")
+        self.librarian.groups.add(librarians)
+        self.catan = BoardGame.objects.create(title="Catan")
+        self.azul = BoardGame.objects.create(title="Azul")
+        GameCopy.objects.create(game=self.catan, pickup_location="clark")
+        GameCopy.objects.create(
+            game=self.catan, pickup_location="clark", is_available=False
+        )
+        GameCopy.objects.create(game=self.azul, pickup_location="clark")
+        GameCopy.objects.create(game=self.azul, pickup_location="shannon")
+
+    def test_location_inventory_is_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            rows = list(location_inventory("clark"))
+        self.assertEqual(
+            [(row["title"], row["available"], row["total"]) for row in rows],
+            [("Azul", 1, 1), ("Catan", 1, 2)],
+        )
+        self.assertEqual(len(location_inventory("shannon", available_only=True)), 1)
+
+    def test_snapshot_is_cached_until_a_copy_changes(self):
+        snapshot = availability_snapshot()
+        self.assertEqual(snapshot["clark"][self.catan.pk], (1, 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(availability_snapshot(), snapshot)
+
+        copy = self.catan.copies.filter(is_available=True).first()
+        copy.is_available = False
+        copy.save()
+        self.assertEqual(availability_snapshot()["clark"][self.catan.pk], (0, 2))
+
+        summary = {row["location"]: row for row in location_summary()}
+        self.assertEqual(summary["clark"]["available"], 1)
+        self.assertEqual(summary["shannon"]["total"], 1)
+
+    def test_inventory_page_requires_librarian(self):
+        url = reverse("location_inventory", args=["clark"])
+        self.client.force_login(User.objects.create_user(email="patron@example.com"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.librarian)
+        response = self.client.get(url, {"available": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["inventory"]), 2)
+        self.assertContains(response, "Clark Library")
+        response = self.client.get(reverse("location_inventory", args=["nowhere"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_location_api(self):
+        data = self.client.get(
+            reverse("api_location_inventory", args=["clark"]), {"available": "1"}
+        ).json()
+        self.assertEqual((data["available"], data["total"]), (2, 3))
+        self.assertEqual(
+            {game["id"] for game in data["games"]}, {self.catan.pk, self.azul.pk}
+        )
+        data = self.client.get(reverse("api_location_list")).json()
+        self.assertEqual(
+            [row["location"] for row in data["results"]],
+            ["shannon", "clark", "clemons"],
+        )
+
+    def test_location_api_hides_private_collection_games(self):
+        private = Collection.objects.create(
+            title="Staff shelf", creator=self.librarian, visibility="private"
+        )
+        private.games.add(self.azul)
+        data = self.client.get(reverse("api_location_inventory", args=["clark"])).json()
+        self.assertEqual([game["id"] for game in data["games"]], [self.catan.pk])
+        self.assertEqual((data["available"], data["total"]), (1, 2))
+        data = self.client.get(reverse("api_location_list")).json()
+        summary = {row["location"]: row for row in data["results"]}
+        self.assertEqual(summary["shannon"]["total"], 0)
+
+
+class RebalancingTests(TestCase):
+    def setUp(self):
+        self.patron = User.objects.create_user(email="player@example.com")
+        self.game = BoardGame.objects.create(title="Catan")
+        self.copies = [
+            GameCopy.objects.create(game=self.game, pickup_location="shannon")
+            for _ in range(4)
+        ]
+        # All recent demand is at Clark, via a copy that has since moved back
+        clark_copy = GameCopy.objects.create(game=self.game, pickup_location="clark")
+        for _ in range(3):
+            GameLoan.objects.create(
+                user=self.patron, game_copy=clark_copy, returned=True
+            )
+
+    def test_allocate_sums_to_total(self):
+        self.assertEqual(
+            rebalancing.allocate(5, {"shannon": 1, "clark": 1, "clemons": 1}),
+            {"shannon": 2, "clark": 2, "clemons": 1},
+        )
+        self.assertEqual(rebalancing.allocate(3, {"shannon": 0}), {})
+
+    def test_plan_only_moves_shelved_copies(self):
+        demand = {1: {"clark": 1.0}}
+        copies = [(10, 1, "shannon", True), (11, 1, "shannon", False)]
+        self.assertEqual(
+            rebalancing.plan_moves(demand, copies),
+            [{"copy": 10, "game": 1, "from": "shannon", "to": "clark"}],
+        )
+
+    def test_pending_requests_follow_history(self):
+        BorrowRequest.objects.create(user=self.patron, game=self.game)
+        demand = rebalancing.location_demand()
+        self.assertEqual(
+            demand[self.game.pk], {"clark": 4.0, "shannon": 0.0, "clemons": 0.0}
+        )
+
+    def test_build_and_apply_plan(self):
+        moves = rebalancing.build_plan()
+        self.assertEqual(len(moves), 4)
+        self.assertTrue(all(move["to"] == "clark" for move in moves))
+
+        # A copy borrowed after planning is left where it is
+        GameCopy.objects.filter(pk=moves[0]["copy"]).update(is_available=False)
+        # savepoint, locking read, one bulk UPDATE, version bump, release
+        with self.assertNumQueries(5):
+            self.assertEqual(rebalancing.apply_plan(moves), 3)
+        self.assertEqual(
+            GameCopy.objects.filter(game=self.game, pickup_location="clark").count(), 4
+        )
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_edit_form_gathers_copies_only_when_asked(self):
+        librarian = User.objects.create_user(email="desk@example.com")
+        librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        self.client.force_login(librarian)
+        url = reverse("edit_board_game", args=[self.game.pk])
+        data = {
+            "title": "Catan",
+            "min_players": 3,
+            "max_players": 4,
+            "categories": [Category.objects.first().pk],
+            "num_copies": 5,
+            # Already the initial value: the most common location
+            "default_pickup_location": "shannon",
+        }
+
+        self.assertRedirects(self.client.post(url, data), reverse("manage_board_games"))
+        self.assertEqual(GameCopy.objects.filter(pickup_location="clark").count(), 1)
+
+        response = self.client.post(url, data | {"move_copies": "on"}, follow=True)
+        self.assertFalse(GameCopy.objects.filter(pickup_location="clark").exists())
+        self.assertContains(response, "Moved 1 copy to Shannon Library.")
+
+    def test_command_is_a_dry_run_by_default(self):
+        out = StringIO()
+        call_command("rebalance_copies", stdout=out)
+        self.assertIn("4 moves planned", out.getvalue())
+        self.assertEqual(GameCopy.objects.filter(pickup_location="clark").count(), 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plan.json")
+            call_command("rebalance_copies", output=path, stdout=StringIO())
+            call_command("rebalance_copies", plan=path, stdout=out)
+        self.assertIn("Moved 4 copies", out.getvalue())
+        self.assertEqual(GameCopy.objects.filter(pickup_location="clark").count(), 5)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class LoanAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patron = User.objects.create_user(email="borrower@example.com")
+        self.librarian = User.objects.create_user(email="stats@example.com")
+        librarians, _ = Group.objects.get_or_create(name="Librarian")
+        self.librarian.groups.add(librarians)
+        self.game = BoardGame.objects.create(title="Catan")
+        self.copy = GameCopy.objects.create(game=self.game, pickup_location="clark")
+
+    def _stats(self):
+        return DailyLoanStats.objects.values(
+            "date", "game", "pickup_location", "borrows", "returns", "overdue_returns"
+        ).order_by("date")
+
+    def test_borrow_and_return_update_rollups(self):
+        loan = GameLoan.objects.create(user=self.patron, game_copy=self.copy)
+        stats = DailyLoanStats.objects.get()
+        self.assertEqual((stats.borrows, stats.returns), (1, 0))
+
+        # Editing a loan without returning it changes nothing
+        loan.save()
+        loan = GameLoan.objects.get(pk=loan.pk)
+        loan.borrowed_on = timezone.now() - timedelta(days=20)
+        loan.due_date = timezone.now() - timedelta(days=6)
+        loan.mark_as_returned()
+        loan.save()
+
+        stats.refresh_from_db()
+        self.assertEqual((stats.borrows, stats.returns), (1, 1))
+        self.assertEqual(stats.overdue_returns, 1)
+        self.assertAlmostEqual(stats.loan_seconds / 86400, 20, places=0)
+
+    def test_backfill_matches_incremental_rollups(self):
+        for days_ago in (3, 10):
+            loan = GameLoan.objects.create(user=self.patron, game_copy=self.copy)
+            GameLoan.objects.filter(pk=loan.pk).update(
+                borrowed_on=timezone.now() - timedelta(days=days_ago)
+            )
+        DailyLoanStats.objects.all().delete()
+        call_command("backfill_loan_stats", stdout=StringIO())
+        self.assertEqual(sum(row["borrows"] for row in self._stats()), 2)
+
+        expected = list(self._stats())
+        call_command(
+            "backfill_loan_stats",
+            since=str(timezone.localdate() - timedelta(days=5)),
+            stdout=StringIO(),
+        )
+        self.assertEqual(list(self._stats()), expected)
+
+    def test_loans_stay_under_the_location_they_were_borrowed_from(self):
+        GameLoan.objects.create(user=self.patron, game_copy=self.copy)
+        self.copy.pickup_location = "shannon"
+        self.copy.save()
+        call_command("backfill_loan_stats", stdout=StringIO())
+        self.assertEqual([row["pickup_location"] for row in self._stats()], ["clark"])
+
+    def test_dashboard_reads_only_rollups(self):
+        GameLoan.objects.create(user=self.patron, game_copy=self.copy)
+        self.client.force_login(self.librarian)
+        url = reverse("loan_dashboard")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"weeks": "4"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            any("users_gameloan" in query["sql"] for query in queries.captured_queries)
+        )
+        self.assertEqual(response.context["summary"]["borrows"], 1)
+        self.assertEqual(response.context["top_games"][0]["title"], "Catan")
+        clark = next(
+            row for row in response.context["locations"] if row["location"] == "clark"
+        )
+        self.assertEqual((clark["copies"], clark["borrows"]), (1, 1))
+
+        self.client.force_login(self.patron)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.games = {
+            title: BoardGame.objects.create(title=title)
+            for title in ("Catan", "Carcassonne", "Azul", "Chess")
+        }
+        self.copies = {
+            title: GameCopy.objects.create(game=game)
+            for title, game in self.games.items()
+        }
+        # Catan and Carcassonne are borrowed together by everyone, Azul by one
+        # of them, Chess by nobody who borrowed the others
+        for i in range(3):
+            self.borrow(f"patron{i}@example.com", "Catan", "Carcassonne")
+        self.borrow("patron0@example.com", "Azul")
+        self.borrow("loner@example.com", "Chess")
+
+    def borrow(self, email, *titles):
+        user, _ = User.objects.get_or_create(email=email)
+        for title in titles:
+            GameLoan.objects.create(
+                user=user, game_copy=self.copies[title], returned=True
+            )
+
+    def neighbours(self, title):
+        return list(
+            GameRecommendation.objects.filter(game=self.games[title])
+            .order_by("rank")
+            .values_list("recommended__title", flat=True)
+        )
+
+    def test_top_neighbours_matches_dense_cosine(self):
+        game_ids = recommendations.candidate_games()
+        matrix = recommendations.build_matrix(game_ids, use_reviews=False)
+        dense = matrix.toarray()
+        norms = (dense**2).sum(axis=0) ** 0.5
+        result = recommendations.top_neighbours(matrix, k=2)
+        catan = list(game_ids).index(self.games["Catan"].pk)
+        expected = sorted(
+            (
+                (dense[:, catan] @ dense[:, other]) / (norms[catan] * norms[other]),
+                other,
+            )
+            for other in range(len(game_ids))
+            if other != catan and dense[:, other] @ dense[:, catan] > 0
+        )[::-1]
+        self.assertEqual(
+            [column for column, _ in result[catan]], [expected[0][1], expected[1][1]]
+        )
+        self.assertAlmostEqual(result[catan][0][1], expected[0][0])
+
+    def test_rebuild_stores_top_k(self):
+        recommendations.rebuild(k=2)
+        self.assertEqual(self.neighbours("Catan"), ["Carcassonne", "Azul"])
+        self.assertEqual(self.neighbours("Chess"), [])
+
+    def test_reviews_weight_neighbours(self):
+        user = User.objects.get(email="patron0@example.com")
+        Review.objects.create(user=user, game=self.games["Azul"], rating=5)
+        Review.objects.create(user=user, game=self.games["Carcassonne"], rating=1)
+        with_reviews = recommendations.build_matrix(
+            recommendations.candidate_games(), use_reviews=True
+        )
+        self.assertAlmostEqual(with_reviews.max(), 5 / 3)
+
+    def test_incremental_update_refreshes_affected_games(self):
+        recommendations.rebuild(k=3)
+        GameRecommendation.objects.update(
+            computed_at=timezone.now() - timedelta(days=1)
+        )
+        self.borrow("loner@example.com", "Azul")
+
+        out = StringIO()
+        call_command("build_recommendations", incremental=True, k=3, stdout=out)
+        self.assertIn("Chess", self.neighbours("Azul"))
+        self.assertIn("Azul", self.neighbours("Chess"))
+        # Catan shares patron0 with Azul, so its list was refreshed as well
+        self.assertEqual(
+            GameRecommendation.objects.filter(
+                game=self.games["Catan"],
+                computed_at__gte=timezone.now() - timedelta(hours=1),
+            ).count(),
+            2,
+        )
+
+    def test_update_sees_loans_that_commit_late(self):
+        recommendations.rebuild(k=3)
+        self.borrow("loner@example.com", "Azul")
+        # The loan is stamped just before the last update but committed after it
+        GameLoan.objects.filter(user__email="loner@example.com").update(
+            borrowed_on=GameRecommendation.objects.latest("computed_at").computed_at
+            - timedelta(minutes=1)
+        )
+        recommendations.update(k=3)
+        self.assertIn("Chess", self.neighbours("Azul"))
+
+    def test_update_drops_games_moved_into_private_collections(self):
+        recommendations.rebuild(k=3)
+        Collection.objects.create(
+            title="Vault",
+            creator=User.objects.get(email="loner@example.com"),
+            visibility="private",
+        ).games.add(self.games["Azul"])
+
+        recommendations.update(k=3)
+        self.assertEqual(self.neighbours("Azul"), [])
+        self.assertEqual(self.neighbours("Catan"), ["Carcassonne"])
+
+    def test_detail_page_shows_recommendations(self):
+        recommendations.rebuild()
+        self.client.force_login(User.objects.get(email="loner@example.com"))
+        response = self.client.get(
+            reverse("board_game_detail", args=[self.games["Catan"].pk])
+        )
+        self.assertEqual(
+            [game.title for game in response.context["recommendations"]],
+            ["Carcassonne", "Azul"],
+        )
+
+
+@override_settings(INDEX_VERSION_CHECK_INTERVAL=0)
+class SimilarGamesTests(TestCase):
+    def setUp(self):
+        # Versions restart with each test's rollback, the process-wide index does not
+        similar_games_index.reset()
+        strategy, _ = Category.objects.get_or_create(name="Strategy")
+        party, _ = Category.objects.get_or_create(name="Party")
+        self.strategy, self.party = strategy, party
+        self.catan = self.game("Catan", strategy, 3, 4, 90, 3)
+        self.twilight = self.game("Twilight Struggle", strategy, 2, 2, 180, 4)
+        self.puerto = self.game("Puerto Rico", strategy, 3, 5, 100, 3)
+        self.codenames = self.game("Codenames", party, 4, 8, 15, 1)
+
+    def game(self, title, category, min_players, max_players, minutes, complexity):
+        game = BoardGame.objects.create(
+            title=title,
+            min_players=min_players,
+            max_players=max_players,
+            playing_time=minutes,
+            complexity=complexity,
+        )
+        game.categories.add(category)
+        return game
+
+    def titles(self, game):
+        return [title for _, title, _ in similar_games(game.pk)]
+
+    def test_ranks_by_categories_and_attributes(self):
+        self.assertEqual(
+            self.titles(self.catan), ["Puerto Rico", "Twilight Struggle", "Codenames"]
+        )
+        results = similar_games_index.load().similar_many(
+            [self.catan.pk, self.codenames.pk, 0], k=1
+        )
+        self.assertEqual(set(results), {self.catan.pk, self.codenames.pk})
+        self.assertEqual(results[self.catan.pk][0][0], self.puerto.pk)
+
+    def test_lookups_between_version_checks_skip_the_database(self):
+        similar_games_index.load()
+        with override_settings(INDEX_VERSION_CHECK_INTERVAL=60):
+            with self.assertNumQueries(0):
+                similar_games(self.catan.pk)
+
+    def test_refreshes_incrementally_on_save_and_recategorization(self):
+        similar_games_index.load()
+        built = similar_games_index.built_at
+
+        self.codenames.categories.set([self.strategy])
+        self.codenames.min_players, self.codenames.max_players = 3, 4
+        self.codenames.playing_time, self.codenames.complexity = 90, 3
+        self.codenames.save()
+        new_game = self.game("Catan Junior", self.strategy, 3, 4, 90, 3)
+
+        self.assertIn("Catan Junior", self.titles(self.catan)[:2])
+        self.assertIn("Codenames", self.titles(self.catan)[:3])
+        refreshed = self.titles(self.catan)
+        # Refreshed in place rather than rebuilt
+        self.assertGreater(similar_games_index.built_at, built)
+        self.assertIn(new_game.pk, similar_games_index.snapshot.rows)
+        # Attribute statistics stay frozen until the next rebuild, so only the
+        # ranking is expected to match a fresh index
+        similar_games_index.reset()
+        self.assertEqual(self.titles(self.catan), refreshed)
+
+        self.twilight.delete()
+        self.assertNotIn("Twilight Struggle", self.titles(self.catan))
+
+    def test_refresh_sees_saves_that_commit_late(self):
+        similar_games_index.load()
+        built = similar_games_index.built_at
+        # Saved (updated_at stamped) before the index was built, committed after
+        BoardGame.objects.filter(pk=self.twilight.pk).update(
+            min_players=3,
+            max_players=4,
+            playing_time=90,
+            complexity=3,
+            updated_at=built - timedelta(seconds=30),
+        )
+        ResourceVersion.bump(ResourceVersion.GAMES)
+
+        self.assertEqual(self.titles(self.catan)[0], "Twilight Struggle")
+        self.assertGreater(similar_games_index.built_at, built)
+
+    def test_private_games_are_hidden(self):
+        librarian = User.objects.create_user(email="curator@example.com")
+        librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        private = Collection.objects.create(
+            title="Vault", creator=librarian, visibility="private"
+        )
+        private.games.add(self.puerto)
+        self.assertNotIn("Puerto Rico", self.titles(self.catan))
+
+        response = self.client.get(reverse("api_game_similar", args=[self.puerto.pk]))
+        self.assertEqual(response.status_code, 404)
+        data = self.client.get(
+            reverse("api_game_similar", args=[self.catan.pk]), {"k": "1"}
+        ).json()
+        self.assertEqual(
+            [game["title"] for game in data["results"]], ["Twilight Struggle"]
+        )
+
+    def test_etag_follows_the_loaded_index(self):
+        url = reverse("api_game_similar", args=[self.catan.pk])
+        self.client.get(url)
+        with self.settings(INDEX_VERSION_CHECK_INTERVAL=3600):
+            self.puerto.title = "Puerto Rico Deluxe"
+            self.puerto.save()
+            # Still answered from the index loaded before the save
+            stale = self.client.get(url)
+            self.assertIn("Puerto Rico", [g["title"] for g in stale.json()["results"]])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "Puerto Rico Deluxe", [g["title"] for g in response.json()["results"]]
+        )
+
+
+@override_settings(INDEX_VERSION_CHECK_INTERVAL=0)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete_index.reset()
+        self.strategy, _ = Category.objects.get_or_create(name="Strategy")
+        self.ticket = BoardGame.objects.create(
+            title="Ticket to Ride", min_players=2, max_players=5
+        )
+        self.tikal = BoardGame.objects.create(
+            title="Tikal", min_players=2, max_players=4
+        )
+        self.pandemic = BoardGame.objects.create(
+            title="Pandémie: Strategy Edition", min_players=2, max_players=4
+        )
+        self.url = reverse("api_game_autocomplete")
+
+    def labels(self, query, limit=8):
+        return [label for _, _, label in complete(query, limit)]
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Pandémie:\tSTRATEGY "), "pandemie: strategy")
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.labels("ti"), ["Ticket to Ride", "Tikal"])
+        self.assertEqual(self.labels("ti", limit=1), ["Ticket to Ride"])
+        # Whole-label matches come before later-word matches
+        self.assertEqual(
+            self.labels("strat"), ["Strategy", "Pandémie: Strategy Edition"]
+        )
+        self.assertEqual(self.labels("RIDE"), ["Ticket to Ride"])
+        self.assertEqual(self.labels("pandemie"), ["Pandémie: Strategy Edition"])
+        self.assertEqual(self.labels("ride x"), [])
+        self.assertEqual(self.labels("   "), [])
+
+    def test_lookups_between_version_checks_skip_the_database(self):
+        autocomplete_index.load()
+        with override_settings(INDEX_VERSION_CHECK_INTERVAL=60):
+            with self.assertNumQueries(0):
+                self.client.get(self.url, {"q": "ti"})
+
+    def test_refreshes_when_titles_or_visibility_change(self):
+        self.assertEqual(self.labels("tik"), ["Tikal"])
+        self.tikal.title = "Azul"
+        self.tikal.save()
+        self.assertEqual(self.labels("tik"), [])
+        self.assertEqual(self.labels("az"), ["Azul"])
+
+        librarian = User.objects.create_user(email="curator@example.com")
+        librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        Collection.objects.create(
+            title="Vault", creator=librarian, visibility="private"
+        ).games.add(self.ticket)
+        self.assertEqual(self.labels("ti"), [])
+
+    def test_endpoint(self):
+        response = self.client.get(self.url, {"q": "strat", "limit": "2"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {
+                    "type": "category",
+                    "id": self.strategy.pk,
+                    "label": "Strategy",
+                    "url": reverse("board_game_catalogue") + "?category=Strategy",
+                },
+                {
+                    "type": "game",
+                    "id": self.pandemic.pk,
+                    "label": "Pandémie: Strategy Edition",
+                    "url": reverse("board_game_detail", args=[self.pandemic.pk]),
+                },
+            ],
+        )
+        self.assertEqual(self.client.get(self.url, {"limit": "0"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).json(), {"results": []})
+
+
+class FacetCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.strategy, _ = Category.objects.get_or_create(name="Strategy")
+        self.party, _ = Category.objects.get_or_create(name="Party")
+        self.catan = self.game("Catan", 3, 3, 4, [self.strategy])
+        self.azul = self.game("Azul", 2, 2, 4, [self.strategy])
+        self.codenames = self.game("Codenames", 1, 4, 8, [self.party])
+        self.copy = GameCopy.objects.create(game=self.catan, condition="good")
+        GameCopy.objects.create(game=self.codenames, condition="good")
+        self.games = BoardGame.objects.exclude(collections__visibility="private")
+
+    def game(self, title, complexity, min_players, max_players, categories):
+        game = BoardGame.objects.create(
+            title=title,
+            complexity=complexity,
+            min_players=min_players,
+            max_players=max_players,
+        )
+        game.categories.set(categories)
+        return game
+
+    def counts(self, facet, key="value", **params):
+        facets = facet_counts(self.games, params)
+        return {option[key]: option["count"] for option in facets[facet]}
+
+    def test_counts_without_filters(self):
+        facets = facet_counts(self.games, {})
+        categories = {c["name"]: c["count"] for c in facets["categories"]}
+        self.assertEqual(categories["Strategy"], 2)
+        self.assertEqual(categories["Party"], 1)
+        self.assertEqual(self.counts("complexity"), {1: 1, 2: 1, 3: 1, 4: 0, 5: 0})
+        self.assertEqual(
+            self.counts("players"), {1: 0, 2: 1, 3: 2, 4: 3, 5: 1, 6: 1, 7: 1, 8: 1}
+        )
+        self.assertEqual(facets["availability"], {"all": 3, "available": 2})
+
+    def test_other_filters_apply_but_not_the_facets_own(self):
+        # Picking a category narrows the other facets but not the category list
+        self.assertEqual(
+            self.counts("complexity", category="Strategy"),
+            {1: 0, 2: 1, 3: 1, 4: 0, 5: 0},
+        )
+        categories = self.counts("categories", key="name", category="Strategy")
+        self.assertEqual((categories["Strategy"], categories["Party"]), (2, 1))
+
+        facets = facet_counts(self.games, {"players": "5", "search": "o"})
+        self.assertEqual(facets["availability"], {"all": 1, "available": 1})
+        self.assertEqual(
+            {c["name"]: c["count"] for c in facets["categories"]}["Strategy"], 0
+        )
+
+    def test_cached_until_data_changes(self):
+        with self.assertNumQueries(5):
+            facet_counts(self.games, {"category": "Strategy"})
+        with self.assertNumQueries(1):
+            facets = facet_counts(self.games, {"category": "Strategy"})
+        self.assertEqual(facets["availability"]["available"], 1)
+
+        self.copy.is_available = False
+        self.copy.save()
+        facets = facet_counts(self.games, {"category": "Strategy"})
+        self.assertEqual(facets["availability"]["available"], 0)
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_catalogue_shows_counts(self):
+        response = self.client.get(reverse("board_game_catalogue"))
+        self.assertContains(response, "Strategy (2)")
+        self.assertContains(response, "Available Now (2)")
+
+
+class AvailabilityAlertTests(TestCase):
+    def setUp(self):
+        self.strategy, _ = Category.objects.get_or_create(name="Strategy")
+        self.party, _ = Category.objects.get_or_create(name="Party")
+        self.game = BoardGame.objects.create(
+            title="Catan", complexity=3, min_players=3, max_players=4
+        )
+        self.game.categories.add(self.strategy)
+        self.copy = GameCopy.objects.create(game=self.game, condition="good")
+        self.waiting = User.objects.create_user(email="waiting@example.com")
+        self.searcher = User.objects.create_user(email="searcher@example.com")
+        self.other = User.objects.create_user(email="other@example.com")
+        self.borrower = User.objects.create_user(email="borrower@example.com")
+        self.loan = GameLoan.objects.create(
+            user=self.borrower,
+            game_copy=self.copy,
+            due_date=timezone.now() + timedelta(days=14),
+        )
+
+        AvailabilityAlert.objects.create(user=self.waiting, game=self.game)
+        SavedSearch.objects.create(
+            user=self.searcher, name="Strategy for four", category="Strategy", players=4
+        )
+        SavedSearch.objects.create(user=self.other, name="Party", category="Party")
+        SavedSearch.objects.create(
+            user=self.other, name="Quiet", search="catan", notify=False
+        )
+        # Drop the jobs queued by the fixtures (the new copy, the loan receipt)
+        Job.objects.all().delete()
+
+    def notified(self):
+        return sorted(
+            Notification.objects.filter(
+                game=self.game, subject__endswith="is available to borrow"
+            ).values_list("user__email", flat=True)
+        )
+
+    def test_return_notifies_matching_subscribers_once(self):
+        self.loan.mark_as_returned()
+        self.assertTrue(Job.objects.filter(task="notify_available").exists())
+        jobs.drain()
+        self.assertEqual(
+            self.notified(), ["searcher@example.com", "waiting@example.com"]
+        )
+        self.assertIn(
+            "Strategy for four",
+            Notification.objects.get(user=self.searcher, game=self.game).body,
+        )
+        # Direct alerts are one-off, saved searches keep watching
+        self.assertFalse(AvailabilityAlert.objects.exists())
+        self.assertEqual(SavedSearch.objects.count(), 3)
+
+    def test_borrowers_keep_their_alerts(self):
+        # The borrower also wants a copy for later, and still has one on loan
+        AvailabilityAlert.objects.create(user=self.borrower, game=self.game)
+        GameLoan.objects.create(
+            user=self.borrower,
+            game_copy=GameCopy.objects.create(game=self.game, is_available=False),
+            due_date=timezone.now() + timedelta(days=14),
+        )
+        self.loan.mark_as_returned()
+        jobs.drain()
+
+        self.assertNotIn("borrower@example.com", self.notified())
+        self.assertEqual(
+            list(AvailabilityAlert.objects.values_list("user__email", flat=True)),
+            ["borrower@example.com"],
+        )
+
+    def test_only_availability_flips_trigger_the_batch(self):
+        self.copy.condition = "fair"
+        self.copy.save()
+        GameLoan.objects.create(
+            user=self.borrower,
+            game_copy=GameCopy.objects.create(game=self.game, is_available=False),
+            due_date=timezone.now() + timedelta(days=14),
+        )
+        self.assertFalse(Job.objects.filter(task="notify_available").exists())
+
+    def test_batch_cost_does_not_grow_with_subscribers(self):
+        self.copy.is_available = True
+        self.copy.save()
+        with self.assertNumQueries(9):
+            alerts.notify_available([self.game.pk])
+        for i in range(20):
+            user = User.objects.create_user(email=f"fan{i}@example.com")
+            AvailabilityAlert.objects.create(user=user, game=self.game)
+            SavedSearch.objects.create(user=user, name="Catan", search="cat")
+        with self.assertNumQueries(9):
+            # The 20 new fans plus the standing "Strategy for four" search
+            self.assertEqual(alerts.notify_available([self.game.pk]), 21)
+
+    def test_unavailable_and_private_games_skip_saved_searches(self):
+        self.assertEqual(alerts.notify_available([self.game.pk]), 0)
+
+        librarian = User.objects.create_user(email="curator@example.com")
+        librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        Collection.objects.create(
+            title="Vault", creator=librarian, visibility="private"
+        ).games.add(self.game)
+        self.loan.mark_as_returned()
+        jobs.drain()
+        self.assertEqual(self.notified(), ["waiting@example.com"])
+
+    def test_saved_search_matches_like_the_catalogue(self):
+        search = SavedSearch(search="STRAT", complexity=3, players=3)
+        self.assertTrue(search.matches(self.game, {"Strategy"}))
+        self.assertFalse(search.matches(self.game, {"Party"}))
+        search.players = 5
+        self.assertFalse(search.matches(self.game, {"Strategy"}))
+        self.assertEqual(
+            SavedSearch(search="x", players=2).params(),
+            {"search": "x", "players": "2"},
+        )
+
+    def test_deliver_notifications(self):
+        self.loan.mark_as_returned()
+        alerts.notify_available([self.game.pk])
+        out = StringIO()
+        call_command("deliver_notifications", batch_size=1, stdout=out)
+        self.assertIn("Sent 2 notifications.", out.getvalue())
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["searcher@example.com", "waiting@example.com"],
+        )
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(alerts.deliver_notifications(), 0)
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_views(self):
+        self.client.force_login(self.other)
+        response = self.client.post(
+            reverse("save_search"), {"name": "Empty", "notify": "on"}
+        )
+        self.assertRedirects(response, reverse("board_game_catalogue"))
+        self.client.post(
+            reverse("save_search"),
+            {"name": "Co-op", "search": "pandemic", "players": "2", "notify": "on"},
+        )
+        saved = SavedSearch.objects.get(user=self.other, name="Co-op")
+        self.assertEqual(saved.players, 2)
+
+        detail = reverse("board_game_detail", args=[self.game.pk])
+        self.assertContains(self.client.get(detail), "Notify Me When Available")
+        self.client.post(reverse("toggle_availability_alert", args=[self.game.pk]))
+        self.assertContains(self.client.get(detail), "Cancel Availability Alert")
+
+        response = self.client.get(reverse("alerts"))
+        self.assertContains(response, "Co-op")
+        self.assertContains(response, "search=pandemic")
+        self.assertContains(response, "Catan")
+
+        self.client.post(reverse("delete_saved_search", args=[saved.pk]))
+        self.assertFalse(SavedSearch.objects.filter(pk=saved.pk).exists())
+        response = self.client.post(
+            reverse(
+                "delete_saved_search",
+                args=[SavedSearch.objects.get(user=self.searcher).pk],
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@jobs.task
+def flaky_task(fail_times, key):
+    """Fail the first ``fail_times`` attempts (counted in the cache), then succeed."""
+    failures = cache.get_or_set(key, 0)
+    if failures < fail_times:
+        cache.set(key, failures + 1)
+        raise RuntimeError("flaky")
+    Category.objects.get_or_create(name=key)
+
+
+class FailingAfterFirstSendBackend(locmem.EmailBackend):
+    """Deliver like ``locmem`` until the outbox holds a batch, then fail."""
+
+    def send_messages(self, messages):
+        if mail.outbox:
+            raise ConnectionError("SMTP server went away")
+        return super().send_messages(messages)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.game = BoardGame.objects.create(title="Catan")
+        self.copy = GameCopy.objects.create(game=self.game)
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+        Job.objects.all().delete()
+
+    def test_enqueue_is_transactional_and_checks_the_task(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue(print)
+        try:
+            with transaction.atomic():
+                jobs.enqueue(flaky_task, fail_times=0, key="rolled-back")
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertFalse(Job.objects.exists())
+
+        self.assertIsNotNone(
+            jobs.enqueue(flaky_task, unique=True, fail_times=0, key="a")
+        )
+        self.assertIsNone(jobs.enqueue(flaky_task, unique=True, fail_times=0, key="a"))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_skips_future_and_reclaims_stale_jobs(self):
+        later = jobs.enqueue(flaky_task, delay=60, fail_times=0, key="later")
+        stale = jobs.enqueue(flaky_task, fail_times=0, key="stale")
+        Job.objects.filter(pk=stale.pk).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now() - jobs.LOCK_TIMEOUT - timedelta(seconds=1),
+        )
+        claimed = jobs.claim(10)
+        self.assertEqual([job.pk for job in claimed], [stale.pk])
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(jobs.claim(10), [])
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_retries_with_backoff_then_fails(self):
+        job = jobs.enqueue(flaky_task, fail_times=1, key="retry")
+        with self.assertLogs("users.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.drain(), 1)
+        self.assertEqual(logs.records[0].status, Job.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("RuntimeError: flaky", job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(jobs.retry_delay(3), 4 * jobs.RETRY_BASE_DELAY)
+        self.assertEqual(jobs.retry_delay(100), jobs.MAX_RETRY_DELAY)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.drain()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertTrue(Category.objects.filter(name="retry").exists())
+
+        doomed = jobs.enqueue(flaky_task, fail_times=5, key="doomed")
+        Job.objects.filter(pk=doomed.pk).update(max_attempts=1)
+        with self.assertLogs("users.jobs", "WARNING"):
+            jobs.drain()
+        doomed.refresh_from_db()
+        self.assertEqual(doomed.status, Job.FAILED)
+        self.assertFalse(Category.objects.filter(name="doomed").exists())
+
+    def test_purge_finished(self):
+        job = jobs.enqueue(flaky_task, fail_times=0, key="old")
+        jobs.drain()
+        self.assertEqual(jobs.purge_finished(), 0)
+        Job.objects.filter(pk=job.pk).update(
+            finished_at=timezone.now() - timedelta(days=2)
+        )
+        self.assertEqual(jobs.purge_finished(), 1)
+
+    @override_settings(EMAIL_BACKEND="users.tests.FailingAfterFirstSendBackend")
+    def test_delivery_keeps_batches_sent_before_a_failure(self):
+        Notification.objects.bulk_create(
+            Notification(user=self.patron, subject=f"Alert {i}")
+            for i in range(alerts.DELIVERY_BATCH_SIZE + 1)
+        )
+        job = jobs.enqueue(tasks.deliver_notifications)
+        with self.assertLogs("users.jobs", "WARNING"):
+            jobs.drain()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(
+            Notification.objects.filter(sent_at__isnull=False).count(),
+            alerts.DELIVERY_BATCH_SIZE,
+        )
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_borrow_return_and_decisions_queue_notifications(self):
+        self.client.force_login(self.patron)
+        self.client.get(reverse("borrow_game", args=[self.game.pk]))
+        loan = GameLoan.objects.get(user=self.patron)
+        self.client.post(reverse("return_game", args=[loan.pk]))
+        request = BorrowRequest.objects.create(user=self.patron, game=self.game)
+
+        librarian = User.objects.create_user(email="librarian@example.com")
+        librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        self.client.force_login(librarian)
+        decision = {
+            "request_type": "borrow",
+            "request_id": request.pk,
+            "action": "deny",
+        }
+        self.client.post(reverse("manage_requests"), decision)
+        # Deciding again is refused rather than notifying the patron twice
+        response = self.client.post(reverse("manage_requests"), decision)
+        self.assertEqual(response.status_code, 404)
+        # Nothing is sent inside the requests themselves
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command("run_worker", "--once", "--threads", "1", stdout=out)
+        self.assertIn("Ran", out.getvalue())
+        self.assertEqual(
+            sorted(Notification.objects.values_list("subject", flat=True)),
+            [
+                "You borrowed 'Catan'",
+                "You returned 'Catan'",
+                "Your borrow request for 'Catan' was denied",
+            ],
+        )
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+
+class LoggingTests(TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.handler = log.BackgroundHandler(self.stream)
+        self.handler.setFormatter(log.LogfmtFormatter())
+        self.handler.addFilter(log.RequestIDFilter())
+        # Swap the configured stderr handler for one writing to self.stream
+        logger = logging.getLogger("users")
+        self.addCleanup(setattr, logger, "handlers", logger.handlers)
+        logger.handlers = [self.handler]
+        self.addCleanup(self.handler.flush_and_stop)
+
+    def lines(self):
+        """Stop the writer thread, so everything queued is written, and return it."""
+        self.handler.flush_and_stop()
+        return self.stream.getvalue().splitlines()
+
+    def test_records_are_logfmt_with_the_request_id(self):
+        token = log.request_id.set("abc123")
+        try:
+            logging.getLogger("users.views").warning(
+                "Loaded %d games", 3, extra={"user_id": 7, "note": 'a "b"'}
+            )
+        finally:
+            log.request_id.reset(token)
+        logging.getLogger("users.views").warning("Outside a request")
+        self.assertEqual(
+            self.lines(),
+            [
+                'level=warning logger=users.views request_id=abc123 msg="Loaded 3 games"'
+                ' user_id=7 note="a \\"b\\""',
+                'level=warning logger=users.views request_id=- msg="Outside a request"',
+            ],
+        )
+
+    def test_middleware_uses_or_creates_the_request_id(self):
+        url = reverse("api_game_autocomplete") + "?q=ca"
+        response = self.client.get(url, HTTP_X_REQUEST_ID="router-id")
+        self.assertEqual(response["X-Request-Id"], "router-id")
+        generated = self.client.get(url)["X-Request-Id"]
+        self.assertEqual(len(generated), 32)
+        self.assertEqual(log.request_id.get(), "-")
+
+    def test_job_records_carry_the_job_id(self):
+        Job.objects.all().delete()
+        job = jobs.enqueue(flaky_task, fail_times=1, key="logged")
+        jobs.drain()
+        (line,) = self.lines()
+        self.assertIn(f"request_id=job-{job.pk} ", line)
+        self.assertIn('msg="Job flaky_task failed" attempt=1 status=queued', line)
+
+    def test_handlers_share_one_writer_thread(self):
+        other_stream = StringIO()
+        other = log.BackgroundHandler(other_stream)
+        self.addCleanup(other.close)
+        logging.getLogger("users.views").warning("To the first")
+        other.handle(logging.makeLogRecord({"msg": "To the second"}))
+        listener = log._listener
+        self.assertIsNotNone(listener)
+
+        self.assertEqual(len(self.lines()), 1)
+        self.assertEqual(other_stream.getvalue(), "To the second\n")
+        self.assertIsNone(log._listener)
+        # The next record starts a new thread
+        logging.getLogger("users.views").warning("Again")
+        self.assertIsNot(log._listener, listener)
+        self.assertEqual(len(self.lines()), 2)
+
+    def test_sampling_keeps_a_fraction_of_debug_records(self):
+        def record(level):
+            return logging.makeLogRecord({"levelno": level})
+
+        self.assertFalse(log.SamplingFilter(0).filter(record(logging.DEBUG)))
+        self.assertTrue(log.SamplingFilter(0).filter(record(logging.INFO)))
+        self.assertTrue(log.SamplingFilter(1).filter(record(logging.DEBUG)))
+
+
+@override_settings(SESSION_ENGINE="users.sessions", STORAGES=TEST_STORAGES)
+class SessionEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+        self.librarian = User.objects.create_user(email="librarian@example.com")
+        self.librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        self.url = reverse("profile", args=[self.patron.pk])
+
+    def session_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in queries if '"django_session"' in q["sql"]]
+
+    def test_patron_sessions_live_in_signed_cookies(self):
+        self.client.force_login(self.patron)
+        self.assertTrue(
+            is_signed(self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+        )
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.session_queries(), [])
+
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "tampered:with:cookie"
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_librarian_sessions_stay_server_side(self):
+        self.client.force_login(self.librarian)
+        key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertFalse(is_signed(key))
+        self.assertTrue(Session.objects.filter(session_key=key).exists())
+        # Read through the cache, and revocable by deleting the row
+        self.client.get(reverse("profile", args=[self.librarian.pk]))
+        Session.objects.all().delete()
+        cache.clear()
+        response = self.client.get(reverse("profile", args=[self.librarian.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_database_sessions_migrate_on_first_request(self):
+        with override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            self.client.force_login(self.patron)
+        self.assertEqual(len(self.session_queries()), 1)
+        self.assertTrue(
+            is_signed(self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+        )
+        self.assertEqual(self.session_queries(), [])
+
+        self.client.logout()
+        with override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            self.client.force_login(self.librarian)
+        self.client.get(reverse("profile", args=[self.librarian.pk]))
+        self.assertFalse(
+            is_signed(self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+        )
+
+    def test_session_benchmark_and_cache_check(self):
+        results = benchmarks.session_round_trips(iterations=1, warmup=1)
+        self.assertEqual(results["db"]["session_queries"], 1)
+        self.assertEqual(results["signed_cookies"]["session_queries"], 0)
+        with override_settings(DEBUG=False):
+            self.assertEqual(
+                [warning.id for warning in check_session_cache(None)], ["users.W001"]
+            )
+
+
+class DatabasePoolTests(SimpleTestCase):
+    def test_pool_size_follows_threads_within_the_connection_limit(self):
+        self.assertEqual(pooling.pool_options(3, 5)["max_size"], 5)
+        with self.assertLogs("users.pooling", "WARNING"):
+            self.assertEqual(
+                pooling.pool_options(3, 5, max_connections=12)["max_size"], 4
+            )
+        with self.assertLogs("users.pooling", "WARNING"):
+            self.assertEqual(
+                pooling.pool_options(30, 5, max_connections=20)["max_size"], 1
+            )
+
+    def test_no_stats_without_a_pool(self):
+        self.assertIsNone(
+            pooling.pool_stats(ConnectionHandler({"default": {}})["default"])
+        )
+
+    @skipUnless(
+        os.environ.get("POSTGRES_TEST_URL"),
+        "Set POSTGRES_TEST_URL to a scratch Postgres database to test pooling",
+    )
+    def test_pool_checkouts_and_waits_are_counted(self):
+        config = dj_database_url.parse(os.environ["POSTGRES_TEST_URL"])
+        config["OPTIONS"] = {"pool": pooling.pool_options(1, 2, timeout=5)}
+        handler = ConnectionHandler({"default": {}, "pooled": config})
+        self.addCleanup(handler["pooled"].close_pool)
+
+        def query(_):
+            connection = handler["pooled"]
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(0.05)")
+            connection.close()  # returns the connection to the pool
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(query, range(4)))
+        stats = pooling.pool_stats(handler["pooled"])
+        self.assertEqual((stats["pool_max"], stats["requests_num"]), (2, 4))
+        self.assertGreaterEqual(stats["requests_queued"], 2)
+        self.assertGreater(stats["requests_wait_ms_avg"], 0)
+        self.assertEqual(pooling.pool_stats(handler["pooled"])["requests_num"], 0)
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = routers.ReplicaRouter()
+        self.router.enabled = True
+        self.game = BoardGame.objects.create(title="Catan")
+        GameCopy.objects.create(game=self.game)
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+
+    def route(self, state):
+        token = routers._state.set(state)
+        try:
+            return self.router.db_for_read(BoardGame)
+        finally:
+            routers._state.reset(token)
+
+    def test_only_decorated_unpinned_requests_read_from_the_replica(self):
+        self.assertEqual(self.route(None), "default")
+        state = routers.RoutingState(pinned=False)
+        self.assertEqual(self.route(state), "default")
+        state.replica_reads = True
+        self.assertEqual(self.route(state), "replica")
+        self.router.db_for_write(BoardGame)  # outside the request: no effect
+        self.assertEqual(self.route(state), "replica")
+
+        token = routers._state.set(state)
+        self.assertEqual(self.router.db_for_write(BoardGame), "default")
+        routers._state.reset(token)
+        self.assertEqual(self.route(state), "default")
+
+        pinned = routers.RoutingState(pinned=True)
+        pinned.replica_reads = True
+        self.assertEqual(self.route(pinned), "default")
+
+        self.router.enabled = False
+        self.assertIsNone(self.route(state))
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_writes_pin_the_browser_to_the_primary(self):
+        self.client.force_login(self.patron)
+        response = self.client.get(reverse("board_game_catalogue"))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+        response = self.client.get(reverse("borrow_game", args=[self.game.pk]))
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_PIN_SECONDS)
+        self.assertTrue(cookie["httponly"])
+
+
+@skipUnless(
+    routers.REPLICA in settings.DATABASES,
+    "Set SQLITE_REPLICA=1 to test reading from a replica",
+)
+@override_settings(STORAGES=TEST_STORAGES)
+class ReplicaRoutingTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.game = BoardGame.objects.create(title="Catan")
+        GameCopy.objects.create(game=self.game)
+        # The replica has not caught up with the latest edit yet
+        BoardGame.objects.using(routers.REPLICA).create(
+            pk=self.game.pk, title="Catan (stale)"
+        )
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+        self.client.force_login(self.patron)
+
+    def test_reads_come_from_the_replica_until_the_patron_writes(self):
+        url = reverse("board_game_detail", args=[self.game.pk])
+        self.assertContains(self.client.get(url), "Catan (stale)")
+
+        self.client.get(reverse("borrow_game", args=[self.game.pk]))
+        response = self.client.get(url)
+        self.assertContains(response, "Catan")
+        self.assertNotContains(response, "Catan (stale)")
+        self.assertTrue(GameLoan.objects.filter(user=self.patron).exists())
+
+
+class BootProfileTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   botocore\n"
+            "import time:      2000 |      46000 | boto3\n"
+            "Some other warning\n"
+        )
+        self.assertEqual(
+            boot.parse_importtime(output),
+            [("boto3", 46.0, 2.0), ("botocore", 0.1, 0.1)],
+        )
+
+    def test_budget(self):
+        report = {"boot_ms": 900.0, "max_rss_mb": 90.0, "loaded_deferred": []}
+        self.assertEqual(boot.check_budget(report, {"boot_ms": 1000}), [])
+        report["loaded_deferred"] = ["boto3"]
+        self.assertEqual(
+            len(boot.check_budget(report, {"boot_ms": 800, "max_rss_mb": 80})), 3
+        )
+
+    def test_boot_defers_boto3(self):
+        report = boot.profile_boot(runs=1)
+        self.assertEqual(list(report["phases_ms"]), ["settings", "apps", "wsgi"])
+        self.assertEqual(report["loaded_deferred"], [])
+        self.assertGreater(report["max_rss_mb"], 0)
+
+
+class StaticAssetTests(TestCase):
+    # Bytes each page may weigh with its same-origin assets, text gzipped (about 9KB now)
+    PAGE_WEIGHT_BUDGET = 15_000
+
+    def test_build_is_current(self):
+        self.assertEqual(assets.check(), [])
+
+    def test_minifiers(self):
+        self.assertEqual(
+            assets.minify_css("/* c */\na::after {\n  content: 'a ; b';\n}\n"),
+            "a::after{content:'a ; b'}\n",
+        )
+        self.assertEqual(
+            assets.minify_js("// c\n  let a = '// b';\n\n  f(a);\n"),
+            "let a = '// b';\nf(a);",
+        )
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_page_weight(self):
+        cache.clear()
+        patron = User.objects.create_user(email="patron@example.com")
+        patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+        game = BoardGame.objects.create(title="Catan")
+        GameCopy.objects.create(game=game)
+        collection = Collection.objects.create(title="Family", creator=patron)
+        collection.games.add(game)
+        self.client.force_login(patron)
+
+        pages = {
+            "users/board_game_catalogue.html": reverse("board_game_catalogue"),
+            "users/board_game_detail.html": reverse(
+                "board_game_detail", args=[game.pk]
+            ),
+            "users/profile.html": reverse("profile", args=[patron.pk]),
+            "collections/collection_list.html": reverse("collection_list"),
+            "collections/collection_detail.html": collection.get_absolute_url(),
+        }
+        weights = {}
+        for template, url in pages.items():
+            response = self.client.get(url)
+            self.assertTemplateUsed(response, template)
+            weights[template] = assets.page_weight(response.content.decode())
+        report = "\n".join(
+            f"{template:<40} "
+            + " ".join(f"{key}={value}" for key, value in weight.items())
+            for template, weight in weights.items()
+        )
+        for weight in weights.values():
+            self.assertLessEqual(weight["total"], self.PAGE_WEIGHT_BUDGET, report)
+            # The site's own CSS and JS come from one bundle each, plus Bootstrap
+            self.assertGreater(weight["css"], 0, report)
+            self.assertGreater(weight["js"], 0, report)
+            self.assertEqual(weight["external"], 3, report)
+
+    def test_hashed_files_are_cached_forever(self):
+        from whitenoise.middleware import WhiteNoiseMiddleware
+
+        with tempfile.TemporaryDirectory() as static_root, override_settings(
+            STATIC_ROOT=static_root, DEBUG=False
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            url = static("build/site.min.js")
+            self.assertRegex(url, r"site\.min\.[0-9a-f]{12}\.js$")
+            middleware = WhiteNoiseMiddleware(lambda request: None)
+            response = middleware(
+                RequestFactory().get(url, HTTP_ACCEPT_ENCODING="gzip")
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        response.close()
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES,
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+    AWS_S3_ENDPOINT_URL=None,
+)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # The client is built from the settings above, and head_object is stubbed
+        s3_client.cache_clear()
+        self.addCleanup(s3_client.cache_clear)
+        self.stub = Stubber(s3_client())
+        self.stub.activate()
+        self.addCleanup(self.stub.deactivate)
+
+        self.librarian = User.objects.create_user(email="librarian@example.com")
+        self.librarian.groups.add(Group.objects.get_or_create(name="Librarian")[0])
+        self.patron = User.objects.create_user(email="patron@example.com")
+        self.patron.groups.add(Group.objects.get_or_create(name="Patron")[0])
+
+    def _presign(self, kind, content_type="image/png"):
+        return self.client.post(
+            reverse("presign_upload"), {"kind": kind, "content_type": content_type}
+        )
+
+    def _uploaded(self, size=1024, content_type="image/png"):
+        self.stub.add_response(
+            "head_object",
+            {"ContentLength": size, "ContentType": content_type},
+            {"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": ANY},
+        )
+
+    def test_policy_limits_size_and_type(self):
+        self.client.force_login(self.librarian)
+        response = self._presign("board_game_image")
+        self.assertEqual(response.status_code, 200)
+        upload = response.json()
+
+        key = upload["fields"]["key"]
+        self.assertRegex(key, r"^board_games/[0-9a-f]{32}\.png$")
+        self.assertIn(settings.AWS_STORAGE_BUCKET_NAME, upload["url"])
+        policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+        self.assertIn(
+            ["content-length-range", 1, uploads.RULES["board_game_image"].max_size],
+            policy["conditions"],
+        )
+        self.assertIn({"Content-Type": "image/png"}, policy["conditions"])
+        self.assertIn({"key": key}, policy["conditions"])
+
+    def test_presign_checks_kind_type_and_role(self):
+        self.assertEqual(self._presign("profile_picture").status_code, 403)
+        self.client.force_login(self.patron)
+        self.assertEqual(self._presign("board_game_image").status_code, 403)
+        self.assertEqual(self._presign("profile_picture").status_code, 200)
+        self.assertEqual(
+            self._presign("profile_picture", "image/svg+xml").status_code, 400
+        )
+        self.assertEqual(self._presign("avatar").status_code, 400)
+        self.assertEqual(self.client.get(reverse("presign_upload")).status_code, 405)
+
+    def test_profile_form_submits_only_the_key(self):
+        self.client.force_login(self.patron)
+        page = self.client.get(reverse("edit_profile"))
+        self.assertContains(page, 'data-kind="profile_picture"')
+        self.assertNotContains(page, "multipart/form-data")
+
+        upload = self._presign("profile_picture").json()
+        self._uploaded()
+        response = self.client.post(
+            reverse("edit_profile"),
+            {
+                "given_name": "Pat",
+                "family_name": "Ron",
+                "email": self.patron.email,
+                "profile_picture": upload["token"],
+            },
+        )
+        self.assertRedirects(response, reverse("profile", args=[self.patron.pk]))
+        self.patron.refresh_from_db()
+        self.assertEqual(self.patron.profile_picture.name, upload["fields"]["key"])
+        self.stub.assert_no_pending_responses()
+
+        # Saving without a new upload keeps the picture
+        self.client.post(
+            reverse("edit_profile"),
+            {"given_name": "Pat", "family_name": "Ron", "email": self.patron.email},
+        )
+        self.patron.refresh_from_db()
+        self.assertEqual(self.patron.profile_picture.name, upload["fields"]["key"])
+
+    def test_unfinished_or_forged_uploads_are_rejected(self):
+        self.client.force_login(self.librarian)
+        upload = self._presign("board_game_image").json()
+        self.stub.add_client_error(
+            "head_object", service_error_code="404", http_status_code=404
+        )
+        form = BoardGameForm(
+            {"title": "Catan", "image": upload["token"]}, instance=BoardGame()
+        )
+        self.assertIn("did not finish", form.errors["image"][0])
+
+        # A token for another kind of file does not name a key here
+        profile_token = self._presign("profile_picture").json()["token"]
+        form = BoardGameForm({"title": "Catan", "image": profile_token})
+        self.assertIn("expired", form.errors["image"][0])
+
+    def test_objects_breaking_the_rule_are_deleted(self):
+        self.client.force_login(self.patron)
+        max_size = uploads.RULES["profile_picture"].max_size
+        for size, content_type, error in (
+            (max_size + 1, "image/png", "at most 2MB"),
+            (1024, "text/html", "not allowed"),
+        ):
+            upload = self._presign("profile_picture").json()
+            self._uploaded(size, content_type)
+            self.stub.add_response(
+                "delete_object",
+                {},
+                {
+                    "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+                    "Key": upload["fields"]["key"],
+                },
+            )
+            with self.assertRaisesMessage(ValidationError, error):
+                uploads.claim("profile_picture", upload["token"])
+        self.stub.assert_no_pending_responses()
+
+    def test_profile_picture_can_be_cleared(self):
+        self.patron.profile_picture.name = "profile_pictures/old.png"
+        self.patron.save()
+        self.client.force_login(self.patron)
+        page = self.client.get(reverse("edit_profile"))
+        self.assertContains(page, "profile_pictures/old.png")
+        self.assertContains(page, 'name="profile_picture-clear"')
+        # The current key is shown, never submitted back as an upload token
+        self.assertContains(
+            page, 'name="profile_picture" id="id_profile_picture_token" value=""'
+        )
+
+        details = {"given_name": "Pat", "family_name": "Ron", "email": "p@x.com"}
+        self.client.post(reverse("edit_profile"), details | {"profile_picture": ""})
+        self.patron.refresh_from_db()
+        self.assertEqual(self.patron.profile_picture.name, "profile_pictures/old.png")
+        self.client.post(
+            reverse("edit_profile"),
+            details | {"profile_picture": "", "profile_picture-clear": "on"},
+        )
+        self.patron.refresh_from_db()
+        self.assertFalse(self.patron.profile_picture)
+
+    def test_add_board_game_with_uploaded_image(self):
+        self.client.force_login(self.librarian)
+        category = Category.objects.first()
+        upload = self._presign("board_game_image").json()
+        self._uploaded()
+        response = self.client.post(
+            reverse("add_board_game"),
+            {
+                "title": "Catan",
+                "description": "Trade and build",
+                "image": upload["token"],
+                "min_players": 3,
+                "max_players": 4,
+                "categories": [category.pk],
+                "playing_time": 60,
+                "complexity": 2,
+                "num_copies": 1,
+                "default_pickup_location": "shannon",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        game = BoardGame.objects.get(title="Catan")
+        self.assertEqual(game.image.name, upload["fields"]["key"])
+
+
+@skipUnless(
+    os.getenv("AWS_S3_ENDPOINT_URL"), "set AWS_S3_ENDPOINT_URL to a local S3 stand-in"
+)
+class DirectUploadStandInTests(SimpleTestCase):
+    """Upload to a real S3 API, e.g. ``minio server`` with a throwaway bucket."""
+
+    def setUp(self):
+        s3_client.cache_clear()
+        self.addCleanup(s3_client.cache_clear)
+        try:
+            s3_client().create_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+        except s3_client().exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+    def _post(self, upload, data, content_type="image/png"):
+        import requests
+
+        return requests.post(
+            upload["url"],
+            data=upload["fields"],
+            files={"file": ("picture.png", data, content_type)},
+            timeout=10,
+        )
+
+    def test_storage_enforces_the_policy(self):
+        upload = uploads.presign("profile_picture", "image/png")
+        too_large = b"x" * (uploads.RULES["profile_picture"].max_size + 1)
+        self.assertEqual(self._post(upload, too_large).status_code, 403)
+        with self.assertRaises(ValidationError):
+            uploads.claim("profile_picture", upload["token"])
+
+        self.assertEqual(self._post(upload, b"\x89PNG").status_code, 204)
+        key = uploads.claim("profile_picture", upload["token"])
+        self.assertEqual(key, upload["fields"]["key"])
@@ -0,0 +1,131 @@
+"""
+Direct-to-S3 image uploads.
+
+The browser asks ``presign_upload`` for a presigned POST, sends the file straight to
+the bucket, and the form then submits only a signed token naming the new object's
+key, so no upload ever passes through a gunicorn worker. The POST policy S3 checks
+the upload against carries the size limit and the content type, and the key is
+chosen here, under the model field's ``upload_to`` directory.
+
+Set ``AWS_S3_ENDPOINT_URL`` to point both this and the media storage at a local S3
+stand-in such as MinIO.
+"""
+
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+
+from .s3_utils import s3_client
+
+# Seconds the browser has to start the upload, and to submit the form after it
+POLICY_EXPIRES = 10 * 60
+TOKEN_MAX_AGE = 60 * 60
+
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+@dataclass(frozen=True)
+class UploadRule:
+    prefix: str
+    max_size: int
+    content_types: tuple
+    librarians_only: bool = False
+
+    def allowed(self, user):
+        """Tell whether ``user`` may upload this kind of file."""
+        if not user.is_authenticated:
+            return False
+        return user.is_librarian() if self.librarians_only else True
+
+
+# Prefixes match the ``upload_to`` of User.profile_picture and BoardGame.image
+RULES = {
+    "profile_picture": UploadRule(
+        prefix="profile_pictures/",
+        max_size=2 * 1024 * 1024,
+        content_types=("image/jpeg", "image/png", "image/gif"),
+    ),
+    "board_game_image": UploadRule(
+        prefix="board_games/",
+        max_size=5 * 1024 * 1024,
+        content_types=("image/jpeg", "image/png", "image/gif", "image/webp"),
+        librarians_only=True,
+    ),
+}
+
+
+def _salt(kind):
+    return f"users.uploads.{kind}"
+
+
+def presign(kind, content_type):
+    """
+    Presign a browser upload of one ``kind`` of file.
+
+    :return: ``{"url", "fields"}`` for the browser to POST the file to (the file
+        last), and ``"token"`` for the form to submit once the upload succeeds
+    :raise ValueError: If ``content_type`` is not allowed for ``kind``
+    """
+    rule = RULES[kind]
+    if content_type not in rule.content_types:
+        raise ValueError(f"{content_type or 'That file type'} is not allowed here.")
+    key = f"{rule.prefix}{uuid.uuid4().hex}{EXTENSIONS[content_type]}"
+    post = s3_client().generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            ["content-length-range", 1, rule.max_size],
+            {"Content-Type": content_type},
+        ],
+        ExpiresIn=POLICY_EXPIRES,
+    )
+    return post | {
+        "token": signing.dumps(key, salt=_salt(kind)),
+        "max_size": rule.max_size,
+    }
+
+
+def claim(kind, token):
+    """
+    Check a submitted upload token and the object it names.
+
+    The object's size and content type are checked again against the rule, in case
+    the bucket did not apply the policy (e.g. a misconfigured stand-in); an object
+    that breaks the rule is deleted.
+
+    :return: The object's key, to store in the model's file field
+    :raise ValidationError: If the token is forged, expired or for another kind of
+        file, the upload never finished, or the object breaks the rule
+    """
+    rule = RULES[kind]
+    try:
+        key = signing.loads(token, salt=_salt(kind), max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature as e:
+        raise ValidationError("The upload expired, choose the file again.") from e
+
+    from botocore.exceptions import ClientError
+
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    try:
+        head = s3_client().head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        raise ValidationError(
+            "The upload did not finish, choose the file again."
+        ) from e
+    if not 0 < head["ContentLength"] <= rule.max_size:
+        problem = f"The file must be at most {rule.max_size // (1024 * 1024)}MB."
+    elif head.get("ContentType") not in rule.content_types:
+        problem = "That file type is not allowed here."
+    else:
+        return key
+    s3_client().delete_object(Bucket=bucket, Key=key)
+    raise ValidationError(problem)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 from .views import add_review
 
 
@@ -8,12 +8,19 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("users/<int:pk>/", views.user_profile, name="profile"),
     path("edit/", views.edit_profile, name="edit_profile"),
+    path("uploads/presign/", views.presign_upload, name="presign_upload"),
     path("board-games/", views.manage_board_games, name="manage_board_games"),
     path("board-games/add/", views.add_board_game, name="add_board_game"),
     path("board-games/edit/<int:pk>/", views.edit_board_game, name="edit_board_game"),
     path("catalogue/", views.board_game_catalogue, name="board_game_catalogue"),
     path("boardgame/<int:pk>/", views.board_game_detail, name="board_game_detail"),
     path("boardgame/<int:pk>/borrow/", views.borrow_game, name="borrow_game"),
+    path("boardgame/<int:pk>/reviews/", views.game_reviews, name="game_reviews"),
+    path(
+        "boardgame/<int:pk>/reviews/feed/",
+        views.game_reviews_api,
+        name="game_reviews_api",
+    ),
     path("loans/<int:pk>/return/", views.return_game, name="return_game"),
     path(
         "board-games/delete/<int:pk>/",
@@ -48,4 +55,48 @@ urlpatterns = [
         views.promote_to_librarian,
         name="promote_to_librarian",
     ),
+    path(
+        "locations/<str:location>/",
+        views.location_inventory,
+        name="location_inventory",
+    ),
+    path("analytics/", views.loan_dashboard, name="loan_dashboard"),
+    path("alerts/", views.alerts, name="alerts"),
+    path("alerts/searches/", views.save_search, name="save_search"),
+    path(
+        "alerts/searches/<int:pk>/delete/",
+        views.delete_saved_search,
+        name="delete_saved_search",
+    ),
+    path(
+        "boardgame/<int:pk>/alert/",
+        views.toggle_availability_alert,
+        name="toggle_availability_alert",
+    ),
+    # Read-only JSON API
+    path("api/v1/games/", api.game_list, name="api_game_list"),
+    path(
+        "api/v1/games/autocomplete/",
+        api.game_autocomplete,
+        name="api_game_autocomplete",
+    ),
+    path("api/v1/games/<int:pk>/", api.game_detail, name="api_game_detail"),
+    path("api/v1/games/<int:pk>/similar/", api.game_similar, name="api_game_similar"),
+    path(
+        "api/v1/games/<int:pk>/availability/",
+        api.game_availability,
+        name="api_game_availability",
+    ),
+    path("api/v1/collections/", api.collection_list, name="api_collection_list"),
+    path(
+        "api/v1/collections/<int:pk>/",
+        api.collection_detail,
+        name="api_collection_detail",
+    ),
+    path("api/v1/locations/", api.location_list, name="api_location_list"),
+    path(
+        "api/v1/locations/<str:location>/inventory/",
+        api.location_inventory,
+        name="api_location_inventory",
+    ),
 ]
@@ -1,5 +1,9 @@
+import logging
+
 from django.shortcuts import redirect, render, get_object_or_404, HttpResponseRedirect
+from django.http import Http404, JsonResponse
 from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.contrib.auth import logout
 from django.views.decorators.http import require_POST
 from .models import (
@@ -13,15 +17,29 @@ from .models import (
     CollectionAccessRequest,
     Review,
     Group,
+    AvailabilityAlert,
+    SavedSearch,
 )
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.contrib import messages
-from .forms import ProfileEditForm, BoardGameForm, CollectionForm
+from .forms import ProfileEditForm, BoardGameForm, CollectionForm, SavedSearchForm
+from . import analytics, queries, tasks, uploads
+from .jobs import enqueue
+from .conditional import conditional_page
+from .routers import reads_from_replica
 from datetime import timedelta
 from django.urls import reverse
+from django.utils.http import urlencode
 from .s3_utils import generate_presigned_url
 
+LOAN_HISTORY_PAGE_SIZE = 20
+INVENTORY_PAGE_SIZE = 50
+DASHBOARD_WEEK_CHOICES = (4, 12, 26, 52)
+NOTIFICATION_HISTORY_LIMIT = 50
+
+logger = logging.getLogger(__name__)
+
 
 def is_librarian(user):
     return user.is_authenticated and user.is_librarian()
@@ -37,7 +55,13 @@ def create_context(user: dict) -> dict:
         context["email"] = user.email
     else:
         context["is_authenticated"] = False
-    print(f"[INFO] User Context is {context}")
+    logger.debug(
+        "User context built",
+        extra={
+            "user_id": user.pk,
+            "librarian": context.get("is_librarian", False),
+        },
+    )
     return context
 
 
@@ -59,7 +83,7 @@ def index(request):
         welcome_message = f"Welcome, {user.get_short_name()} ({role})!"
         context["welcome_message"] = welcome_message
 
-    print(context)
+    logger.debug("Rendering index with %d images", len(images))
     return render(request, "index.html", context)
 
 
@@ -73,17 +97,38 @@ def user_profile(request, pk):
     if request.user != user:
         raise PermissionDenied
 
-    borrowed_games = GameLoan.objects.filter(user=user).order_by("-borrowed_on")
+    now = timezone.now()
+    borrowed_games = (
+        GameLoan.objects.filter(user=user)
+        .select_related("game_copy__game")
+        .order_by("-borrowed_on")
+    )
     active_borrows = borrowed_games.filter(returned=False)
 
+    # Summary counters in a single aggregate query
+    loan_summary = GameLoan.objects.filter(user=user).aggregate(
+        total_borrowed=models.Count("pk"),
+        currently_borrowed=models.Count("pk", filter=models.Q(returned=False)),
+        overdue=models.Count("pk", filter=models.Q(returned=False, due_date__lt=now)),
+    )
+
+    # Heavy borrowers have thousands of loans, so only render one page of history
+    paginator = Paginator(borrowed_games, LOAN_HISTORY_PAGE_SIZE)
+    previous_loans = paginator.get_page(request.GET.get("page"))
+
     context = {
         "user": user,
-        "previous_loans": borrowed_games,
+        "previous_loans": previous_loans,
         "active_loans": active_borrows,
-        "borrow_requests": request.user.borrow_requests.all().order_by("-requested_at"),
-        "collection_requests": request.user.collection_requests.all().order_by(
+        "loan_summary": loan_summary,
+        # Overdue is judged against the same instant as the overdue counter
+        "now": now,
+        "borrow_requests": request.user.borrow_requests.select_related("game").order_by(
             "-requested_at"
         ),
+        "collection_requests": request.user.collection_requests.select_related(
+            "collection"
+        ).order_by("-requested_at"),
     } | create_context(request.user)
 
     return render(request, "users/profile.html", context)
@@ -94,7 +139,7 @@ def edit_profile(request):
         raise PermissionDenied
 
     if request.method == "POST":
-        form = ProfileEditForm(request.POST, request.FILES, instance=request.user)
+        form = ProfileEditForm(request.POST, instance=request.user)
         if form.is_valid():
             form.save()
             return redirect("profile", pk=request.user.pk)
@@ -106,6 +151,23 @@ def edit_profile(request):
     return render(request, "users/edit_profile.html", context)
 
 
+@require_POST
+def presign_upload(request):
+    """Presign an image upload for the browser to send straight to S3."""
+    kind = request.POST.get("kind")
+    rule = uploads.RULES.get(kind)
+    if rule is None:
+        return JsonResponse({"error": "Unknown kind of upload."}, status=400)
+    if not rule.allowed(request.user):
+        raise PermissionDenied
+
+    try:
+        upload = uploads.presign(kind, request.POST.get("content_type", ""))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(upload)
+
+
 def manage_board_games(request):
     """View for librarians to manage board games."""
     if not is_librarian(request.user):
@@ -126,7 +188,7 @@ def add_board_game(request):
         raise PermissionDenied
 
     if request.method == "POST":
-        form = BoardGameForm(request.POST, request.FILES)
+        form = BoardGameForm(request.POST)
         if form.is_valid():
             board_game = form.save()
             num_copies = form.cleaned_data.get("num_copies", 1)
@@ -156,7 +218,7 @@ def edit_board_game(request, pk):
     initial_copies_count = board_game.copies.count()
 
     if request.method == "POST":
-        form = BoardGameForm(request.POST, request.FILES, instance=board_game)
+        form = BoardGameForm(request.POST, instance=board_game)
         if form.is_valid():
             board_game = form.save()
 
@@ -172,6 +234,15 @@ def edit_board_game(request, pk):
                 messages.success(
                     request, f"Board game '{board_game.title}' updated successfully!"
                 )
+            if form.moved_copies:
+                location = dict(GameCopy.PICKUP_LOCATION_CHOICES)[
+                    form.cleaned_data["default_pickup_location"]
+                ]
+                moved = form.moved_copies
+                messages.info(
+                    request,
+                    f"Moved {moved} {'copy' if moved == 1 else 'copies'} to {location}.",
+                )
 
             return redirect("manage_board_games")
     else:
@@ -205,35 +276,89 @@ def delete_board_game(request, pk):
     return redirect("manage_board_games")
 
 
+def _game_detail_validators(request, pk):
+    if not request.user.is_authenticated:
+        return None
+    return queries.game_detail_validators(pk, request.user)
+
+
+@reads_from_replica
+@conditional_page(_game_detail_validators)
 def board_game_detail(request, pk):
     """View for displaying detailed information about a specific board game."""
     if not request.user.is_authenticated:
         raise PermissionDenied
 
-    game = get_object_or_404(BoardGame, pk=pk)
+    context = queries.game_detail(pk, request.user) | create_context(request.user)
 
-    # Get available copies with their pickup locations
-    available_copies = game.copies.filter(is_available=True)
+    return render(request, "users/board_game_detail.html", context)
 
-    # Check if user has borrowed the game:
-    has_borrowed = GameLoan.objects.filter(
-        user=request.user, game_copy__game=game, returned=True
-    ).exists()
 
-    # check if user has previously made a review
-    review = Review.objects.filter(user=request.user, game=game).first()
+@reads_from_replica
+def game_reviews(request, pk):
+    """Paginated page of all reviews for a board game."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
 
+    game = get_object_or_404(BoardGame, pk=pk)
+    try:
+        reviews, next_cursor = queries.review_page(game, request.GET.get("cursor"))
+    except ValueError:
+        reviews, next_cursor = queries.review_page(game)
+
+    histogram = queries.rating_histogram(game)
+    review_count = sum(histogram.values())
     context = {
         "game": game,
-        "categories": list(game.categories.all()),
-        "available_copies": available_copies,
-        "existing_review": review,
-        "has_borrowed": has_borrowed,
+        "reviews": reviews,
+        "next_cursor": next_cursor,
+        "review_count": review_count,
+        "histogram": [
+            {
+                "rating": rating,
+                "count": count,
+                "percent": round(100 * count / review_count) if review_count else 0,
+            }
+            for rating, count in sorted(histogram.items(), reverse=True)
+        ],
     } | create_context(request.user)
 
-    return render(request, "users/board_game_detail.html", context)
+    return render(request, "users/game_reviews.html", context)
+
+
+def game_reviews_api(request, pk):
+    """JSON review feed for infinite scrolling; pass ``cursor`` to get the next page."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+
+    game = get_object_or_404(BoardGame, pk=pk)
+    cursor = request.GET.get("cursor")
+    try:
+        reviews, next_cursor = queries.review_page(game, cursor)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    data = {
+        "results": [
+            {
+                "id": review.pk,
+                "rating": review.rating,
+                "title": review.title,
+                "comment": review.comment,
+                "author": review.user.get_full_name(),
+                "created_at": review.created_at.isoformat(),
+            }
+            for review in reviews
+        ],
+        "next_cursor": next_cursor,
+    }
+    # The histogram only changes with new reviews, so send it with the first page only
+    if not cursor:
+        data["histogram"] = queries.rating_histogram(game)
+    return JsonResponse(data)
 
 
+@reads_from_replica
 def board_game_catalogue(request):
     """View for users to browse and search the board game collection."""
     # Exclude games that are in any private collection
@@ -241,54 +366,33 @@ def board_game_catalogue(request):
         "title"
     )
 
-    # Search functionality
-    search_query = request.GET.get("search", "")
-    if search_query:
-        games = games.filter(
-            models.Q(title__icontains=search_query)
-            | models.Q(description__icontains=search_query)
-            | models.Q(categories__name__icontains=search_query)
-        ).distinct()
+    # How many games each filter option would leave, before filtering the page
+    facets = queries.facet_counts(games, request.GET)
 
-    # Filter by complexity
+    # Search, complexity, player count, availability and category filters
+    games = queries.filter_games(games, request.GET)
+    search_query = request.GET.get("search", "")
     complexity = request.GET.get("complexity", "")
-    if complexity and complexity.isdigit():
-        games = games.filter(complexity=int(complexity))
-
-    # Filter by player count
     players = request.GET.get("players", "")
-    if players and players.isdigit():
-        players_count = int(players)
-        games = games.filter(
-            min_players__lte=players_count, max_players__gte=players_count
-        )
-
-    # Filter by availability
     availability = request.GET.get("availability", "")
-    if availability and availability == "available":
-        games = games.filter(copies__is_available=True).distinct()
-
-    # Get all categories for filter options
-    categories = Category.objects.all().order_by("name")
-
-    # Filter by category
     category = request.GET.get("category", "")
-    if category:
-        games = games.filter(categories__name=category)
 
     context = {
         "games": games,
-        "categories": categories,
+        "facets": facets,
         "search_query": search_query,
         "complexity": complexity,
         "players": players,
         "availability": availability,
         "selected_category": category,
+        # Availability is left out: saved searches alert when games come back anyway
+        "has_filters": any([search_query, complexity, players, category]),
     } | create_context(request.user)
 
     return render(request, "users/board_game_catalogue.html", context)
 
 
+@reads_from_replica
 def collection_list(request):
     """View for browsing all collections."""
     collections = Collection.objects.all().order_by("title")
@@ -336,6 +440,12 @@ def collection_list(request):
     return render(request, "collections/collection_list.html", context)
 
 
+def _collection_detail_validators(request, pk):
+    return queries.collection_detail_validators(pk, request.user)
+
+
+@reads_from_replica
+@conditional_page(_collection_detail_validators)
 def collection_detail(request, pk):
     """View for displaying a specific collection and its games."""
     collection = get_object_or_404(Collection, pk=pk)
@@ -354,41 +464,17 @@ def collection_detail(request, pk):
     # Get games in this collection
     games = collection.games.all().order_by("title")
 
-    # Search within collection
+    # Search, complexity, player count, availability and category filters
+    games = queries.filter_games(games, request.GET)
     search_query = request.GET.get("search", "")
-    if search_query:
-        games = games.filter(
-            models.Q(title__icontains=search_query)
-            | models.Q(description__icontains=search_query)
-            | models.Q(categories__name__icontains=search_query)
-        ).distinct()
-
-    # Filter by complexity
     complexity = request.GET.get("complexity", "")
-    if complexity and complexity.isdigit():
-        games = games.filter(complexity=int(complexity))
-
-    # Filter by player count
     players = request.GET.get("players", "")
-    if players and players.isdigit():
-        players_count = int(players)
-        games = games.filter(
-            min_players__lte=players_count, max_players__gte=players_count
-        )
-
-    # Filter by availability
     availability = request.GET.get("availability", "")
-    if availability and availability == "available":
-        games = games.filter(copies__is_available=True).distinct()
+    category = request.GET.get("category", "")
 
     # Get all categories for filter options
     categories = Category.objects.all().order_by("name")
 
-    # Filter by category
-    category = request.GET.get("category", "")
-    if category:
-        games = games.filter(categories__name=category)
-
     context = {
         "collection": collection,
         "games": games,
@@ -487,17 +573,21 @@ def edit_collection(request, pk):
             form.save_m2m()
 
             # Update games
+            game_ids = request.POST.getlist("games")
+            games = list(BoardGame.objects.filter(id__in=game_ids))
+            if len(games) != len(set(game_ids)):
+                raise Http404("No BoardGame matches the given query.")
+
+            # Remove games from all public collections
+            if collection.visibility == "private":
+                for public_collection in Collection.objects.filter(
+                    visibility="public", games__in=games
+                ).distinct():
+                    public_collection.games.remove(*games)
+
+            # One clear and one bulk insert instead of a query (and signal) per game
             collection.games.clear()
-            for game_id in request.POST.getlist("games"):
-                game = get_object_or_404(BoardGame, id=game_id)
-
-                # Remove game from all public collections
-                if collection.visibility == "private":
-                    public_collections = game.collections.filter(visibility="public")
-                    for public_collection in public_collections:
-                        public_collection.games.remove(game)
-
-                collection.games.add(game)
+            collection.games.add(*games)
 
             messages.success(
                 request, f"Collection '{collection.title}' updated successfully!"
@@ -620,6 +710,7 @@ def request_borrow_game(request, pk):
     return redirect("board_game_detail", pk=pk)
 
 
+@transaction.atomic
 def borrow_game(request, pk):
     """View for patrons to borrow a board game."""
     # Only patrons can borrow games
@@ -673,6 +764,7 @@ def borrow_game(request, pk):
     return redirect("profile", pk=request.user.pk)
 
 
+@transaction.atomic
 def return_game(request, pk):
     """View for patrons to return a borrowed board game."""
     # Get the loan or return 404 if not found
@@ -683,13 +775,9 @@ def return_game(request, pk):
         loan.returned = True
         loan.returned_on = timezone.now()
         loan.status = "returned"
+        # GameLoan.save() also marks the copy available again
         loan.save()
 
-        # Update game copy availability
-        game_copy = loan.game_copy
-        game_copy.is_available = True
-        game_copy.save()
-
         messages.success(
             request, f"You have successfully returned '{loan.game_copy.game.title}'."
         )
@@ -703,6 +791,7 @@ def return_game(request, pk):
     return render(request, "users/return_game_confirm.html", context)
 
 
+@transaction.atomic
 def manage_requests(request):
     if not is_librarian(request.user):
         raise PermissionDenied
@@ -724,7 +813,13 @@ def manage_requests(request):
         action = request.POST.get("action")
 
         if request_type == "borrow":
-            br = get_object_or_404(BorrowRequest, id=request_id)
+            # Only pending requests can be decided, so a re-post (double click, back
+            # button) cannot notify the patron twice
+            br = get_object_or_404(
+                BorrowRequest.objects.select_for_update(),
+                id=request_id,
+                status="pending",
+            )
             if action == "approve":
                 # Before setting status to 'Approved', actually borrow the game
                 game = br.game
@@ -774,12 +869,21 @@ def manage_requests(request):
                 br.status = "Denied"
                 br.save()
 
+            if br.status != "pending":
+                # Committed with the decision, so the patron hears about it exactly once
+                enqueue(tasks.request_decided, kind="borrow", request_id=br.pk)
+
         elif request_type == "collection":
-            cr = get_object_or_404(CollectionAccessRequest, id=request_id)
+            cr = get_object_or_404(
+                CollectionAccessRequest.objects.select_for_update(),
+                id=request_id,
+                status="pending",
+            )
             if action == "approve":
                 # Mark the request as approved
                 cr.status = "Approved"
                 cr.save()
+                enqueue(tasks.request_decided, kind="collection", request_id=cr.pk)
 
                 # Add the requesting user to the collection's authorized_users
                 # (only if they're not already authorized)
@@ -793,6 +897,7 @@ def manage_requests(request):
             elif action == "deny":
                 cr.status = "Denied"
                 cr.save()
+                enqueue(tasks.request_decided, kind="collection", request_id=cr.pk)
                 messages.success(
                     request,
                     f"Collection access for '{cr.collection.title}' denied for {cr.user.get_full_name()}.",
@@ -879,3 +984,123 @@ def promote_to_librarian(request, pk):
         "has been promoted to Librarian.",
     )
     return redirect("manage_librarians")
+
+
+def location_inventory(request, location):
+    """Pickup-desk view of every game shelved at one location, with copy counts."""
+    if not is_librarian(request.user):
+        raise PermissionDenied
+
+    locations = dict(GameCopy.PICKUP_LOCATION_CHOICES)
+    if location not in locations:
+        raise Http404("Unknown pickup location.")
+
+    available_only = request.GET.get("available") == "1"
+    paginator = Paginator(
+        queries.location_inventory(location, available_only), INVENTORY_PAGE_SIZE
+    )
+    context = {
+        "location": location,
+        "location_label": locations[location],
+        "locations": queries.location_summary(),
+        "available_only": available_only,
+        "inventory": paginator.get_page(request.GET.get("page")),
+    } | create_context(request.user)
+
+    return render(request, "users/location_inventory.html", context)
+
+
+@reads_from_replica
+def loan_dashboard(request):
+    """Librarian dashboard of loan statistics, read from the daily rollups only."""
+    if not is_librarian(request.user):
+        raise PermissionDenied
+
+    weeks = request.GET.get("weeks", "")
+    weeks = (
+        int(weeks) if weeks.isdigit() and int(weeks) in DASHBOARD_WEEK_CHOICES else 12
+    )
+    context = (
+        analytics.dashboard(weeks)
+        | {
+            "week_choices": DASHBOARD_WEEK_CHOICES,
+        }
+        | create_context(request.user)
+    )
+
+    return render(request, "users/loan_dashboard.html", context)
+
+
+def alerts(request):
+    """List the patron's saved searches, availability alerts and notifications."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+
+    catalogue_url = reverse("board_game_catalogue")
+    context = {
+        "saved_searches": [
+            {"search": search, "url": f"{catalogue_url}?{urlencode(search.params())}"}
+            for search in request.user.saved_searches.all()
+        ],
+        "availability_alerts": request.user.availability_alerts.select_related(
+            "game"
+        ).order_by("game__title"),
+        "notifications": request.user.notifications.select_related("game")[
+            :NOTIFICATION_HISTORY_LIMIT
+        ],
+    } | create_context(request.user)
+
+    return render(request, "users/alerts.html", context)
+
+
+@require_POST
+def save_search(request):
+    """Save the catalogue filters the patron is looking at."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+
+    form = SavedSearchForm(request.POST)
+    if form.is_valid():
+        saved_search = form.save(commit=False)
+        saved_search.user = request.user
+        saved_search.save()
+        messages.success(request, f"Saved search '{saved_search.name}'.")
+        return redirect("alerts")
+
+    for error in form.non_field_errors():
+        messages.error(request, error)
+    if not form.non_field_errors():
+        messages.error(request, "This search could not be saved.")
+    return redirect("board_game_catalogue")
+
+
+@require_POST
+def delete_saved_search(request, pk):
+    """Delete one of the patron's saved searches."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+
+    saved_search = get_object_or_404(SavedSearch, pk=pk, user=request.user)
+    saved_search.delete()
+    messages.success(request, f"Deleted saved search '{saved_search.name}'.")
+    return redirect("alerts")
+
+
+@require_POST
+def toggle_availability_alert(request, pk):
+    """Ask to be told when a game is next available, or cancel that request."""
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+
+    game = get_object_or_404(BoardGame, pk=pk)
+    alert, created = AvailabilityAlert.objects.get_or_create(
+        user=request.user, game=game
+    )
+    if created:
+        messages.success(
+            request, f"We'll let you know when '{game.title}' is available."
+        )
+    else:
+        alert.delete()
+        messages.info(request, f"Cancelled the alert for '{game.title}'.")
+    return redirect("board_game_detail", pk=pk)